@@ -0,0 +1,136 @@
+"""Event-loop cost of request logging: direct handlers vs the queue-based pipeline.
+
+Run from the backend directory:
+
+    python benchmarks/bench_logging.py [--calls 20000] [--level INFO]
+
+"before" reproduces the previous setup (RotatingFileHandler and console
+handler called inline, f-string helpers). "after" is the current `logger`
+module. Both write to a temporary directory and send console output to
+/dev/null, so only the time spent on the calling thread is compared.
+"""
+import argparse
+import asyncio
+import logging
+import logging.handlers
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+PROMPT = "Explain how a TTL cache decides which entries to evict. " * 20
+RESPONSE = "A TTL cache stores an expiry time with every entry. " * 40
+
+
+def build_direct_logger(log_dir: str, level: str) -> logging.Logger:
+    """Previous logger setup: handlers run on the calling thread"""
+    logger = logging.getLogger("bench_direct")
+    logger.setLevel(getattr(logging, level))
+    logger.handlers.clear()
+    logger.propagate = False
+    file_handler = logging.handlers.RotatingFileHandler(
+        os.path.join(log_dir, "direct.log"), maxBytes=10 * 1024 * 1024, backupCount=5
+    )
+    file_handler.setLevel(logging.DEBUG)
+    file_handler.setFormatter(logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s'
+    ))
+    console_handler = logging.StreamHandler(open(os.devnull, "w"))
+    console_handler.setLevel(logging.INFO)
+    console_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    logger.addHandler(file_handler)
+    logger.addHandler(console_handler)
+    return logger
+
+
+def direct_helpers(logger: logging.Logger):
+    """The previous f-string helpers"""
+    def log_request(request_id, endpoint, method, user_query=None):
+        logger.info(f"Request {request_id}: {method} {endpoint}")
+        if user_query:
+            logger.info(f"Request {request_id}: User query: {user_query[:100]}...")
+
+    def log_response(request_id, response_time, status_code, cached=False):
+        logger.info(f"Request {request_id}: Response in {response_time:.2f}s, Status: {status_code}, Cached: {cached}")
+
+    def log_llm_call(request_id, model, prompt, response, duration):
+        logger.info(f"Request {request_id}: {model} call completed in {duration:.2f}s")
+        logger.debug(f"Request {request_id}: {model} prompt: {prompt[:100]}...")
+        logger.debug(f"Request {request_id}: {model} response: {response[:200]}...")
+
+    return log_request, log_response, log_llm_call
+
+
+async def measure(log_request, log_response, log_llm_call, calls: int) -> dict:
+    """Time one request's worth of logging per iteration, plus event-loop lag"""
+    lags = []
+    stop = False
+
+    async def ticker():
+        interval = 0.001
+        while not stop:
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            lags.append(max(0.0, time.perf_counter() - expected))
+
+    tick_task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+
+    samples = []
+    for i in range(calls):
+        request_id = f"req-{i}"
+        start = time.perf_counter()
+        log_request(request_id, "/api/ask", "POST", PROMPT)
+        log_llm_call(request_id, "Gemma Orchestrator", PROMPT, RESPONSE, 0.42)
+        log_llm_call(request_id, "OpenAI gpt-4o-mini", PROMPT, RESPONSE, 1.37)
+        log_response(request_id, 1.8, 200, cached=False)
+        samples.append(time.perf_counter() - start)
+        if i % 50 == 0:
+            # Yield like a real handler would so the ticker can observe lag
+            await asyncio.sleep(0)
+
+    stop = True
+    await tick_task
+    samples.sort()
+    return {
+        "mean_us": statistics.fmean(samples) * 1e6,
+        "p99_us": samples[int(len(samples) * 0.99) - 1] * 1e6,
+        "max_loop_lag_ms": max(lags) * 1e3 if lags else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--level", default="INFO", choices=["DEBUG", "INFO", "WARNING"])
+    args = parser.parse_args()
+
+    log_dir = tempfile.mkdtemp(prefix="bench_logging_")
+    os.environ["LOG_DIR"] = log_dir
+    os.environ["LOG_LEVEL"] = args.level
+
+    before = asyncio.run(measure(*direct_helpers(build_direct_logger(log_dir, args.level)), args.calls))
+
+    # Import after LOG_DIR is set; console output of the pipeline goes to /dev/null
+    stderr = sys.stderr
+    sys.stderr = open(os.devnull, "w")
+    try:
+        import logger as app_logger
+        after = asyncio.run(measure(app_logger.log_request, app_logger.log_response, app_logger.log_llm_call, args.calls))
+        app_logger.shutdown_logger()
+    finally:
+        sys.stderr = stderr
+
+    print(f"{args.calls} simulated requests at {args.level} (4 helper calls each)")
+    print(f"{'':8}{'mean us':>10}{'p99 us':>10}{'max loop lag ms':>18}")
+    for name, result in (("before", before), ("after", after)):
+        print(f"{name:8}{result['mean_us']:>10.1f}{result['p99_us']:>10.1f}{result['max_loop_lag_ms']:>18.2f}")
+    print(f"speedup: {before['mean_us'] / after['mean_us']:.1f}x per request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Per-request overhead of the request-ID middleware: BaseHTTPMiddleware vs plain ASGI.
+
+Run from the backend directory:
+
+    python benchmarks/bench_middleware.py [--requests 5000] [--chunks 20]
+
+Each variant wraps the same FastAPI app, with one JSON route and one
+streaming route, and the ASGI app is called directly (no sockets and no HTTP
+client), so the numbers are the cost of the middleware stack itself. "none"
+has no middleware. "before" reproduces the previous BaseHTTPMiddleware
+version. "after" is `main.RequestIDMiddleware`. Logging is set to WARNING,
+so the "Completed in" line is filtered the same way in both variants.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def build_app(middleware, chunks: int):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import StreamingResponse
+
+    app = FastAPI()
+
+    @app.post("/api/ask")
+    async def ask(request: Request):
+        return {"response": "answer " * 50, "request_id": getattr(request.state, "request_id", None)}
+
+    @app.post("/api/ask/stream")
+    async def ask_stream():
+        async def events():
+            for i in range(chunks):
+                yield f"data: {i}\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    if middleware is not None:
+        app.add_middleware(middleware)
+    return app
+
+
+def build_base_http_middleware():
+    """The previous RequestIDMiddleware"""
+    from starlette.middleware.base import BaseHTTPMiddleware
+    import metrics
+    from logger import logger
+
+    class OldRequestIDMiddleware(BaseHTTPMiddleware):
+        async def dispatch(self, request, call_next):
+            request.state.request_id = str(uuid.uuid4())
+            request.state.start_time = time.time()
+            metrics.requests_in_flight.inc()
+            status = 500
+            try:
+                response = await call_next(request)
+                status = response.status_code
+            finally:
+                metrics.requests_in_flight.dec()
+                path = getattr(request.scope.get("route"), "path", "unmatched")
+                metrics.http_request_duration.observe(
+                    time.time() - request.state.start_time, path=path, method=request.method, status=status
+                )
+            duration = time.time() - request.state.start_time
+            logger.info(
+                "Request %s: Completed in %.2fs", request.state.request_id, duration,
+                extra={"request_id": request.state.request_id, "stage": "http", "duration": duration, "sampled": True}
+            )
+            return response
+
+    return OldRequestIDMiddleware
+
+
+async def call(app, path: str) -> int:
+    """One POST through the ASGI app; returns the number of body chunks received"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", b"2")],
+        "client": ("127.0.0.1", 50000), "server": ("127.0.0.1", 8000)
+    }
+    body_sent = False
+    chunks = 0
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": b"{}", "more_body": False}
+        await asyncio.sleep(3600)   # never disconnects
+
+    async def send(message):
+        nonlocal chunks
+        if message["type"] == "http.response.body":
+            chunks += 1
+
+    await app(scope, receive, send)
+    return chunks
+
+
+async def measure(app, path: str, requests: int) -> dict:
+    for _ in range(50):
+        await call(app, path)
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await call(app, path)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        "mean_us": statistics.fmean(samples) * 1e6,
+        "p99_us": samples[int(len(samples) * 0.99) - 1] * 1e6
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--chunks", type=int, default=20, help="body chunks sent by the streaming route")
+    args = parser.parse_args()
+
+    # Import after the environment is set; main creates no clients until its lifespan runs
+    os.environ["LOG_DIR"] = tempfile.mkdtemp(prefix="bench_middleware_")
+    os.environ["LOG_LEVEL"] = "WARNING"
+    os.environ.setdefault("GOOGLE_API_KEY", "bench")
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    from main import RequestIDMiddleware
+    from logger import shutdown_logger
+
+    variants = {
+        "none": None,
+        "before": build_base_http_middleware(),
+        "after": RequestIDMiddleware
+    }
+    results = {}
+    for route, path in (("json", "/api/ask"), ("stream", "/api/ask/stream")):
+        for name, middleware in variants.items():
+            app = build_app(middleware, args.chunks)
+            results[(route, name)] = asyncio.run(measure(app, path, args.requests))
+    shutdown_logger()
+
+    print(f"{args.requests} requests per variant, streaming route sends {args.chunks} chunks")
+    print(f"{'':16}{'mean us':>10}{'p99 us':>10}{'overhead us':>14}")
+    for route in ("json", "stream"):
+        baseline = results[(route, "none")]["mean_us"]
+        for name in variants:
+            result = results[(route, name)]
+            print(f"{route + ' ' + name:16}{result['mean_us']:>10.1f}{result['p99_us']:>10.1f}{result['mean_us'] - baseline:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
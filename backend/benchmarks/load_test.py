@@ -0,0 +1,242 @@
+"""Offline load test of the backend against the mock LLM providers.
+
+Run from the backend directory:
+
+    python benchmarks/load_test.py [--levels 1,8,32,128] [--requests 200]
+        [--hit-ratio 0.3] [--duplicate-ratio 0.3] [--endpoint ask|stream]
+        [--latency-ms 300] [--jitter-ms 100] [--error-rate 0.0] [--seed 42]
+
+Starts `mock_llm_server.py` and the backend (uvicorn, one worker) as child
+processes on free local ports, so no API keys or network access are needed.
+Each concurrency level sends `--requests` requests drawn from three groups:
+
+    hit        one of a small warm set, answered before the run (cache hits)
+    duplicate  one of a few "hot" queries new to the level, sent concurrently
+               (exercises single-flight coalescing and then the cache)
+    unique     a query nobody has asked before (full orchestrator + executor path)
+
+For each level it reports throughput, client-side p50/p99 latency, error
+count, requests shed by admission control (429/503), and the backend's own event-loop lag (p99 and max of the
+`ai_agent_event_loop_lag_seconds` histogram over that level).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAG_METRIC = "ai_agent_event_loop_lag_seconds_bucket"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_until_ready(url: str, process: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{url} exited with code {process.returncode}")
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not become ready in {timeout}s")
+
+
+def start_processes(args, log_dir: str):
+    """Start the mock providers and the backend pointed at them"""
+    mock_port, app_port = free_port(), free_port()
+    mock_cmd = [
+        sys.executable, os.path.join(BACKEND_DIR, "benchmarks", "mock_llm_server.py"),
+        "--port", str(mock_port),
+        "--latency-ms", str(args.latency_ms),
+        "--jitter-ms", str(args.jitter_ms),
+        "--error-rate", str(args.error_rate)
+    ]
+    if args.seed is not None:
+        mock_cmd += ["--seed", str(args.seed)]
+    mock = subprocess.Popen(mock_cmd, cwd=BACKEND_DIR)
+
+    env = dict(
+        os.environ,
+        GOOGLE_API_KEY="mock",
+        OPENAI_API_KEY="mock",
+        GOOGLE_API_BASE_URL=f"http://127.0.0.1:{mock_port}/",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{mock_port}/v1",
+        REDIS_URL="",
+        LOG_DIR=log_dir,
+        LOG_LEVEL="WARNING"
+    )
+    app = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(app_port), "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env=env
+    )
+    return mock, f"http://127.0.0.1:{mock_port}", app, f"http://127.0.0.1:{app_port}"
+
+
+def unique_query(rng: random.Random) -> str:
+    # Random tokens keep unrelated queries far apart for the near-duplicate index
+    return f"What is the latest news about {rng.getrandbits(48):012x} and {rng.getrandbits(48):012x} today"
+
+
+def build_workload(rng: random.Random, count: int, warm: List[str], hit_ratio: float, duplicate_ratio: float) -> List[str]:
+    hot = [unique_query(rng) for _ in range(5)]
+    queries = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < hit_ratio:
+            queries.append(rng.choice(warm))
+        elif roll < hit_ratio + duplicate_ratio:
+            queries.append(rng.choice(hot))
+        else:
+            queries.append(unique_query(rng))
+    return queries
+
+
+async def send(client: httpx.AsyncClient, endpoint: str, query: str) -> str:
+    """Send one query and classify the outcome as ok, shed or error"""
+    if endpoint == "stream":
+        async with client.stream("POST", "/api/ask/stream", json={"query": query}) as response:
+            body = b"".join([chunk async for chunk in response.aiter_bytes()])
+        if response.status_code == 200 and b"event: done" in body:
+            return "ok"
+        return "shed" if b'"retry_after"' in body else "error"
+    response = await client.post("/api/ask", json={"query": query})
+    if response.status_code == 200:
+        return "ok"
+    return "shed" if response.status_code in (429, 503) else "error"
+
+
+async def lag_buckets(client: httpx.AsyncClient) -> Dict[float, int]:
+    """Cumulative event-loop lag histogram buckets as le -> count"""
+    text = (await client.get("/metrics")).text
+    buckets = {}
+    for line in text.splitlines():
+        if line.startswith(LAG_METRIC):
+            le = line.split('le="', 1)[1].split('"', 1)[0]
+            buckets[float("inf") if le == "+Inf" else float(le)] = int(line.rsplit(" ", 1)[1])
+    return buckets
+
+
+def lag_quantiles(before: Dict[float, int], after: Dict[float, int]) -> dict:
+    """p99 and max (upper bucket bounds) of the lag samples taken between two scrapes"""
+    bounds = sorted(after)
+    deltas = [after[b] - before.get(b, 0) for b in bounds]
+    total = deltas[-1] if deltas else 0
+    if not total:
+        return {"samples": 0, "p99": 0.0, "max": 0.0}
+    p99 = next(b for b, d in zip(bounds, deltas) if d >= 0.99 * total)
+    maximum = next(b for b, d in zip(bounds, deltas) if d == total)
+    return {"samples": total, "p99": p99, "max": maximum}
+
+
+async def run_level(client: httpx.AsyncClient, endpoint: str, concurrency: int, queries: List[str]) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    outcomes = {"ok": 0, "shed": 0, "error": 0}
+
+    async def one(query: str):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                outcome = await send(client, endpoint, query)
+            except httpx.HTTPError:
+                outcome = "error"
+            latencies.append(time.perf_counter() - start)
+            outcomes[outcome] += 1
+
+    before = await lag_buckets(client)
+    start = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in queries))
+    elapsed = time.perf_counter() - start
+    after = await lag_buckets(client)
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": len(queries),
+        "errors": outcomes["error"],
+        "shed": outcomes["shed"],
+        "rps": round(len(queries) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))] * 1000, 1),
+        "loop_lag": lag_quantiles(before, after)
+    }
+
+
+async def run(args) -> List[dict]:
+    rng = random.Random(args.seed)
+    levels = [int(level) for level in args.levels.split(",")]
+    with tempfile.TemporaryDirectory() as log_dir:
+        mock, mock_url, app, app_url = start_processes(args, log_dir)
+        try:
+            await wait_until_ready(f"{mock_url}/health", mock)
+            await wait_until_ready(f"{app_url}/healthz/", app)
+            limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+            async with httpx.AsyncClient(base_url=app_url, limits=limits, timeout=60.0) as client:
+                warm = [unique_query(rng) for _ in range(20)]
+                await asyncio.gather(*(send(client, "ask", q) for q in warm))
+                results = []
+                for concurrency in levels:
+                    queries = build_workload(rng, args.requests, warm, args.hit_ratio, args.duplicate_ratio)
+                    results.append(await run_level(client, args.endpoint, concurrency, queries))
+                    print(format_row(results[-1]), flush=True)
+                return results
+        finally:
+            for process in (app, mock):
+                process.terminate()
+                process.wait(timeout=10)
+
+
+def format_row(result: dict) -> str:
+    lag = result["loop_lag"]
+    return (
+        f"{result['concurrency']:>11} {result['requests']:>8} {result['rps']:>8} "
+        f"{result['p50_ms']:>8} {result['p99_ms']:>8} {result['errors']:>6} {result['shed']:>6} "
+        f"{lag['p99'] * 1000:>12.1f} {lag['max'] * 1000:>12.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test against mock LLM providers")
+    parser.add_argument("--levels", default="1,8,32,128", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per level")
+    parser.add_argument("--hit-ratio", type=float, default=0.3, help="share of requests for warm (cached) queries")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.3, help="share of requests for a few hot new queries")
+    parser.add_argument("--endpoint", choices=("ask", "stream"), default="ask")
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    print(f"endpoint=/api/{args.endpoint} hit_ratio={args.hit_ratio} duplicate_ratio={args.duplicate_ratio} "
+          f"upstream={args.latency_ms}±{args.jitter_ms}ms error_rate={args.error_rate}")
+    print(f"{'concurrency':>11} {'requests':>8} {'rps':>8} {'p50_ms':>8} {'p99_ms':>8} {'errors':>6} {'shed':>6} "
+          f"{'lag_p99_ms':>12} {'lag_max_ms':>12}")
+    results = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Local stand-in for Google AI Studio (Gemma) and the OpenAI chat API.
+
+Serves just enough of both APIs for the backend clients to work offline:
+
+    POST /v1beta/models/{model}:generateContent    (google-genai)
+    POST /v1/chat/completions                      (openai, with stream=True)
+
+Run from the backend directory:
+
+    python benchmarks/mock_llm_server.py --port 9100 --latency-ms 300 --jitter-ms 100 --error-rate 0.01
+
+then point the backend at it:
+
+    GOOGLE_API_BASE_URL=http://127.0.0.1:9100/
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1
+
+Latency is drawn per call as `latency ± jitter` (uniform). A fraction
+`error-rate` of calls answers 503 after the same delay. Streaming responses
+split the answer into `--stream-chunks` deltas spaced by `--chunk-delay-ms`.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from dataclasses import dataclass
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+ANSWER = (
+    "A time-to-live cache keeps every entry together with its expiry time and drops it "
+    "once that time has passed, so repeated questions are answered without calling the model again."
+)
+
+
+@dataclass
+class MockConfig:
+    latency_ms: float = 300.0
+    jitter_ms: float = 100.0
+    error_rate: float = 0.0
+    stream_chunks: int = 20
+    chunk_delay_ms: float = 15.0
+    seed: int = None
+
+
+def create_app(config: MockConfig) -> FastAPI:
+    """Build the mock provider app for the given behaviour"""
+    app = FastAPI(title="Mock LLM providers")
+    rng = random.Random(config.seed)
+    calls = {"google": 0, "openai": 0, "errors": 0}
+
+    async def simulate_call() -> bool:
+        """Sleep for one call's latency and return False if the call should fail"""
+        delay = config.latency_ms + rng.uniform(-config.jitter_ms, config.jitter_ms)
+        await asyncio.sleep(max(0.0, delay) / 1000)
+        if rng.random() < config.error_rate:
+            calls["errors"] += 1
+            return False
+        return True
+
+    def error_response() -> JSONResponse:
+        return JSONResponse(
+            status_code=503,
+            content={"error": {"code": 503, "message": "mock upstream overloaded", "status": "UNAVAILABLE"}}
+        )
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "calls": calls}
+
+    @app.post("/v1beta/models/{model_action}")
+    async def generate_content(model_action: str, request: Request):
+        calls["google"] += 1
+        body = await request.json()
+        if not await simulate_call():
+            return error_response()
+        # Echo the user query back as the "optimized" question
+        prompt = body["contents"][0]["parts"][0]["text"]
+        query = prompt.split("User Query:", 1)[-1].split("\n", 1)[0].strip() or prompt[:200]
+        return {
+            "candidates": [{
+                "content": {"role": "model", "parts": [{"text": query}]},
+                "finishReason": "STOP",
+                "index": 0
+            }],
+            "usageMetadata": {
+                "promptTokenCount": len(prompt) // 4,
+                "candidatesTokenCount": len(query) // 4,
+                "totalTokenCount": (len(prompt) + len(query)) // 4
+            },
+            "modelVersion": model_action.split(":", 1)[0]
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        calls["openai"] += 1
+        body = await request.json()
+        if not await simulate_call():
+            return error_response()
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = body.get("model", "mock")
+        prompt_tokens = sum(len(m.get("content", "")) for m in body.get("messages", [])) // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(ANSWER) // 4,
+            "total_tokens": prompt_tokens + len(ANSWER) // 4
+        }
+
+        if not body.get("stream"):
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": ANSWER},
+                    "finish_reason": "stop"
+                }],
+                "usage": usage
+            }
+
+        async def events():
+            def chunk(delta: dict, finish_reason=None, chunk_usage=None) -> str:
+                payload = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if delta is not None else [],
+                    "usage": chunk_usage
+                }
+                return f"data: {json.dumps(payload)}\n\n"
+
+            words = ANSWER.split(" ")
+            size = max(1, len(words) // max(1, config.stream_chunks))
+            yield chunk({"role": "assistant", "content": ""})
+            for i in range(0, len(words), size):
+                await asyncio.sleep(config.chunk_delay_ms / 1000)
+                text = " ".join(words[i:i + size])
+                yield chunk({"content": text if i == 0 else " " + text})
+            yield chunk({}, finish_reason="stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield chunk(None, chunk_usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=MockConfig.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=MockConfig.jitter_ms)
+    parser.add_argument("--error-rate", type=float, default=MockConfig.error_rate)
+    parser.add_argument("--stream-chunks", type=int, default=MockConfig.stream_chunks)
+    parser.add_argument("--chunk-delay-ms", type=float, default=MockConfig.chunk_delay_ms)
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    import uvicorn
+
+    args = parse_args(argv)
+    config = MockConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        stream_chunks=args.stream_chunks,
+        chunk_delay_ms=args.chunk_delay_ms,
+        seed=args.seed
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
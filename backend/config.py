@@ -24,16 +24,106 @@ class Settings:
     # HTTP Configuration
     HTTP_REQUEST_TIMEOUT_S: int = int(os.getenv("HTTP_REQUEST_TIMEOUT_S", 30))
     MAX_RETRIES: int = int(os.getenv("MAX_RETRIES", 2))
+    RETRY_BASE_DELAY_S: float = float(os.getenv("RETRY_BASE_DELAY_S", 0.25))
+    RETRY_MAX_DELAY_S: float = float(os.getenv("RETRY_MAX_DELAY_S", 4))
+    
+    # Request deadline (end-to-end budget shared by the orchestrator and executor stages)
+    REQUEST_DEADLINE_S: float = float(os.getenv("REQUEST_DEADLINE_S", 45))
+    ORCHESTRATOR_BUDGET_SHARE: float = float(os.getenv("ORCHESTRATOR_BUDGET_SHARE", 0.3))  # of the time left
+    
+    # Hedged executor calls (a duplicate call once the first is slower than the HEDGE_QUANTILE latency)
+    HEDGE_ENABLED: bool = os.getenv("HEDGE_ENABLED", "false").lower() == "true"
+    HEDGE_QUANTILE: float = float(os.getenv("HEDGE_QUANTILE", 0.95))
+    HEDGE_MIN_DELAY_S: float = float(os.getenv("HEDGE_MIN_DELAY_S", 0.5))
+    HEDGE_MIN_SAMPLES: int = int(os.getenv("HEDGE_MIN_SAMPLES", 20))  # latency samples needed before hedging
+    HEDGE_MAX_RATIO: float = float(os.getenv("HEDGE_MAX_RATIO", 0.1))  # hedges per executor call, caps extra cost
+    
+    # LLM HTTP connection pools (one pool per provider, shared by all requests)
+    LLM_MAX_CONNECTIONS: int = int(os.getenv("LLM_MAX_CONNECTIONS", 100))
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", 20))
+    LLM_KEEPALIVE_EXPIRY_S: float = float(os.getenv("LLM_KEEPALIVE_EXPIRY_S", 30))
+    
+    # Client disconnects (cancel upstream work nobody waits for any more, or let it finish to fill the cache)
+    CANCEL_ORPHANED_WORK: bool = os.getenv("CANCEL_ORPHANED_WORK", "true").lower() == "true"
+    
+    # Batch Configuration
+    BATCH_MAX_ITEMS: int = int(os.getenv("BATCH_MAX_ITEMS", 1000))
+    BATCH_CONCURRENCY: int = int(os.getenv("BATCH_CONCURRENCY", 8))
     
     # Cache Configuration
     CACHE_TTL_SECONDS: int = int(os.getenv("CACHE_TTL_SECONDS", 600))
     CACHE_MAX_SIZE: int = int(os.getenv("CACHE_MAX_SIZE", 1000))
+    # Expired answers are served (marked stale) for this long while one background refresh runs, 0 = off
+    CACHE_STALE_GRACE_S: int = int(os.getenv("CACHE_STALE_GRACE_S", 300))
+    CACHE_MAX_BYTES: int = int(os.getenv("CACHE_MAX_BYTES", 64 * 1024 * 1024))  # keys + stored values, 0 = no cap
+    CACHE_COMPRESSION: str = os.getenv("CACHE_COMPRESSION", "zlib").lower()  # zlib or none
+    CACHE_COMPRESSION_MIN_BYTES: int = int(os.getenv("CACHE_COMPRESSION_MIN_BYTES", 256))
+    
+    # Near-duplicate lookup (MinHash over character n-grams of normalized queries)
+    SIMILARITY_ENABLED: bool = os.getenv("SIMILARITY_ENABLED", "true").lower() == "true"
+    SIMILARITY_THRESHOLD: float = float(os.getenv("SIMILARITY_THRESHOLD", 0.9))
+    SIMILARITY_NUM_PERM: int = int(os.getenv("SIMILARITY_NUM_PERM", 64))
+    SIMILARITY_BANDS: int = int(os.getenv("SIMILARITY_BANDS", 16))
+    SIMILARITY_MAX_SHINGLES: int = int(os.getenv("SIMILARITY_MAX_SHINGLES", 64))  # n-grams hashed per signature
+    
+    # Redis L2 Cache Configuration (empty REDIS_URL keeps the cache in-process only)
+    REDIS_URL: str = os.getenv("REDIS_URL", "")
+    REDIS_KEY_PREFIX: str = os.getenv("REDIS_KEY_PREFIX", "ai_agent:answer:")
+    REDIS_MAX_CONNECTIONS: int = int(os.getenv("REDIS_MAX_CONNECTIONS", 20))
+    REDIS_SOCKET_TIMEOUT_S: float = float(os.getenv("REDIS_SOCKET_TIMEOUT_S", 0.5))
+    REDIS_RETRY_INTERVAL_S: float = float(os.getenv("REDIS_RETRY_INTERVAL_S", 5))
+    
+    # Warm restarts: answer cache snapshot on disk, e.g. data/answer_cache.snapshot (off while empty)
+    CACHE_SNAPSHOT_PATH: str = os.getenv("CACHE_SNAPSHOT_PATH", "")
+    CACHE_SNAPSHOT_INTERVAL_S: float = float(os.getenv("CACHE_SNAPSHOT_INTERVAL_S", 300))
+    CACHE_SNAPSHOT_MAX_BYTES: int = int(os.getenv("CACHE_SNAPSHOT_MAX_BYTES", 16 * 1024 * 1024))
     
     # LLM Configuration
     GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY", "")
+    GOOGLE_API_BASE_URL: str = os.getenv("GOOGLE_API_BASE_URL", "")  # empty = Google AI Studio
     GEMMA_ORCHESTRATOR_MODEL: str = os.getenv("GEMMA_ORCHESTRATOR_MODEL", "gemma-3-1b-it")
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
+    OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL", "")  # empty = api.openai.com
     OPENAI_EXECUTOR_MODEL: str = os.getenv("OPENAI_EXECUTOR_MODEL", "gpt-4o-mini")
+    
+    # Executor routing: JSON list of OpenAI-compatible backends, empty = only the OPENAI_* executor above
+    EXECUTOR_BACKENDS: str = os.getenv("EXECUTOR_BACKENDS", "")
+    EXECUTOR_EWMA_ALPHA: float = float(os.getenv("EXECUTOR_EWMA_ALPHA", 0.2))
+    EXECUTOR_ERROR_PENALTY_S: float = float(os.getenv("EXECUTOR_ERROR_PENALTY_S", 10))  # added to the score per unit of error rate
+    EXECUTOR_EXPLORE_RATE: float = float(os.getenv("EXECUTOR_EXPLORE_RATE", 0.05))
+    
+    # Admission Control (per provider, RPM/TPM of 0 = no rate limit)
+    ADMISSION_ENABLED: bool = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    ADMISSION_MAX_QUEUE: int = int(os.getenv("ADMISSION_MAX_QUEUE", 100))  # calls waiting per provider before shedding
+    ADMISSION_MAX_WAIT_S: float = float(os.getenv("ADMISSION_MAX_WAIT_S", 10))
+    GEMMA_MAX_CONCURRENCY: int = int(os.getenv("GEMMA_MAX_CONCURRENCY", 16))
+    GEMMA_RPM: int = int(os.getenv("GEMMA_RPM", 0))
+    GEMMA_TPM: int = int(os.getenv("GEMMA_TPM", 0))
+    OPENAI_MAX_CONCURRENCY: int = int(os.getenv("OPENAI_MAX_CONCURRENCY", 64))
+    OPENAI_RPM: int = int(os.getenv("OPENAI_RPM", 0))
+    OPENAI_TPM: int = int(os.getenv("OPENAI_TPM", 0))
+    
+    # Circuit Breakers (one per upstream model; a call slower than its *_SLOW_CALL_S counts as failed)
+    CIRCUIT_BREAKER_ENABLED: bool = os.getenv("CIRCUIT_BREAKER_ENABLED", "true").lower() == "true"
+    CIRCUIT_FAILURE_RATE: float = float(os.getenv("CIRCUIT_FAILURE_RATE", 0.5))
+    CIRCUIT_WINDOW: int = int(os.getenv("CIRCUIT_WINDOW", 20))  # most recent calls considered
+    CIRCUIT_MIN_CALLS: int = int(os.getenv("CIRCUIT_MIN_CALLS", 10))
+    CIRCUIT_COOLDOWN_S: float = float(os.getenv("CIRCUIT_COOLDOWN_S", 30))
+    CIRCUIT_HALF_OPEN_PROBES: int = int(os.getenv("CIRCUIT_HALF_OPEN_PROBES", 1))
+    GEMMA_SLOW_CALL_S: float = float(os.getenv("GEMMA_SLOW_CALL_S", 5))
+    OPENAI_SLOW_CALL_S: float = float(os.getenv("OPENAI_SLOW_CALL_S", 20))
+    
+    # Orchestrator Stage Configuration
+    ORCHESTRATOR_BYPASS_ENABLED: bool = os.getenv("ORCHESTRATOR_BYPASS_ENABLED", "true").lower() == "true"
+    ORCHESTRATOR_BYPASS_MAX_WORDS: int = int(os.getenv("ORCHESTRATOR_BYPASS_MAX_WORDS", 6))
+    ORCHESTRATOR_CACHE_TTL_SECONDS: int = int(os.getenv("ORCHESTRATOR_CACHE_TTL_SECONDS", 3600))
+    ORCHESTRATOR_CACHE_MAX_SIZE: int = int(os.getenv("ORCHESTRATOR_CACHE_MAX_SIZE", 5000))
+    # Start the executor on the raw query while Gemma rewrites it; keep that answer if the rewrite is equivalent
+    SPECULATIVE_EXECUTION_ENABLED: bool = os.getenv("SPECULATIVE_EXECUTION_ENABLED", "false").lower() == "true"
+    SPECULATIVE_SIMILARITY_THRESHOLD: float = float(os.getenv("SPECULATIVE_SIMILARITY_THRESHOLD", 0.8))
+
+    # Monitoring Configuration
+    EVENT_LOOP_MONITOR_INTERVAL_S: float = float(os.getenv("EVENT_LOOP_MONITOR_INTERVAL_S", 0.25))  # 0 disables
 
     # Logging Configuration
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
@@ -41,6 +131,8 @@ class Settings:
     LOG_FILE: str = os.getenv("LOG_FILE", "ai_agent.log")
     LOG_MAX_SIZE: int = int(os.getenv("LOG_MAX_SIZE", 10 * 1024 * 1024))  # 10MB
     LOG_BACKUP_COUNT: int = int(os.getenv("LOG_BACKUP_COUNT", 5))
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text").lower()  # text or json
+    LOG_INFO_SAMPLE_RATE: float = float(os.getenv("LOG_INFO_SAMPLE_RATE", 1.0))  # share of per-request INFO lines kept
 
 # Global settings instance
 settings = Settings()
@@ -0,0 +1,31 @@
+from fastapi import Request
+from services.cache_service import CacheService
+from services.single_flight import SingleFlight
+from services.llm_service import LLMService
+from services.admission import AdmissionController
+from services.orchestrator_service import OrchestratorService
+
+
+def get_cache_service(request: Request) -> CacheService:
+    """Return the process-wide cache created in the app lifespan"""
+    return request.app.state.cache_service
+
+
+def get_single_flight(request: Request) -> SingleFlight:
+    """Return the process-wide registry of in-flight /api/ask queries"""
+    return request.app.state.single_flight
+
+
+def get_llm_service(request: Request) -> LLMService:
+    """Return the process-wide LLM service with its pooled clients"""
+    return request.app.state.llm_service
+
+
+def get_admission(request: Request) -> AdmissionController:
+    """Return the process-wide admission controller in front of the LLM clients"""
+    return request.app.state.admission
+
+
+def get_orchestrator(request: Request) -> OrchestratorService:
+    """Return the process-wide orchestrator stage (bypass rules and rewrite cache)"""
+    return request.app.state.orchestrator
@@ -0,0 +1,34 @@
+import asyncio
+from typing import Any, Awaitable
+from fastapi import Request
+
+
+class ClientDisconnected(Exception):
+    """The client closed the connection before its answer was ready"""
+
+
+async def wait_for_disconnect(request: Request) -> None:
+    """Return once the server reports that the client has gone away.
+
+    The request body has already been read by the time a route runs, so the
+    next ASGI message can only be `http.disconnect`; waiting on it costs nothing
+    while the client is still connected.
+    """
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[Any]) -> Any:
+    """Await `awaitable`, cancelling it and raising ClientDisconnected if the client leaves first"""
+    work = asyncio.ensure_future(awaitable)
+    watcher = asyncio.ensure_future(wait_for_disconnect(request))
+    try:
+        await asyncio.wait({work, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        if work.done():
+            return work.result()
+        raise ClientDisconnected()
+    finally:
+        watcher.cancel()
+        work.cancel()
@@ -0,0 +1,31 @@
+import httpx
+from google import genai
+from google.genai import types
+from config import settings
+
+
+def create_transport() -> httpx.AsyncHTTPTransport:
+    """Pooled keep-alive transport for Google AI Studio calls"""
+    return httpx.AsyncHTTPTransport(
+        limits=httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY_S
+        )
+    )
+
+
+def create_client(transport: httpx.AsyncHTTPTransport) -> genai.Client:
+    """Create the Google GenAI client, async calls go through `client.aio` on the given transport.
+
+    Passing our own transport also keeps the SDK on httpx instead of aiohttp, so
+    closing the transport on shutdown releases every pooled connection.
+    """
+    return genai.Client(
+        api_key=settings.GOOGLE_API_KEY,
+        http_options=types.HttpOptions(
+            base_url=settings.GOOGLE_API_BASE_URL or None,
+            timeout=settings.HTTP_REQUEST_TIMEOUT_S * 1000,  # milliseconds
+            async_client_args={"transport": transport}
+        )
+    )
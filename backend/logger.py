@@ -1,31 +1,98 @@
+import atexit
+import json
 import logging
 import logging.handlers
 import os
-from datetime import datetime
+import queue
+import random
+from datetime import datetime, timezone
 from config import settings
 
 
+# Structured fields the helpers below attach to records via `extra`
+STRUCTURED_FIELDS = ("request_id", "stage", "endpoint", "method", "model", "duration", "status_code", "cached")
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the structured fields as top-level keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "function": record.funcName,
+            "line": record.lineno
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of INFO records marked with `extra={"sampled": True}`"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate >= 1.0 or record.levelno > logging.INFO or not getattr(record, "sampled", False):
+            return True
+        return random.random() < self.rate
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    The stock `prepare()` formats the message in the calling thread, which
+    would put the formatting cost back on the event loop. Records only cross a
+    thread boundary here, so they can be queued as they are.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+_listener = None
+
+
 def setup_logger():
-    """Setup and configure the application logger"""
-    
+    """Setup and configure the application logger.
+
+    Callers only put records on an in-memory queue; a background listener
+    thread formats them and does the file and console I/O.
+    """
+    global _listener
+
     # Create logs directory if it doesnt exist
     os.makedirs(settings.LOG_DIR, exist_ok=True)
-    
+
     # Create logger
     logger = logging.getLogger("ai_agent")
     logger.setLevel(getattr(logging, settings.LOG_LEVEL.upper()))
-    
+
     # Clear up the existing handlers
     logger.handlers.clear()
-    
+    if _listener is not None:
+        _listener.stop()
+
     # Create formatters
-    detailed_formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s'
-    )
-    simple_formatter = logging.Formatter(
-        '%(asctime)s - %(levelname)s - %(message)s'
-    )
-    
+    if settings.LOG_FORMAT == "json":
+        detailed_formatter = simple_formatter = JsonFormatter()
+    else:
+        detailed_formatter = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s'
+        )
+        simple_formatter = logging.Formatter(
+            '%(asctime)s - %(levelname)s - %(message)s'
+        )
+
     # file handler with rotation
     log_file_path = os.path.join(settings.LOG_DIR, settings.LOG_FILE)
     file_handler = logging.handlers.RotatingFileHandler(
@@ -35,39 +102,65 @@ def setup_logger():
     )
     file_handler.setLevel(logging.DEBUG)
     file_handler.setFormatter(detailed_formatter)
-    
+
     # Console handler
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(simple_formatter)
-    
-    # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    
+
+    # Queue handler on the logger, the listener thread owns the real handlers
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(settings.LOG_INFO_SAMPLE_RATE))
+    logger.addHandler(queue_handler)
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True
+    )
+    _listener.start()
+
     return logger
 
 
+def shutdown_logger():
+    """Flush queued records and stop the background writer"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
 # Create and export logger instance
 logger = setup_logger()
+atexit.register(shutdown_logger)
 
 
 def log_request(request_id: str, endpoint: str, method: str, user_query: str = None):
     """Log incoming request details"""
-    logger.info(f"Request {request_id}: {method} {endpoint}")
+    fields = {"request_id": request_id, "stage": "request", "endpoint": endpoint, "method": method, "sampled": True}
+    logger.info("Request %s: %s %s", request_id, method, endpoint, extra=fields)
     if user_query:
-        logger.info(f"Request {request_id}: User query: {user_query[:100]}...")
+        logger.info("Request %s: User query: %.100s...", request_id, user_query, extra=fields)
 
 def log_response(request_id: str, response_time: float, status_code: int, cached: bool = False):
     """Log response details"""
-    logger.info(f"Request {request_id}: Response in {response_time:.2f}s, Status: {status_code}, Cached: {cached}")
+    logger.info(
+        "Request %s: Response in %.2fs, Status: %s, Cached: %s", request_id, response_time, status_code, cached,
+        extra={"request_id": request_id, "stage": "response", "duration": response_time,
+               "status_code": status_code, "cached": cached, "sampled": True}
+    )
 
 def log_error(request_id: str, error: Exception, context: str = ""):
     """Log error details"""
-    logger.error(f"Request {request_id}: Error in {context}: {str(error)}", exc_info=True)
+    logger.error(
+        "Request %s: Error in %s: %s", request_id, context, error, exc_info=True,
+        extra={"request_id": request_id, "stage": context}
+    )
 
 def log_llm_call(request_id: str, model: str, prompt: str, response: str, duration: float):
     """Log LLM API call details"""
-    logger.info(f"Request {request_id}: {model} call completed in {duration:.2f}s")
-    logger.debug(f"Request {request_id}: {model} prompt: {prompt[:100]}...")
-    logger.debug(f"Request {request_id}: {model} response: {response[:200]}...")
\ No newline at end of file
+    fields = {"request_id": request_id, "stage": "llm", "model": model, "duration": duration}
+    logger.info("Request %s: %s call completed in %.2fs", request_id, model, duration, extra=fields)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Request %s: %s prompt: %.100s...", request_id, model, prompt, extra=fields)
+        logger.debug("Request %s: %s response: %.200s...", request_id, model, response, extra=fields)
@@ -1,29 +1,86 @@
+import asyncio
+import re
 import uuid      # to give IDs to requests
 import time
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from config import settings
-from logger import logger, setup_logger
-from routes import health, ai_agent
+from logger import logger, setup_logger, shutdown_logger
+import metrics
+from routes import health, ai_agent, metrics as metrics_route
+from services.cache_service import CacheService
+from services.single_flight import SingleFlight
+from services.llm_service import LLMService
+from services.admission import AdmissionController
+from services.orchestrator_service import OrchestratorService
 
 
-class RequestIDMiddleware(BaseHTTPMiddleware):
+# Incoming X-Request-ID values are reused only if they look like an ID (they end up in logs)
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+
+class RequestIDMiddleware:
     #   МИДДЛВЕР СОЗДАЕМ ВНУТРИ main.py потому что этот класс мы больше нигде не используем. И эффективнее быстро создать его здесь рядом, чтобы не обращаться к другим модулям. 
-    """Middleware to add request ID to each request"""
+    """Middleware to add request ID to each request.
+
+    Plain ASGI: the response, streamed or not, passes straight through, and
+    only the start message is touched to add `X-Request-ID` and `Server-Timing`
+    (the cache/orchestrator/executor stages that finished before the headers
+    were sent, plus the total so far).
+    """
     
-    async def dispatch(self, request: Request, call_next):
-        request.state.request_id = str(uuid.uuid4())
-        request.state.start_time = time.time()
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
         
-        response = await call_next(request)
+        incoming = Headers(scope=scope).get("x-request-id", "")
+        request_id = incoming if REQUEST_ID_PATTERN.match(incoming) else str(uuid.uuid4())
+        start_time = time.perf_counter()
+        # Exposed to routes as request.state.request_id / request.state.start_time
+        state = scope.setdefault("state", {})
+        state["request_id"] = request_id
+        state["start_time"] = start_time
+        timings = {}
+        timings_token = metrics.request_timings.set(timings)
+        status = 500
+        end_time = None
         
-        # log request completion
-        duration = time.time() - request.state.start_time
-        logger.info(f"Request {request.state.request_id}: Completed in {duration:.2f}s")
+        async def send_with_headers(message: Message):
+            nonlocal status, end_time
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                # Background tasks run after this, they are not part of the request latency
+                end_time = time.perf_counter()
+            elif message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("X-Request-ID", request_id)
+                headers.append("Server-Timing", metrics.server_timing(timings, time.perf_counter() - start_time))
+                headers.append("Timing-Allow-Origin", ", ".join(settings.ALLOWED_ORIGINS))
+            await send(message)
         
-        return response
+        metrics.requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            metrics.request_timings.reset(timings_token)
+            metrics.requests_in_flight.dec()
+            duration = (end_time or time.perf_counter()) - start_time
+            # Route template, not the raw path, to keep label cardinality bounded
+            path = getattr(scope.get("route"), "path", "unmatched")
+            metrics.http_request_duration.observe(duration, path=path, method=scope["method"], status=status)
+            
+            # log request completion
+            logger.info(
+                "Request %s: Completed in %.2fs", request_id, duration,
+                extra={"request_id": request_id, "stage": "http", "duration": duration, "sampled": True}
+            )
 
 
 @asynccontextmanager
@@ -32,14 +89,33 @@ async def lifespan(app: FastAPI):
     
     # Start it up
     logger.info("Starting AI Agent Backend...")
-    logger.info(f"Environment: {settings.LOG_LEVEL}")
-    logger.info(f"Cache TTL: {settings.CACHE_TTL_SECONDS}s")
-    logger.info(f"Max Retries: {settings.MAX_RETRIES}")
-    logger.info(f"HTTP Timeout: {settings.HTTP_REQUEST_TIMEOUT_S}s")
+    logger.info("Environment: %s", settings.LOG_LEVEL)
+    logger.info("Cache TTL: %ss", settings.CACHE_TTL_SECONDS)
+    logger.info("Max Retries: %s", settings.MAX_RETRIES)
+    logger.info("HTTP Timeout: %ss", settings.HTTP_REQUEST_TIMEOUT_S)
+    
+    # One cache per process, shared by every request through dependencies.get_cache_service
+    app.state.cache_service = CacheService()
+    await app.state.cache_service.connect()
+    app.state.single_flight = SingleFlight()
+    # LLM clients and their connection pools live for the whole process
+    # Admission control sits between the services and the LLM clients
+    app.state.admission = AdmissionController()
+    app.state.llm_service = LLMService(app.state.admission)
+    app.state.orchestrator = OrchestratorService(app.state.llm_service)
+    
+    loop_watcher = None
+    if settings.EVENT_LOOP_MONITOR_INTERVAL_S > 0:
+        loop_watcher = asyncio.create_task(metrics.watch_event_loop(settings.EVENT_LOOP_MONITOR_INTERVAL_S))
     
     yield
      
     logger.info("Shutting down AI Agent Backend...")
+    if loop_watcher:
+        loop_watcher.cancel()
+    await app.state.llm_service.close()
+    await app.state.cache_service.close()
+    shutdown_logger()
 
 
 app = FastAPI(
@@ -58,12 +134,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "Server-Timing"],
 )
 
 
 # Include routers
 app.include_router(health.router)
 app.include_router(ai_agent.router)
+app.include_router(metrics_route.router)
 
 
 # Root endpoint
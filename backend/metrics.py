@@ -0,0 +1,314 @@
+import asyncio
+import bisect
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+# Latency buckets in seconds, from cache lookups (sub-ms) up to slow LLM calls
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0
+)
+
+
+def _label_key(labelnames: Sequence[str], labels: Dict[str, str]) -> Tuple[str, ...]:
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: Sequence[str], key: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, key)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _label_key(self.labelnames, labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(_label_key(self.labelnames, labels), 0.0)
+
+    def render(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in self._values.items()
+        ]
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        self._values[_label_key(self.labelnames, labels)] = value
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    """Fixed-bucket histogram; observing is one bisect and three additions"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum, count
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(self.labelnames, labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(_label_key(self.labelnames, labels))
+        return series[2] if series else 0
+
+    def quantile(self, q: float, **labels) -> float:
+        """Estimate a quantile by linear interpolation inside the matching bucket"""
+        series = self._series.get(_label_key(self.labelnames, labels))
+        if not series or not series[2]:
+            return 0.0
+        rank = q * series[2]
+        seen = 0
+        lower = 0.0
+        for i, bucket_count in enumerate(series[0]):
+            upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+            if seen + bucket_count >= rank and bucket_count:
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+            lower = upper
+        return self.buckets[-1]
+
+    def summary(self, **labels) -> dict:
+        """count, mean and p50/p95/p99 for one label set"""
+        series = self._series.get(_label_key(self.labelnames, labels))
+        if not series or not series[2]:
+            return {"count": 0}
+        return {
+            "count": series[2],
+            "mean": round(series[1] / series[2], 4),
+            "p50": round(self.quantile(0.50, **labels), 4),
+            "p95": round(self.quantile(0.95, **labels), 4),
+            "p99": round(self.quantile(0.99, **labels), 4)
+        }
+
+    def label_sets(self) -> List[Dict[str, str]]:
+        return [dict(zip(self.labelnames, key)) for key in self._series]
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, (bucket_counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), bucket_counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide metrics, updated from the event loop and rendered for /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, description: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, description, labelnames))
+
+    def gauge(self, name: str, description: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, description, labelnames))
+
+    def histogram(self, name: str, description: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, description, labelnames, buckets))
+
+    def render(self) -> str:
+        """Prometheus text exposition format (0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Create and export the registry and the application metrics
+registry = MetricsRegistry()
+
+http_request_duration = registry.histogram(
+    "ai_agent_http_request_duration_seconds", "HTTP request latency", ("path", "method", "status")
+)
+requests_in_flight = registry.gauge(
+    "ai_agent_requests_in_flight", "HTTP requests currently being handled"
+)
+stage_duration = registry.histogram(
+    "ai_agent_stage_duration_seconds", "Pipeline stage latency (cache_lookup, orchestrator, executor)", ("stage",)
+)
+llm_call_duration = registry.histogram(
+    "ai_agent_llm_call_duration_seconds", "Upstream LLM call latency", ("model", "outcome")
+)
+llm_tokens = registry.counter(
+    "ai_agent_llm_tokens_total", "Tokens reported by the provider responses", ("model", "kind")
+)
+cache_lookups = registry.counter(
+    "ai_agent_cache_lookups_total", "Answer cache lookups by result", ("result",)
+)
+cache_evictions = registry.counter(
+    "ai_agent_cache_evictions_total", "Answer cache entries dropped by reason (expired, max_entries, max_bytes, too_large)", ("reason",)
+)
+cache_refreshes = registry.counter(
+    "ai_agent_cache_refreshes_total", "Background refreshes of stale answers (started, succeeded, failed, deduplicated)", ("outcome",)
+)
+orchestrator_path = registry.counter(
+    "ai_agent_orchestrator_total", "Orchestrator stage outcomes (bypass, cache, gemma, fallback, circuit_open, disabled)", ("source",)
+)
+executor_routed = registry.counter(
+    "ai_agent_executor_routed_total", "Executor calls routed to each backend", ("backend",)
+)
+executor_failovers = registry.counter(
+    "ai_agent_executor_failovers_total", "Executor calls moved to another backend after this one failed", ("backend",)
+)
+executor_latency_ewma = registry.gauge(
+    "ai_agent_executor_latency_ewma_seconds", "Moving average of successful executor call latency per backend", ("backend",)
+)
+executor_error_rate = registry.gauge(
+    "ai_agent_executor_error_rate", "Moving average of the executor error share per backend", ("backend",)
+)
+speculative_executions = registry.counter(
+    "ai_agent_speculative_executions_total", "Executor runs on the raw query started next to the orchestrator, by whether the answer was used", ("outcome",)
+)
+speculative_extra_tokens = registry.counter(
+    "ai_agent_speculative_extra_tokens_total", "Estimated executor tokens spent on discarded speculative runs"
+)
+errors = registry.counter(
+    "ai_agent_errors_total", "Errors by pipeline stage and exception type", ("stage", "error_type")
+)
+llm_retries = registry.counter(
+    "ai_agent_llm_retries_total", "Upstream LLM call retries", ("model",)
+)
+executor_attempt_duration = registry.histogram(
+    "ai_agent_executor_attempt_duration_seconds",
+    "Latency of single successful executor attempts (no queueing, retries or failovers), used for the hedge delay",
+    ("backend",)
+)
+llm_hedges = registry.counter(
+    "ai_agent_llm_hedges_total", "Hedged executor calls: launched, won (hedge answered first) or lost", ("outcome",)
+)
+client_disconnects = registry.counter(
+    "ai_agent_client_disconnects_total", "Requests whose client went away before the answer was ready", ("endpoint",)
+)
+cancelled_work = registry.counter(
+    "ai_agent_cancelled_work_total", "Orchestrator/executor runs cancelled because no caller was waiting any more"
+)
+cancelled_upstream_seconds = registry.counter(
+    "ai_agent_cancelled_upstream_seconds_total", "Estimated upstream seconds not spent thanks to cancelled runs"
+)
+circuit_state = registry.gauge(
+    "ai_agent_circuit_state", "Circuit breaker state per upstream model (0 closed, 1 half-open, 2 open)", ("model",)
+)
+circuit_transitions = registry.counter(
+    "ai_agent_circuit_transitions_total", "Circuit breaker state changes by new state", ("model", "state")
+)
+admission_queue_depth = registry.gauge(
+    "ai_agent_admission_queue_depth", "LLM calls waiting for admission", ("provider",)
+)
+admission_active = registry.gauge(
+    "ai_agent_admission_active", "Admitted LLM calls currently running", ("provider",)
+)
+admission_wait = registry.histogram(
+    "ai_agent_admission_wait_seconds", "Time an LLM call waited for admission", ("provider",)
+)
+admission_rejected = registry.counter(
+    "ai_agent_admission_rejected_total", "LLM calls shed by admission control", ("provider", "reason")
+)
+event_loop_lag = registry.histogram(
+    "ai_agent_event_loop_lag_seconds", "Delay between when a periodic check should run and when it ran"
+)
+service_stats = registry.gauge(
+    "ai_agent_service_stat", "Point-in-time statistics of app-scoped services, refreshed on scrape", ("service", "stat")
+)
+
+
+# Stage durations of the current request, collected for its Server-Timing header.
+# Set by the middleware in main.py; tasks started by the request share the same dict.
+request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+# Server-Timing metric names, where they differ from the stage label
+SERVER_TIMING_NAMES = {"cache_lookup": "cache"}
+
+
+def observe_stage(stage: str, duration: float) -> None:
+    """Record a pipeline stage duration in the histogram and in the current request's timings"""
+    stage_duration.observe(duration, stage=stage)
+    timings = request_timings.get()
+    if timings is not None:
+        name = SERVER_TIMING_NAMES.get(stage, stage)
+        timings[name] = timings.get(name, 0.0) + duration
+
+
+def server_timing(timings: Dict[str, float], total: float) -> str:
+    """Server-Timing header value, durations in milliseconds"""
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def latency_summary() -> dict:
+    """p50/p95/p99 per pipeline stage and per LLM model, as reported by /healthz"""
+    return {
+        "stages": {
+            labels["stage"]: stage_duration.summary(**labels) for labels in stage_duration.label_sets()
+        },
+        "llm_calls": {
+            f'{labels["model"]} ({labels["outcome"]})': llm_call_duration.summary(**labels)
+            for labels in llm_call_duration.label_sets()
+        },
+        "event_loop_lag": event_loop_lag.summary(),
+        "requests_in_flight": requests_in_flight.get()
+    }
+
+
+async def watch_event_loop(interval: float) -> None:
+    """Sleep `interval` in a loop and record how late each wake-up is"""
+    while True:
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        event_loop_lag.observe(max(0.0, time.perf_counter() - expected))
@@ -1,19 +1,52 @@
-import os
-from openai import OpenAI
+import httpx
+from typing import AsyncIterator, Optional
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 from config import settings
-import asyncio
+import metrics
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
 
+# Completion cap per call, also what the provider counts against the TPM limit
+MAX_OUTPUT_TOKENS = 1024
 
-### had to run in a thread, so FastAPI endpoint stays async and responsive after finding out that OpenAI executor failed: Object ChatCompletion can't be used in 'await' expression.
 
-def sync_gpt4o(request_id: str, prompt: str) -> str:
-    response = client.chat.completions.create(
-        model=settings.OPENAI_EXECUTOR_MODEL,
+def create_client(api_key: Optional[str] = None, base_url: str = None) -> AsyncOpenAI:
+    """Create an async OpenAI(-compatible) client with a pooled keep-alive HTTP connection.
+
+    Defaults to OPENAI_API_KEY and OPENAI_BASE_URL. An empty `api_key` sends
+    no Authorization header at all (it does not fall back to OPENAI_API_KEY).
+    """
+    return AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY if api_key is None else api_key,
+        base_url=base_url or settings.OPENAI_BASE_URL or None,
+        timeout=settings.HTTP_REQUEST_TIMEOUT_S,
+        max_retries=0,  # LLMService retries within the request deadline
+        http_client=DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=settings.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY_S
+            )
+        )
+    )
+
+
+def record_usage(usage, model: str = None) -> None:
+    """Count prompt/completion tokens reported by the API"""
+    if usage is None:
+        return
+    model = model or settings.OPENAI_EXECUTOR_MODEL
+    metrics.llm_tokens.inc(usage.prompt_tokens or 0, model=model, kind="prompt")
+    metrics.llm_tokens.inc(usage.completion_tokens or 0, model=model, kind="completion")
+
+
+async def call_gpt4o(client: AsyncOpenAI, request_id: str, prompt: str, model: str = None) -> str:
+    model = model or settings.OPENAI_EXECUTOR_MODEL
+    response = await client.chat.completions.create(
+        model=model,
         messages=[{"role": "user", "content": prompt}],
-        max_tokens=1024
+        max_tokens=MAX_OUTPUT_TOKENS
     )
+    record_usage(getattr(response, "usage", None), model)
     # Defensive: check if choices exist and have content
     if hasattr(response, "choices") and response.choices and hasattr(response.choices[0], "message") and response.choices[0].message and hasattr(response.choices[0].message, "content"):
         return response.choices[0].message.content.strip()
@@ -21,9 +54,23 @@ def sync_gpt4o(request_id: str, prompt: str) -> str:
         # Returns a clear error message for logging and frontend
         return "Sorry, the AI model did not return a valid answer."
 
-async def call_gpt4o(request_id: str, prompt: str) -> str:
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, sync_gpt4o, request_id, prompt)
+
+async def stream_gpt4o(client: AsyncOpenAI, request_id: str, prompt: str, model: str = None) -> AsyncIterator[str]:
+    """Yield the answer text as the model generates it"""
+    model = model or settings.OPENAI_EXECUTOR_MODEL
+    stream = await client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=MAX_OUTPUT_TOKENS,
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+    async with stream:
+        async for chunk in stream:
+            # The last chunk carries the usage and no choices
+            record_usage(getattr(chunk, "usage", None), model)
+            if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
 
 
 #  Issues ---->  FIXED
@@ -1,93 +1,437 @@
-from fastapi import APIRouter, Request, HTTPException
-from schemas import QueryRequest, QueryResponse
-from services.llm_service import LLMService
+from fastapi import APIRouter, Request, HTTPException, Depends
+from schemas import QueryRequest, QueryResponse, BatchQueryRequest, BatchQueryResponse, BatchItemResult
+from services.llm_service import LLMService, is_prompt_like, FALLBACK_ANSWERS
+from services.admission import AdmissionRejected
+from services.circuit_breaker import CircuitOpen
+from services.deadline import Deadline
 from services.cache_service import CacheService
+from services.single_flight import SingleFlight, flight_key
+from services.orchestrator_service import OrchestratorService
+from dependencies import get_cache_service, get_single_flight, get_llm_service, get_orchestrator
+from disconnect import ClientDisconnected, cancel_on_disconnect
 from logger import log_request, log_response, log_error, logger
 from config import settings
+import metrics
+import asyncio
+import json
 import time
-import uuid
+from typing import Dict, List
 
 from starlette.background import BackgroundTask
 from fastapi import BackgroundTasks
+from fastapi.responses import StreamingResponse
 
 
 router = APIRouter(prefix="/api", tags=["AI Agent"])
 
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no"  # stop reverse proxies from buffering the stream
+}
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def pipeline_model(route: dict) -> str:
+    """The "model" meta field: orchestrator + the executor model that answered"""
+    return f"{settings.GEMMA_ORCHESTRATOR_MODEL} + {route.get('model', settings.OPENAI_EXECUTOR_MODEL)}"
+
 
 #  + Background tasks are included
 @router.post("/ask", summary="Ask the AI Agent a question", response_model=QueryResponse)
-async def ask_agent(request: Request, query_request: QueryRequest, background_tasks: BackgroundTasks):
-    
-    if hasattr(request.state, "is_cancelled"):
-        raise HTTPException(status_code=499, detail="Client cancelled request")
+async def ask_agent(
+    request: Request,
+    query_request: QueryRequest,
+    background_tasks: BackgroundTasks,
+    cache_service: CacheService = Depends(get_cache_service),
+    single_flight: SingleFlight = Depends(get_single_flight),
+    llm_service: LLMService = Depends(get_llm_service),
+    orchestrator: OrchestratorService = Depends(get_orchestrator)
+):
+    """Main endpoint for AI agent queries.
 
-    """Main endpoint for AI agent queries"""
+    An answer past its TTL but within CACHE_STALE_GRACE_S is returned at once
+    with `meta.stale` set, and one background refresh per key replaces it.
+    If the client disconnects while the pipeline runs, this request stops
+    waiting; the upstream work is cancelled too unless other coalesced
+    requests are still waiting for it.
+    """
     start_time = time.time()
-    request_id = str(uuid.uuid4())
-    
-    # Store request_id in request state for logging
-    request.state.request_id = request_id
+    deadline = Deadline()
+    # Assigned by RequestIDMiddleware (or taken from the client's X-Request-ID)
+    request_id = request.state.request_id
     
     user_query = query_request.query
     
     log_request(request_id, "/api/ask", "POST", user_query)
     
     try:
-        # Initialize services
-        cache_service = CacheService()
-        llm_service = LLMService()
-        
         # Check the cache first
-        cached_response = cache_service.get(user_query)
+        cached_response, cache_result = await cache_service.lookup(user_query, allow_stale=True)
         if cached_response:
+            stale = cache_result == "stale_hit"
+            if stale:
+                if cache_service.begin_refresh(user_query):
+                    # Runs after the response is sent
+                    background_tasks.add_task(
+                        refresh_stale_answer,
+                        llm_service, orchestrator, single_flight, cache_service, request_id, user_query
+                    )
+                else:
+                    metrics.cache_refreshes.inc(outcome="deduplicated")
             duration = time.time() - start_time
             log_response(request_id, duration, 200, cached=True)
             return QueryResponse(
                 answer=cached_response,
-                meta={"cached": True, "model": "cached", "request_id": request_id}
+                meta={
+                    "cached": True,
+                    "stale": stale,
+                    "near_match": cache_result == "near_hit",
+                    "model": "cached",
+                    "request_id": request_id
+                }
             )
         
-        # Step 1: Orchestration with Gemma
-        logger.info(f"Request {request_id}: Starting orchestration with Gemma")
-        orchestrator_response = await llm_service.call_gemma_orchestrator(request_id, user_query)
-        
-        # Step 2: Execution
-        logger.info(f"Request {request_id}: Starting execution with Gemma")
-        final_answer = await llm_service.call_openai_executor(request_id, orchestrator_response)
-        # If the answer is the fallback error message, log as error
-        if final_answer.startswith("Sorry, the AI agent could not generate a proper answer"):
-            logger.error(f"Request {request_id}: Executor failed to generate a proper answer for query: {user_query}")
-        
-        # Store in cache
-        cache_service.set(user_query, final_answer)
-        
-        # Close the LLM service
-        await llm_service.close()
+        # Identical queries already in flight share one orchestrator -> executor run
+        result, coalesced = await cancel_on_disconnect(request, single_flight.run(
+            flight_key(user_query),
+            lambda: run_pipeline(llm_service, orchestrator, request_id, user_query, cache_service, deadline)
+        ))
+        if coalesced:
+            logger.info("Request %s: Coalesced onto in-flight request %s", request_id, result['request_id'])
         
         duration = time.time() - start_time
         log_response(request_id, duration, 200, cached=False)
         
         return QueryResponse(
-            answer=final_answer,
+            answer=result["answer"],
             meta={
                 "cached": False,
-                "model": f"{settings.GEMMA_ORCHESTRATOR_MODEL} + {settings.OPENAI_EXECUTOR_MODEL}",
+                "coalesced": coalesced,
+                "model": pipeline_model(result["executor"]),
                 "request_id": request_id,
-                "orchestrator_prompt": orchestrator_response
+                "orchestrator_prompt": result["orchestrator_prompt"],
+                "orchestrator": result["orchestrator"],
+                "executor": result["executor"]
             }
         )
         
+    except ClientDisconnected:
+        duration = time.time() - start_time
+        metrics.client_disconnects.inc(endpoint="/api/ask")
+        logger.info("Request %s: Client disconnected after %.2fs, stopped waiting", request_id, duration)
+        # Nobody reads this response, the status only shows up in logs and metrics
+        raise HTTPException(status_code=499, detail="Client closed request")
+    except (AdmissionRejected, CircuitOpen) as e:
+        duration = time.time() - start_time
+        log_response(request_id, duration, e.status_code, cached=False)
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
     except Exception as e:
         duration = time.time() - start_time
         log_error(request_id, e, "ask_agent")
         
-        # Close LLM service on error
-        try:
-            await llm_service.close()
-        except:
-            pass
-        
         raise HTTPException(
             status_code=500,
             detail=f"An error occurred while processing your request: {str(e)}"
         )
+
+
+async def run_pipeline(
+    llm_service: LLMService,
+    orchestrator: OrchestratorService,
+    request_id: str,
+    user_query: str,
+    cache_service: CacheService,
+    deadline: Deadline = None
+) -> dict:
+    """Orchestrator -> executor run for a cache miss, shared by coalesced requests.
+
+    Both stages draw on one `deadline` (REQUEST_DEADLINE_S from now if not given).
+    """
+    deadline = deadline or Deadline()
+    # Filled by the executor call with the backend that answered
+    route = {}
+    
+    if settings.SPECULATIVE_EXECUTION_ENABLED and orchestrator.will_call_gemma(user_query):
+        # Steps 1 and 2 side by side: the executor starts on the raw query while Gemma rewrites it
+        logger.info("Request %s: Starting orchestration stage with speculative execution", request_id)
+        orchestrator_response, orchestrator_source, final_answer = await orchestrator.execute_speculatively(
+            request_id, user_query, deadline, route
+        )
+    else:
+        # Step 1: Orchestration with Gemma (skipped for pass-through queries or cached rewrites)
+        logger.info("Request %s: Starting orchestration stage", request_id)
+        orchestrator_response, orchestrator_source = await orchestrator.prepare_prompt(request_id, user_query, deadline)
+        
+        # Step 2: Execution
+        logger.info("Request %s: Starting execution with gpt-4o-mini", request_id)
+        final_answer = await llm_service.call_openai_executor(request_id, orchestrator_response, deadline, route)
+    # If the answer is the fallback error message, log as error and keep it out of the cache
+    if final_answer in FALLBACK_ANSWERS:
+        logger.error("Request %s: Executor failed to generate a proper answer for query: %s", request_id, user_query)
+    else:
+        # Store in cache
+        await cache_service.set(user_query, final_answer)
+    
+    return {
+        "answer": final_answer,
+        "orchestrator_prompt": orchestrator_response,
+        "orchestrator": orchestrator_source,
+        "executor": route,
+        "request_id": request_id
+    }
+
+
+async def refresh_stale_answer(
+    llm_service: LLMService,
+    orchestrator: OrchestratorService,
+    single_flight: SingleFlight,
+    cache_service: CacheService,
+    request_id: str,
+    user_query: str
+) -> None:
+    """Background task: re-run the pipeline for a stale answer claimed with `cache_service.begin_refresh`.
+
+    Goes through single flight so it shares the run with any concurrent miss
+    for the same query. On failure the stale answer is left to expire.
+    """
+    start_time = time.time()
+    metrics.cache_refreshes.inc(outcome="started")
+    try:
+        result, _ = await single_flight.run(
+            flight_key(user_query),
+            lambda: run_pipeline(llm_service, orchestrator, request_id, user_query, cache_service, Deadline())
+        )
+        if result["answer"] in FALLBACK_ANSWERS:
+            metrics.cache_refreshes.inc(outcome="failed")
+            logger.warning("Request %s: Background refresh got a fallback answer, keeping the stale one", request_id)
+        else:
+            metrics.cache_refreshes.inc(outcome="succeeded")
+            logger.info("Request %s: Refreshed stale answer in %.2fs", request_id, time.time() - start_time)
+    except Exception as e:
+        metrics.cache_refreshes.inc(outcome="failed")
+        logger.warning("Request %s: Background refresh failed, keeping the stale answer: %s", request_id, e)
+    finally:
+        cache_service.end_refresh(user_query)
+
+
+@router.post("/ask/stream", summary="Ask the AI Agent a question and stream the answer (SSE)")
+async def ask_agent_stream(
+    request: Request,
+    query_request: QueryRequest,
+    cache_service: CacheService = Depends(get_cache_service),
+    llm_service: LLMService = Depends(get_llm_service),
+    orchestrator: OrchestratorService = Depends(get_orchestrator)
+):
+    """Streaming variant of /ask using Server-Sent Events.
+
+    Events: `start` straight away, `orchestrator` once the executor prompt is
+    ready, one `token` per executor delta and a final `done` with the meta.
+    Cache hits are sent as a single `done` event carrying the answer. If the
+    executor fails part-way an `error` event ends the stream.
+    """
+    start_time = time.time()
+    deadline = Deadline()
+    request_id = request.state.request_id
+    
+    user_query = query_request.query
+    
+    log_request(request_id, "/api/ask/stream", "POST", user_query)
+    
+    cached_response, result = await cache_service.lookup(user_query)
+    if cached_response:
+        duration = time.time() - start_time
+        log_response(request_id, duration, 200, cached=True)
+        event = sse_event("done", {
+            "answer": cached_response,
+            "meta": {"cached": True, "near_match": result == "near_hit", "model": "cached", "request_id": request_id}
+        })
+        return StreamingResponse(iter([event]), media_type="text/event-stream", headers=SSE_HEADERS)
+    
+    return StreamingResponse(
+        stream_pipeline(llm_service, orchestrator, request_id, user_query, cache_service, start_time, deadline),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+
+async def stream_pipeline(
+    llm_service: LLMService,
+    orchestrator: OrchestratorService,
+    request_id: str,
+    user_query: str,
+    cache_service: CacheService,
+    start_time: float,
+    deadline: Deadline
+):
+    """Orchestrator -> streamed executor run, the answer is cached only once the stream completes.
+
+    If the client disconnects the generator is cancelled wherever it is waiting,
+    so no further orchestrator or executor work is done for it.
+    """
+    try:
+        yield sse_event("start", {"request_id": request_id})
+    
+        # Step 1: Orchestration with Gemma
+        orchestrator_response, orchestrator_source = await orchestrator.prepare_prompt(request_id, user_query, deadline)
+        yield sse_event("orchestrator", {"orchestrator_prompt": orchestrator_response, "source": orchestrator_source})
+    
+        # Step 2: Streamed execution
+        parts = []
+        route = {}
+        try:
+            async for delta in llm_service.stream_openai_executor(request_id, orchestrator_response, deadline, route):
+                parts.append(delta)
+                yield sse_event("token", {"text": delta})
+        except (AdmissionRejected, CircuitOpen) as e:
+            log_response(request_id, time.time() - start_time, e.status_code, cached=False)
+            yield sse_event("error", {"detail": str(e), "status": e.status_code, "retry_after": e.headers["Retry-After"]})
+            return
+        except Exception as e:
+            log_error(request_id, e, "ask_agent_stream")
+            yield sse_event("error", {"detail": "Sorry, there was an error generating your answer."})
+            return
+    
+        final_answer = "".join(parts).strip()
+        if final_answer and not is_prompt_like(final_answer):
+            await cache_service.set(user_query, final_answer)
+        else:
+            logger.error("Request %s: Streamed executor answer was empty or prompt-like, not caching", request_id)
+    
+        duration = time.time() - start_time
+        log_response(request_id, duration, 200, cached=False)
+    
+        yield sse_event("done", {
+            "meta": {
+                "cached": False,
+                "model": pipeline_model(route),
+                "request_id": request_id,
+                "orchestrator_prompt": orchestrator_response,
+                "orchestrator": orchestrator_source,
+                "executor": route
+            }
+        })
+    except (asyncio.CancelledError, GeneratorExit):
+        # Starlette tears the response down when the client goes away, which also closes the executor stream
+        metrics.client_disconnects.inc(endpoint="/api/ask/stream")
+        logger.info("Request %s: Client disconnected after %.2fs, stream cancelled", request_id, time.time() - start_time)
+        raise
+
+
+
+@router.post("/ask/batch", summary="Ask the AI Agent several questions at once", response_model=BatchQueryResponse)
+async def ask_agent_batch(
+    request: Request,
+    batch_request: BatchQueryRequest,
+    cache_service: CacheService = Depends(get_cache_service),
+    single_flight: SingleFlight = Depends(get_single_flight),
+    llm_service: LLMService = Depends(get_llm_service),
+    orchestrator: OrchestratorService = Depends(get_orchestrator)
+):
+    """Answer a list of queries in one request.
+
+    Duplicate queries are answered once, cache hits right away, and misses run
+    through the orchestrator -> executor pipeline at most BATCH_CONCURRENCY at a
+    time. A failing item only sets its own `error`. With `stream: true` results
+    are sent as NDJSON lines in completion order instead of one ordered list.
+    """
+    start_time = time.time()
+    request_id = request.state.request_id
+    
+    queries = [item.query for item in batch_request.queries]
+    log_request(request_id, "/api/ask/batch", "POST")
+    
+    # Same normalized query -> one upstream run shared by every position
+    groups: Dict[str, List[int]] = {}
+    for index, query in enumerate(queries):
+        groups.setdefault(flight_key(query), []).append(index)
+    logger.info("Request %s: Batch of %s queries, %s unique", request_id, len(queries), len(groups))
+    
+    # One cache pass for the whole batch, so L2 is asked in a single pipelined round trip
+    cached = dict(zip(groups, await cache_service.lookup_many([queries[indexes[0]] for indexes in groups.values()])))
+    
+    semaphore = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+    
+    async def answer_group(key: str, indexes: List[int]) -> List[BatchItemResult]:
+        user_query = queries[indexes[0]]
+        item_id = f"{request_id}:{indexes[0]}"
+        try:
+            cached_response, result = cached[key]
+            if cached_response:
+                answer, meta = cached_response, {"cached": True, "near_match": result == "near_hit", "model": "cached"}
+            else:
+                async with semaphore:
+                    result, coalesced = await single_flight.run(
+                        key,
+                        lambda: run_pipeline(llm_service, orchestrator, item_id, user_query, cache_service)
+                    )
+                answer = result["answer"]
+                meta = {
+                    "cached": False,
+                    "coalesced": coalesced,
+                    "model": pipeline_model(result["executor"]),
+                    "orchestrator": result["orchestrator"],
+                    "executor": result["executor"]
+                }
+            error = None
+        except Exception as e:
+            log_error(item_id, e, "ask_agent_batch")
+            answer, error, meta = None, str(e), {}
+        meta["request_id"] = item_id
+        return [
+            BatchItemResult(index=index, query=queries[index], answer=answer, error=error, meta=meta)
+            for index in indexes
+        ]
+    
+    tasks = [asyncio.ensure_future(answer_group(key, indexes)) for key, indexes in groups.items()]
+    
+    if batch_request.stream:
+        return StreamingResponse(
+            stream_batch_results(request_id, tasks, start_time),
+            media_type="application/x-ndjson",
+            headers=SSE_HEADERS
+        )
+    
+    try:
+        groups_done = await cancel_on_disconnect(request, asyncio.gather(*tasks))
+    except ClientDisconnected:
+        metrics.client_disconnects.inc(endpoint="/api/ask/batch")
+        logger.info("Request %s: Client disconnected, cancelling the rest of the batch", request_id)
+        raise HTTPException(status_code=499, detail="Client closed request")
+    finally:
+        for task in tasks:
+            task.cancel()
+    results = [item for group in groups_done for item in group]
+    results.sort(key=lambda item: item.index)
+    
+    duration = time.time() - start_time
+    log_response(request_id, duration, 200, cached=False)
+    
+    return BatchQueryResponse(
+        results=results,
+        meta={
+            "request_id": request_id,
+            "total": len(results),
+            "unique": len(groups),
+            "cached": sum(1 for item in results if item.meta.get("cached")),
+            "errors": sum(1 for item in results if item.error),
+            "duration": round(duration, 3)
+        }
+    )
+
+
+async def stream_batch_results(request_id: str, tasks: List[asyncio.Future], start_time: float):
+    """Yield one NDJSON line per item as soon as its group completes"""
+    try:
+        for completed in asyncio.as_completed(tasks):
+            for item in await completed:
+                yield item.model_dump_json() + "\n"
+        duration = time.time() - start_time
+        log_response(request_id, duration, 200, cached=False)
+    finally:
+        # Client went away or the stream ended: stop whatever is still queued
+        for task in tasks:
+            task.cancel()
@@ -1,8 +1,15 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Request, Depends
 from datetime import datetime
 from schemas import HealthResponse
 from logger import log_request, log_response
+import metrics
 from services.cache_service import CacheService
+from services.single_flight import SingleFlight
+from services.orchestrator_service import OrchestratorService
+from services.admission import AdmissionController
+from services.llm_service import LLMService
+from services.circuit_breaker import OPEN
+from dependencies import get_cache_service, get_single_flight, get_orchestrator, get_admission, get_llm_service
 import time
 
 
@@ -10,20 +17,29 @@ router = APIRouter(prefix="/healthz", tags=["Monitoring"])
 
 
 @router.get("/", summary="Health check", response_model=HealthResponse)
-async def health_check(request: Request):
-    """Health check endpoint"""
+async def health_check(
+    request: Request,
+    cache_service: CacheService = Depends(get_cache_service),
+    llm_service: LLMService = Depends(get_llm_service)
+):
+    """Health check endpoint, `degraded` while any upstream circuit is open"""
     start_time = time.time()
     request_id = str(request.state.request_id) if hasattr(request.state, 'request_id') else "unknown"
     
     log_request(request_id, "/healthz", "GET")
     
     # Get cache stats
-    cache_service = CacheService()
     cache_stats = cache_service.get_stats()
+    circuits = {
+        breaker.name: breaker.state for breaker in (llm_service.orchestrator_breaker, *llm_service.router.breakers())
+    }
     
     response = HealthResponse(
-        status="ok",
-        timestamp=datetime.utcnow().isoformat()
+        status="degraded" if OPEN in circuits.values() else "ok",
+        timestamp=datetime.utcnow().isoformat(),
+        cache={key: cache_stats[key] for key in ("size", "hit_rate", "exact_hits", "near_hits", "misses")},
+        latency=metrics.latency_summary(),
+        circuits=circuits
     )
     
     duration = time.time() - start_time
@@ -33,16 +49,99 @@ async def health_check(request: Request):
 
 
 @router.get("/cache", summary="Cache statistics")
-async def cache_stats(request: Request):
+async def cache_stats(request: Request, cache_service: CacheService = Depends(get_cache_service)):
     """Get cache statistics"""
+    start_time = time.time()
     request_id = str(request.state.request_id) if hasattr(request.state, 'request_id') else "unknown"
     
     log_request(request_id, "/healthz/cache", "GET")
     
-    cache_service = CacheService()
     stats = cache_service.get_stats()
     
-    duration = time.time()
+    duration = time.time() - start_time
+    log_response(request_id, duration, 200)
+    
+    return stats
+
+
+@router.get("/coalescing", summary="In-flight query coalescing statistics")
+async def coalescing_stats(request: Request, single_flight: SingleFlight = Depends(get_single_flight)):
+    """Get statistics for identical /api/ask queries served by one upstream run"""
+    start_time = time.time()
+    request_id = str(request.state.request_id) if hasattr(request.state, 'request_id') else "unknown"
+    
+    log_request(request_id, "/healthz/coalescing", "GET")
+    
+    stats = single_flight.get_stats()
+    
+    duration = time.time() - start_time
+    log_response(request_id, duration, 200)
+    
+    return stats
+
+
+@router.get("/orchestrator", summary="Orchestrator stage statistics")
+async def orchestrator_stats(request: Request, orchestrator: OrchestratorService = Depends(get_orchestrator)):
+    """Get orchestrator bypass, rewrite cache and Gemma call statistics"""
+    start_time = time.time()
+    request_id = str(request.state.request_id) if hasattr(request.state, 'request_id') else "unknown"
+    
+    log_request(request_id, "/healthz/orchestrator", "GET")
+    
+    stats = orchestrator.get_stats()
+    
+    duration = time.time() - start_time
+    log_response(request_id, duration, 200)
+    
+    return stats
+
+
+@router.get("/admission", summary="LLM admission control statistics")
+async def admission_stats(request: Request, admission: AdmissionController = Depends(get_admission)):
+    """Get per-provider concurrency, queue depth, wait time and shedding statistics"""
+    start_time = time.time()
+    request_id = str(request.state.request_id) if hasattr(request.state, 'request_id') else "unknown"
+    
+    log_request(request_id, "/healthz/admission", "GET")
+    
+    stats = admission.get_stats()
+    
+    duration = time.time() - start_time
+    log_response(request_id, duration, 200)
+    
+    return stats
+
+
+@router.get("/circuits", summary="Circuit breaker state and transitions")
+async def circuit_stats(request: Request, llm_service: LLMService = Depends(get_llm_service)):
+    """Get each upstream model's breaker state, recent failure rate and last transitions"""
+    start_time = time.time()
+    request_id = str(request.state.request_id) if hasattr(request.state, 'request_id') else "unknown"
+    
+    log_request(request_id, "/healthz/circuits", "GET")
+    
+    stats = {
+        "orchestrator": llm_service.orchestrator_breaker.get_stats(),
+        "executors": {backend.name: backend.breaker.get_stats() for backend in llm_service.router.backends}
+    }
+    
+    duration = time.time() - start_time
+    log_response(request_id, duration, 200)
+    
+    return stats
+
+
+@router.get("/executors", summary="Executor routing statistics")
+async def executor_stats(request: Request, llm_service: LLMService = Depends(get_llm_service)):
+    """Get each executor backend's latency and error averages, routing score and call counts"""
+    start_time = time.time()
+    request_id = str(request.state.request_id) if hasattr(request.state, 'request_id') else "unknown"
+    
+    log_request(request_id, "/healthz/executors", "GET")
+    
+    stats = llm_service.router.get_stats()
+    
+    duration = time.time() - start_time
     log_response(request_id, duration, 200)
     
-    return stats
\ No newline at end of file
+    return stats
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import PlainTextResponse
+import metrics
+
+
+router = APIRouter(tags=["Monitoring"])
+
+
+def refresh_service_stats(request: Request) -> None:
+    """Copy point-in-time stats of the app-scoped services into gauges"""
+    state = request.app.state
+    sources = {
+        "cache": getattr(state, "cache_service", None),
+        "coalescing": getattr(state, "single_flight", None),
+        "orchestrator": getattr(state, "orchestrator", None)
+    }
+    for service, source in sources.items():
+        if source is None:
+            continue
+        for stat, value in source.get_stats().items():
+            # Only plain numbers become gauges, nested sections and flags are skipped
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                metrics.service_stats.set(value, service=service, stat=stat)
+
+
+@router.get("/metrics", summary="Prometheus metrics", response_class=PlainTextResponse)
+async def prometheus_metrics(request: Request):
+    """Metrics in Prometheus text exposition format"""
+    refresh_service_stats(request)
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+from config import settings
 
 class QueryRequest(BaseModel):
     query: str = Field(..., min_length=1, max_length=1000, description="User's question or request")
@@ -10,4 +11,22 @@ class QueryResponse(BaseModel):
 
 class HealthResponse(BaseModel):
     status: str = Field(..., description="Service status")
-    timestamp: str = Field(..., description="Current timestamp")
\ No newline at end of file
+    timestamp: str = Field(..., description="Current timestamp")
+    cache: Optional[Dict[str, Any]] = Field(None, description="Answer cache summary")
+    latency: Optional[Dict[str, Any]] = Field(None, description="Per-stage and per-model latency percentiles (seconds)")
+    circuits: Optional[Dict[str, str]] = Field(None, description="Circuit breaker state per upstream model")
+
+class BatchQueryRequest(BaseModel):
+    queries: List[QueryRequest] = Field(..., min_length=1, max_length=settings.BATCH_MAX_ITEMS, description="Questions to answer")
+    stream: bool = Field(False, description="Stream results back as NDJSON in completion order")
+
+class BatchItemResult(BaseModel):
+    index: int = Field(..., description="Position of the query in the request")
+    query: str = Field(..., description="The query as sent")
+    answer: Optional[str] = Field(None, description="AI generated response, None if this item failed")
+    error: Optional[str] = Field(None, description="Error for this item only")
+    meta: Dict[str, Any] = Field(..., description="Metadata about the response")
+
+class BatchQueryResponse(BaseModel):
+    results: List[BatchItemResult] = Field(..., description="One result per query, in request order")
+    meta: Dict[str, Any] = Field(..., description="Metadata about the batch")
\ No newline at end of file
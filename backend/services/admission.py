@@ -0,0 +1,178 @@
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager, nullcontext
+from typing import AsyncIterator, Dict
+from config import settings
+from logger import logger
+import metrics
+
+
+class AdmissionRejected(Exception):
+    """A provider call was shed instead of queued; maps to a 429/503 with Retry-After"""
+
+    def __init__(self, provider: str, reason: str, status_code: int, retry_after: float):
+        super().__init__(f"{provider} is over capacity ({reason}), retry after {math.ceil(retry_after)}s")
+        self.provider = provider
+        self.reason = reason
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+
+class TokenBucket:
+    """Continuously refilled bucket holding up to one minute of `per_minute`; 0 means unlimited"""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, amount: float) -> float:
+        """Take `amount` tokens now and return how many seconds to wait before spending them.
+
+        The balance may go negative, so later callers queue up behind earlier
+        reservations instead of racing them for the same refill.
+        """
+        if not self.rate:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= amount
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self, amount: float) -> None:
+        if self.rate:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class ProviderLimiter:
+    """Concurrency cap, RPM/TPM buckets and a bounded wait queue for one upstream provider"""
+
+    def __init__(self, provider: str, max_concurrency: int, rpm: int, tpm: int, max_queue: int, max_wait_s: float):
+        self.provider = provider
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait_s = max_wait_s
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.waiting = 0
+        self.active = 0
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {}
+        self.total_wait_s = 0.0
+        # Moving average of how long an admitted call holds its slot, for Retry-After estimates
+        self.avg_hold_s = 1.0
+
+    def _reject(self, reason: str, status_code: int, retry_after: float) -> None:
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        metrics.admission_rejected.inc(provider=self.provider, reason=reason)
+        logger.warning("Admission: shedding %s call (%s), %s waiting, %s active", self.provider, reason, self.waiting, self.active)
+        raise AdmissionRejected(self.provider, reason, status_code, retry_after)
+
+    def _refund(self, tokens: int) -> None:
+        self.requests.refund(1)
+        self.tokens.refund(tokens)
+
+    def _drain_estimate(self) -> float:
+        """Rough time until the current queue has been served"""
+        return (self.waiting + 1) * self.avg_hold_s / self.max_concurrency
+
+    def _set_waiting(self, delta: int) -> None:
+        self.waiting += delta
+        metrics.admission_queue_depth.set(self.waiting, provider=self.provider)
+
+    @asynccontextmanager
+    async def admit(self, tokens: int) -> AsyncIterator[None]:
+        """Hold a slot for one call of about `tokens` tokens, or raise AdmissionRejected"""
+        if self.waiting >= self.max_queue and self._slots.locked():
+            self._reject("queue_full", 503, self._drain_estimate())
+
+        start_time = time.monotonic()
+        self._set_waiting(1)
+        try:
+            # Rate limits first: if the buckets cannot cover this call before the deadline, fail fast
+            delay = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+            if delay > self.max_wait_s:
+                self._refund(tokens)
+                self._reject("rate_limited", 429, delay)
+            try:
+                if delay:
+                    await asyncio.sleep(delay)
+                if self._slots.locked():
+                    remaining = self.max_wait_s - (time.monotonic() - start_time)
+                    await asyncio.wait_for(self._slots.acquire(), timeout=max(remaining, 0.0))
+                else:
+                    await self._slots.acquire()
+            except asyncio.TimeoutError:
+                self._refund(tokens)
+                self._reject("timeout", 503, self._drain_estimate())
+            except asyncio.CancelledError:
+                # The caller went away before its call was sent, so it must not use up the RPM/TPM budget
+                self._refund(tokens)
+                raise
+        finally:
+            self._set_waiting(-1)
+
+        waited = time.monotonic() - start_time
+        self.admitted += 1
+        self.total_wait_s += waited
+        metrics.admission_wait.observe(waited, provider=self.provider)
+        self.active += 1
+        metrics.admission_active.set(self.active, provider=self.provider)
+        hold_start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.active -= 1
+            metrics.admission_active.set(self.active, provider=self.provider)
+            self._slots.release()
+            self.avg_hold_s = 0.9 * self.avg_hold_s + 0.1 * (time.monotonic() - hold_start)
+
+    def get_stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self.active,
+            "queue_depth": self.waiting,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "avg_wait_s": round(self.total_wait_s / self.admitted, 4) if self.admitted else 0.0,
+            "avg_hold_s": round(self.avg_hold_s, 4)
+        }
+
+
+class AdmissionController:
+    """Scheduler in front of the LLM clients, one limiter per provider"""
+
+    def __init__(self):
+        self.enabled = settings.ADMISSION_ENABLED
+        self.providers = {
+            "gemma": ProviderLimiter(
+                "gemma", settings.GEMMA_MAX_CONCURRENCY, settings.GEMMA_RPM, settings.GEMMA_TPM,
+                settings.ADMISSION_MAX_QUEUE, settings.ADMISSION_MAX_WAIT_S
+            ),
+            "openai": ProviderLimiter(
+                "openai", settings.OPENAI_MAX_CONCURRENCY, settings.OPENAI_RPM, settings.OPENAI_TPM,
+                settings.ADMISSION_MAX_QUEUE, settings.ADMISSION_MAX_WAIT_S
+            )
+        }
+
+    def admit(self, provider: str, tokens: int):
+        """Async context manager around one call to `provider`"""
+        if not self.enabled:
+            return nullcontext()
+        return self.providers[provider].admit(tokens)
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "max_wait_s": settings.ADMISSION_MAX_WAIT_S,
+            "providers": {name: limiter.get_stats() for name, limiter in self.providers.items()}
+        }
@@ -1,48 +1,597 @@
+import asyncio
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional, Any, Callable, Dict, List, Tuple
 import cachetools
-from typing import Optional, Any
 from config import settings
 from logger import logger
+import metrics
+from services.cache_snapshot import CacheSnapshot
+from services.redis_cache import RedisCacheTier
+from services.similarity_index import SimilarityIndex, normalize_query
+
+
+# Compression pays off for long answers; level 6 is zlib's default speed/size trade-off
+COMPRESSION_LEVEL = 6
+
+
+def _value_size(value: Any) -> int:
+    """Approximate number of bytes held by a cached value"""
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, bytes):
+        return len(value)
+    return sys.getsizeof(value)
+
+
+class CacheEntry:
+    """One cached value, kept zlib-compressed when that makes it smaller.
+
+    Decompression only happens on a hit, in `value()`.
+    """
+
+    __slots__ = ("data", "compressed", "raw_size")
+
+    def __init__(self, value: Any, compress: bool = False):
+        self.data = value
+        self.compressed = False
+        self.raw_size = _value_size(value)
+        if compress and isinstance(value, str) and self.raw_size >= settings.CACHE_COMPRESSION_MIN_BYTES:
+            packed = zlib.compress(value.encode("utf-8"), COMPRESSION_LEVEL)
+            if len(packed) < self.raw_size:
+                self.data = packed
+                self.compressed = True
+
+    @property
+    def size(self) -> int:
+        return len(self.data) if self.compressed else self.raw_size
+
+    def value(self) -> Any:
+        return zlib.decompress(self.data).decode("utf-8") if self.compressed else self.data
+
+
+def _entry_sizes(key: str, value: Any) -> Tuple[int, int]:
+    """(stored, uncompressed) bytes of a cache entry, key included"""
+    key_size = len(key.encode("utf-8"))
+    if isinstance(value, CacheEntry):
+        return key_size + value.size, key_size + value.raw_size
+    size = key_size + _value_size(value)
+    return size, size
+
+
+class InstrumentedTTLCache(cachetools.TTLCache):
+    """TTLCache with an optional byte budget that counts evictions, expirations and bytes held.
+
+    `maxsize` caps the number of entries and `max_bytes` (0 = no cap) the
+    bytes of keys plus stored values; whichever is hit first evicts the least
+    recently used entries. A single entry larger than `max_bytes` is not stored
+    (and replaces nothing: an older value under that key is dropped), see `store()`.
+    Entries stay fresh for `ttl` and are then kept `grace` more seconds as
+    stale (see `fresh()`) before they expire.
+    `on_remove` is called with the key of every entry that leaves the cache,
+    whether deleted, evicted or expired, and `on_evict` with (reason, count)
+    for evictions and expirations, e.g. to export them as metrics.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        max_bytes: int = 0,
+        grace: float = 0,
+        on_remove: Optional[Callable[[str], None]] = None,
+        on_evict: Optional[Callable[[str, int], None]] = None
+    ):
+        super().__init__(maxsize=maxsize, ttl=ttl + grace)
+        self.fresh_ttl = ttl
+        self.grace = grace
+        self.max_bytes = max_bytes
+        self.on_remove = on_remove
+        self.on_evict = on_evict
+        # key -> (stored, uncompressed) bytes, ordered by last write, which is also the TTL expiry order
+        self._sizes = OrderedDict()
+        # Wall-clock end of every entry's fresh period, also used by snapshots that outlive the process
+        self._expires_at = {}
+        self.bytes = 0
+        self.raw_bytes = 0
+        self.evictions = 0
+        self.eviction_reasons = {"max_entries": 0, "max_bytes": 0}
+        self.expirations = 0
+        self.too_large = 0
+
+    def __setitem__(self, key, value):
+        self.store(key, value)
+
+    def store(self, key, value, ttl: Optional[float] = None) -> bool:
+        """Set `key`; returns False if the value is too large to be cached at all.
+
+        `ttl` shortens the fresh period of this entry (e.g. to what is left of
+        it in another tier), it is never extended past the cache's own TTL.
+        """
+        size, raw_size = _entry_sizes(key, value)
+        if self.max_bytes and size > self.max_bytes:
+            # Would flush everything else and still not fit; an older value must not outlive the new one
+            self.too_large += 1
+            if self.on_evict:
+                self.on_evict("too_large", 1)
+            if key in self._sizes:
+                del self[key]
+            return False
+        super().__setitem__(key, value)
+        old_size, old_raw_size = self._sizes.pop(key, (0, 0))
+        self.bytes += size - old_size
+        self.raw_bytes += raw_size - old_raw_size
+        self._sizes[key] = (size, raw_size)
+        self._expires_at[key] = time.time() + (self.fresh_ttl if ttl is None else min(ttl, self.fresh_ttl))
+        # The new entry is the most recently used, so it is never the one evicted here
+        while self.max_bytes and self.bytes > self.max_bytes:
+            cachetools.TTLCache.popitem(self)
+            self._count_eviction("max_bytes")
+        return True
+
+    def __delitem__(self, key):
+        try:
+            super().__delitem__(key)
+        finally:
+            size, raw_size = self._sizes.pop(key, (0, 0))
+            self.bytes -= size
+            self.raw_bytes -= raw_size
+            self._expires_at.pop(key, None)
+            if self.on_remove:
+                self.on_remove(key)
+
+    def _count_eviction(self, reason: str) -> None:
+        self.evictions += 1
+        self.eviction_reasons[reason] += 1
+        if self.on_evict:
+            self.on_evict(reason, 1)
+
+    def popitem(self):
+        # Only called by cachetools when the entry count is at maxsize
+        item = super().popitem()
+        self._count_eviction("max_entries")
+        return item
+
+    def expire(self, time=None):
+        before = cachetools.Cache.__len__(self)
+        super().expire(time)
+        expired = before - cachetools.Cache.__len__(self)
+        # Expired entries are always the oldest writes
+        for _ in range(expired):
+            key, (size, raw_size) = self._sizes.popitem(last=False)
+            self._expires_at.pop(key, None)
+            self.bytes -= size
+            self.raw_bytes -= raw_size
+            if self.on_remove:
+                self.on_remove(key)
+        if expired:
+            self.expirations += expired
+            if self.on_evict:
+                self.on_evict("expired", expired)
+
+    def clear(self):
+        # Deleted one by one rather than through popitem, so a clear is not counted as evictions
+        for key in list(self._sizes):
+            del self[key]
+
+    def fresh(self, key) -> bool:
+        """Whether `key` is still within its TTL rather than in the stale grace period"""
+        return self._expires_at.get(key, 0.0) > time.time()
+
+    def in_grace(self, key) -> bool:
+        """Whether `key` is past its TTL but within the stale grace period"""
+        expires_at = self._expires_at.get(key, 0.0)
+        return expires_at <= time.time() < expires_at + self.grace
+
+    def live_items(self) -> List[Tuple[str, Any, float]]:
+        """(key, value, expiry as a Unix timestamp) of every fresh entry, without touching LRU order"""
+        now = time.time()
+        return [
+            (key, cachetools.Cache.__getitem__(self, key), expires_at)
+            for key, expires_at in self._expires_at.items() if expires_at > now
+        ]
 
 
 class CacheService:
-    """Service for handling in-memory caching with TTL"""
-    
-    def __init__(self):
-        self.cache = cachetools.TTLCache(
+    """Service for handling caching with TTL.
+
+    L1 is an in-process TTL/LRU cache. When REDIS_URL is configured, Redis is
+    used as a shared L2 tier so answers are reused across uvicorn workers.
+    Keys are normalized queries; with SIMILARITY_ENABLED a local MinHash index
+    over L1 keys also serves near-duplicate queries after an exact miss.
+    With CACHE_SNAPSHOT_PATH set, L1 is saved to disk periodically and on
+    shutdown; the next process loads it in the background into a separate
+    restored tier whose entries keep their remaining TTL. Restored entries
+    count towards CACHE_MAX_BYTES and are dropped, shortest-lived first,
+    when L1 needs the room.
+    With CACHE_STALE_GRACE_S, expired L1 entries are kept that much longer and
+    `lookup(..., allow_stale=True)` may return them, flagged as stale.
+    One instance is created per process in the app lifespan and shared by all
+    requests, see `dependencies.get_cache_service`.
+    """
+
+    def __init__(self, redis_client=None):
+        self.index = SimilarityIndex(
+            threshold=settings.SIMILARITY_THRESHOLD,
+            num_perm=settings.SIMILARITY_NUM_PERM,
+            bands=settings.SIMILARITY_BANDS,
+            max_shingles=settings.SIMILARITY_MAX_SHINGLES
+        ) if settings.SIMILARITY_ENABLED else None
+        self.compress = settings.CACHE_COMPRESSION == "zlib"
+        self.cache = InstrumentedTTLCache(
             maxsize=settings.CACHE_MAX_SIZE,
-            ttl=settings.CACHE_TTL_SECONDS
+            ttl=settings.CACHE_TTL_SECONDS,
+            max_bytes=settings.CACHE_MAX_BYTES,
+            grace=settings.CACHE_STALE_GRACE_S,
+            on_remove=self.index.remove if self.index is not None else None,
+            on_evict=lambda reason, count: metrics.cache_evictions.inc(count, reason=reason)
+        )
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.near_hits = 0
+        self.stale_hits = 0
+        # Normalized keys whose stale entry is being refreshed in the background
+        self.refreshing = set()
+        # Entries loaded from the last snapshot: key -> (entry, expiry as a Unix timestamp),
+        # in snapshot order, i.e. longest-lived first
+        self.restored: Dict[str, Tuple[CacheEntry, float]] = {}
+        self.restored_bytes = 0
+        self.restored_raw_bytes = 0
+        self.restored_hits = 0
+        self.restored_evicted = 0
+        self.snapshot = CacheSnapshot(
+            settings.CACHE_SNAPSHOT_PATH, settings.CACHE_SNAPSHOT_MAX_BYTES
+        ) if settings.CACHE_SNAPSHOT_PATH else None
+        self.snapshot_stats = {
+            "loaded": 0, "skipped": 0, "saved": 0, "bytes": 0, "errors": 0, "last_saved_at": None
+        }
+        self._restore_task: Optional[asyncio.Task] = None
+        self._snapshot_task: Optional[asyncio.Task] = None
+        # A client can be injected (e.g. a fake Redis) without setting REDIS_URL
+        self.l2 = RedisCacheTier(redis_client) if (redis_client is not None or settings.REDIS_URL) else None
+        logger.info(
+            "Cache initialized with TTL: %ss, Max size: %s, Max bytes: %s, Compression: %s, L2: %s",
+            settings.CACHE_TTL_SECONDS, settings.CACHE_MAX_SIZE, settings.CACHE_MAX_BYTES or 'unlimited',
+            settings.CACHE_COMPRESSION, 'redis' if self.l2 else 'disabled'
         )
-        logger.info(f"Cache initialized with TTL: {settings.CACHE_TTL_SECONDS}s, Max size: {settings.CACHE_MAX_SIZE}")
-    
-    def get(self, key: str) -> Optional[Any]:
-        """Get value from cache"""
-        value = self.cache.get(key)
+
+    async def connect(self) -> None:
+        """Check that the L2 tier is reachable and start loading the snapshot in the background"""
+        if self.l2 and not await self.l2.ping():
+            logger.warning("Redis L2 cache unreachable at startup, using L1 only")
+        if self.snapshot:
+            # Startup does not wait for the load; lookups simply miss the restored tier until it is filled
+            self._restore_task = asyncio.create_task(self._restore_snapshot())
+            if settings.CACHE_SNAPSHOT_INTERVAL_S > 0:
+                self._snapshot_task = asyncio.create_task(self._snapshot_periodically())
+
+    async def close(self) -> None:
+        """Write a final snapshot and release L2 connections"""
+        if self._snapshot_task:
+            self._snapshot_task.cancel()
+            try:
+                await self._snapshot_task
+            except asyncio.CancelledError:
+                pass
+        if self._restore_task:
+            # Saving before the load finished would drop the entries not loaded yet
+            await self._restore_task
+        if self.snapshot:
+            await self.save_snapshot()
+        if self.l2:
+            await self.l2.close()
+
+    def _read_snapshot(self) -> Tuple[List[Tuple[str, CacheEntry, float]], int]:
+        """Read the snapshot and build (compressed) entries; runs in a worker thread"""
+        entries, skipped = self.snapshot.read()
+        return [(key, CacheEntry(value, self.compress), expires_at) for key, value, expires_at in entries], skipped
+
+    async def _restore_snapshot(self) -> None:
+        start_time = time.perf_counter()
+        try:
+            entries, skipped = await asyncio.to_thread(self._read_snapshot)
+        except OSError as e:
+            self.snapshot_stats["errors"] += 1
+            logger.warning("Cache snapshot could not be read, starting cold: %s", e)
+            return
+        loaded = 0
+        with self._lock:
+            for key, value, expires_at in entries:
+                # An answer cached since startup is fresher than the snapshot's
+                if key not in self.cache:
+                    self._add_restored(key, value, expires_at)
+                    loaded += 1
+            self._trim_restored()
+        self.snapshot_stats["loaded"] = loaded
+        self.snapshot_stats["skipped"] = skipped
+        logger.info(
+            "Cache snapshot: restored %s entries (%s expired or unreadable) in %.3fs",
+            loaded, skipped, time.perf_counter() - start_time
+        )
+
+    async def _snapshot_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(settings.CACHE_SNAPSHOT_INTERVAL_S)
+            await self.save_snapshot()
+
+    async def save_snapshot(self) -> None:
+        """Write L1 and the still-valid restored entries to the snapshot file"""
+        now = time.time()
+        with self._lock:
+            for key in [key for key, (_, expires_at) in self.restored.items() if expires_at <= now]:
+                self._drop_restored(key)
+            entries = self.cache.live_items()
+            entries.extend((key, entry, expires_at) for key, (entry, expires_at) in self.restored.items())
+        # Entries are never mutated, so they can be decompressed by the writer thread
+        values = ((key, entry.value(), expires_at) for key, entry, expires_at in entries)
+        try:
+            written, size = await asyncio.to_thread(
+                self.snapshot.write, (item for item in values if isinstance(item[1], str))
+            )
+        except OSError as e:
+            self.snapshot_stats["errors"] += 1
+            logger.warning("Cache snapshot could not be written to %s: %s", self.snapshot.path, e)
+            return
+        self.snapshot_stats.update(
+            saved=written, bytes=size, last_saved_at=datetime.now(timezone.utc).isoformat()
+        )
+        logger.info("Cache snapshot: saved %s of %s entries (%s bytes)", written, len(entries), size)
+
+    def _add_restored(self, key: str, entry: CacheEntry, expires_at: float) -> None:
+        self._drop_restored(key)
+        self.restored[key] = (entry, expires_at)
+        size, raw_size = _entry_sizes(key, entry)
+        self.restored_bytes += size
+        self.restored_raw_bytes += raw_size
+
+    def _drop_restored(self, key: str) -> bool:
+        item = self.restored.pop(key, None)
+        if item is None:
+            return False
+        size, raw_size = _entry_sizes(key, item[0])
+        self.restored_bytes -= size
+        self.restored_raw_bytes -= raw_size
+        return True
+
+    def _trim_restored(self) -> None:
+        """Drop restored entries while L1 and the restored tier together exceed CACHE_MAX_BYTES"""
+        max_bytes = self.cache.max_bytes
+        while max_bytes and self.restored and self.cache.bytes + self.restored_bytes > max_bytes:
+            # The last one in snapshot order expires soonest
+            key = next(reversed(self.restored))
+            self._drop_restored(key)
+            self.restored_evicted += 1
+            metrics.cache_evictions.inc(reason="max_bytes")
+
+    def _store_local(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        entry = CacheEntry(value, self.compress)
+        with self._lock:
+            # Whether stored or rejected as too large, the new value supersedes older ones
+            self._drop_restored(key)
+            if self.cache.store(key, entry, ttl):
+                if self.index is not None:
+                    self.index.add(key)
+                self._trim_restored()
+
+    def get_local(self, key: str) -> Optional[Any]:
+        """Get value for a normalized key from the in-process L1 cache only (fresh entries)"""
+        with self._lock:
+            entry = self.cache.get(key)
+            if entry is not None and self.cache.fresh(key):
+                self.hits += 1
+            else:
+                entry = None
+                self.misses += 1
+        return entry.value() if entry is not None else None
+
+    def get_stale(self, key: str) -> Optional[Any]:
+        """Get value for a normalized key from L1 if it is past its TTL but within the grace period"""
+        with self._lock:
+            entry = self.cache.get(key)
+            if entry is None or not self.cache.in_grace(key):
+                return None
+            self.stale_hits += 1
+        return entry.value()
+
+    def get_restored(self, key: str) -> Optional[Any]:
+        """Get value for a normalized key from the entries restored from the snapshot"""
+        with self._lock:
+            item = self.restored.get(key)
+            if item is None:
+                return None
+            if item[1] <= time.time():
+                self._drop_restored(key)
+                return None
+            self.restored_hits += 1
+        return item[0].value()
+
+    def get_near(self, key: str) -> Optional[Any]:
+        """Get value of the most similar L1 key above SIMILARITY_THRESHOLD"""
+        if self.index is None:
+            return None
+        with self._lock:
+            match = self.index.most_similar(key)
+            entry = self.cache.get(match[0]) if match and self.cache.fresh(match[0]) else None
+            if entry is not None:
+                self.near_hits += 1
+        value = entry.value() if entry is not None else None
         if value is not None:
-            logger.debug(f"Cache hit for key: {key[:50]}...")
-        else:
-            logger.debug(f"Cache miss for key: {key[:50]}...")
+            logger.debug("Cache near hit (%.2f) for key: %.50s... -> %.50s...", match[1], key, match[0])
         return value
-    
-    def set(self, key: str, value: Any) -> None:
-        """Set value in cache"""
-        self.cache[key] = value
-        logger.debug(f"Cache set for key: {key[:50]}...")
-    
-    def delete(self, key: str) -> None:
-        """Delete value from cache"""
-        if key in self.cache:
-            del self.cache[key]
-            logger.debug(f"Cache deleted for key: {key[:50]}...")
-    
+
+    async def get(self, query: str) -> Optional[Any]:
+        """Get a fresh value from cache: exact L1, restored snapshot, exact L2, then near-duplicate L1"""
+        value, _ = await self.lookup(query)
+        return value
+
+    async def lookup(self, query: str, allow_stale: bool = False) -> Tuple[Optional[Any], str]:
+        """Like `get`, but with `allow_stale` a stale L1 entry is returned when no fresh one is found.
+
+        Returns (value, result) where result is where the value came from:
+        "l1_hit", "restored_hit", "l2_hit", "near_hit", "stale_hit" or "miss".
+        """
+        results = await self.lookup_many([query], allow_stale)
+        return results[0]
+
+    async def lookup_many(self, queries: List[str], allow_stale: bool = False) -> List[Tuple[Optional[Any], str]]:
+        """`lookup` for several queries at once: their L1 misses share one pipelined L2 round trip"""
+        start_time = time.perf_counter()
+        keys = [normalize_query(query) for query in queries]
+        results = [self._lookup_local(key) for key in keys]
+        if self.l2:
+            found = await self.l2.get_many_with_ttl(list({key for key, (value, _) in zip(keys, results) if value is None}))
+            for key, (value, ttl) in found.items():
+                # Promote so the next lookup in this process stays local, for no longer than Redis keeps it
+                self._store_local(key, value, ttl)
+            results = [
+                (found[key][0], "l2_hit") if value is None and key in found else (value, result)
+                for key, (value, result) in zip(keys, results)
+            ]
+        for i, key in enumerate(keys):
+            if results[i][0] is None:
+                results[i] = self._lookup_fallback(key, allow_stale)
+            metrics.cache_lookups.inc(result=results[i][1])
+            if results[i][0] is not None:
+                logger.debug("Cache hit for key: %.50s...", key)
+            else:
+                logger.debug("Cache miss for key: %.50s...", key)
+        metrics.observe_stage("cache_lookup", time.perf_counter() - start_time)
+        return results
+
+    def _lookup_local(self, key: str) -> Tuple[Optional[Any], str]:
+        """Exact L1, then restored snapshot entries"""
+        value = self.get_local(key)
+        if value is not None:
+            return value, "l1_hit"
+        if self.restored:
+            value = self.get_restored(key)
+            if value is not None:
+                return value, "restored_hit"
+        return None, "miss"
+
+    def _lookup_fallback(self, key: str, allow_stale: bool) -> Tuple[Optional[Any], str]:
+        """Near-duplicate L1, then (with `allow_stale`) a stale L1 entry"""
+        value = self.get_near(key)
+        if value is not None:
+            return value, "near_hit"
+        if allow_stale:
+            value = self.get_stale(key)
+            if value is not None:
+                return value, "stale_hit"
+        return None, "miss"
+
+    def begin_refresh(self, query: str) -> bool:
+        """Claim the background refresh of a stale entry; False if one is already running"""
+        key = normalize_query(query)
+        with self._lock:
+            if key in self.refreshing:
+                return False
+            self.refreshing.add(key)
+        return True
+
+    def end_refresh(self, query: str) -> None:
+        with self._lock:
+            self.refreshing.discard(normalize_query(query))
+
+    async def set(self, query: str, value: Any) -> None:
+        """Set value in cache (L1 and L2)"""
+        key = normalize_query(query)
+        self._store_local(key, value)
+        if self.l2:
+            await self.l2.set(key, value)
+        logger.debug("Cache set for key: %.50s...", key)
+
+    async def delete(self, query: str) -> None:
+        """Delete value from cache (L1 and L2)"""
+        key = normalize_query(query)
+        with self._lock:
+            removed = self.cache.pop(key, None) is not None
+            removed = self._drop_restored(key) or removed
+        if self.l2:
+            await self.l2.delete(key)
+        if removed:
+            logger.debug("Cache deleted for key: %.50s...", key)
+
     def clear(self) -> None:
-        """Clear all cache entries"""
-        self.cache.clear()
+        """Clear all L1 cache entries (the shared L2 tier is left to expire on its own)"""
+        with self._lock:
+            self.cache.clear()
+            self.restored.clear()
+            self.restored_bytes = 0
+            self.restored_raw_bytes = 0
         logger.info("Cache cleared")
-    
+
     def get_stats(self) -> dict:
         """Get cache statistics"""
+        with self._lock:
+            size = len(self.cache)
+            l1_lookups = self.hits + self.misses
+            l1 = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / l1_lookups, 4) if l1_lookups else 0.0
+            }
+            evictions = self.cache.evictions
+            eviction_reasons = {
+                "expired": self.cache.expirations,
+                **self.cache.eviction_reasons,
+                "too_large": self.cache.too_large
+            }
+            expirations = self.cache.expirations
+            cache_bytes = self.cache.bytes + self.restored_bytes
+            raw_bytes = self.cache.raw_bytes + self.restored_raw_bytes
+            restored_bytes = self.restored_bytes
+            restored_evicted = self.restored_evicted
+            near_hits = self.near_hits
+            stale_hits = self.stale_hits
+            refreshing = len(self.refreshing)
+            restored_hits = self.restored_hits
+            restored_size = len(self.restored)
+            indexed = len(self.index) if self.index is not None else 0
+        l2 = self.l2.get_stats() if self.l2 else {"enabled": False}
+        # Every restored, L2 or near-duplicate lookup follows an exact L1 miss
+        exact_hits = l1["hits"] + restored_hits + l2.get("hits", 0)
+        hits = exact_hits + near_hits + stale_hits
+        misses = l1["misses"] - restored_hits - l2.get("hits", 0) - near_hits - stale_hits
+        lookups = hits + misses
         return {
-            "size": len(self.cache),
+            "size": size,
             "max_size": settings.CACHE_MAX_SIZE,
-            "ttl": settings.CACHE_TTL_SECONDS
-        }
\ No newline at end of file
+            "ttl": settings.CACHE_TTL_SECONDS,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "exact_hits": exact_hits,
+            "near_hits": near_hits,
+            "stale_hits": stale_hits,
+            "stale_grace_s": settings.CACHE_STALE_GRACE_S,
+            "refreshes_in_flight": refreshing,
+            "similarity": {
+                "enabled": self.index is not None,
+                "threshold": settings.SIMILARITY_THRESHOLD,
+                "indexed_keys": indexed
+            },
+            "evictions": evictions,
+            "expirations": expirations,
+            "eviction_reasons": eviction_reasons,
+            "bytes": cache_bytes,
+            "max_bytes": settings.CACHE_MAX_BYTES,
+            "uncompressed_bytes": raw_bytes,
+            "compression": settings.CACHE_COMPRESSION,
+            "compression_ratio": round(raw_bytes / cache_bytes, 3) if cache_bytes else 1.0,
+            "tiers": {"l1": l1, "l2": l2},
+            "snapshot": {
+                "enabled": self.snapshot is not None,
+                "path": settings.CACHE_SNAPSHOT_PATH or None,
+                "restored_entries": restored_size,
+                "restored_hits": restored_hits,
+                "restored_bytes": restored_bytes,
+                "restored_evicted": restored_evicted,
+                **self.snapshot_stats
+            }
+        }
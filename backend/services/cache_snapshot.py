@@ -0,0 +1,131 @@
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Iterable, Iterator, List, Tuple
+from logger import logger
+
+
+# File layout: header, then one record per entry until end of file.
+#   header: magic, format version, wall-clock time the snapshot was written
+#   record: crc32 of everything after it, wall-clock expiry, key length, value length,
+#           UTF-8 key, zlib-compressed UTF-8 value
+MAGIC = b"AICS"
+VERSION = 1
+FILE_HEADER = struct.Struct("<4sBd")
+RECORD_HEADER = struct.Struct("<IdII")
+# Bytes of the record header covered by the checksum (everything but the crc itself)
+CHECKED_HEADER = struct.Struct("<dII")
+
+# (key, value, expires_at as a Unix timestamp)
+Entry = Tuple[str, str, float]
+
+
+class CacheSnapshot:
+    """Compact on-disk copy of the answer cache, used to warm it up after a restart.
+
+    Writes go to a temporary file that replaces the snapshot atomically, so a
+    crash mid-write leaves the previous snapshot intact. Entries are written
+    longest-lived first until `max_bytes` is reached. Reading stops at the first
+    truncated or corrupted record and keeps everything before it. Both methods
+    block and are meant to run in a worker thread; concurrent writes run one
+    after the other, since they share the temporary file.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        # Cancelling the coroutine awaiting a write does not stop its thread, so asyncio locks are not enough
+        self._write_lock = threading.Lock()
+
+    def write(self, entries: Iterable[Entry]) -> Tuple[int, int]:
+        """Replace the snapshot with `entries`; returns (entries written, file size)"""
+        with self._write_lock:
+            return self._write(entries)
+
+    def _write(self, entries: Iterable[Entry]) -> Tuple[int, int]:
+        now = time.time()
+        live = sorted((e for e in entries if e[2] > now), key=lambda e: e[2], reverse=True)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        written = 0
+        size = FILE_HEADER.size
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(FILE_HEADER.pack(MAGIC, VERSION, now))
+                for key, value, expires_at in live:
+                    key_bytes = key.encode("utf-8")
+                    value_bytes = zlib.compress(value.encode("utf-8"))
+                    body = CHECKED_HEADER.pack(expires_at, len(key_bytes), len(value_bytes)) + key_bytes + value_bytes
+                    if size + 4 + len(body) > self.max_bytes:
+                        break
+                    f.write(struct.pack("<I", zlib.crc32(body)))
+                    f.write(body)
+                    size += 4 + len(body)
+                    written += 1
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return written, size
+
+    def read(self) -> Tuple[List[Entry], int]:
+        """Load unexpired entries; returns (entries, records skipped as expired or corrupt)"""
+        entries = []
+        skipped = 0
+        now = time.time()
+        for entry in self._records():
+            if entry is None:
+                skipped += 1
+            elif entry[2] > now:
+                entries.append(entry)
+            else:
+                skipped += 1
+        return entries, skipped
+
+    def _records(self) -> Iterator[Entry]:
+        """Yield records in file order, None for a corrupted one, stopping where the file becomes unreadable"""
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            header = f.read(FILE_HEADER.size)
+            if len(header) < FILE_HEADER.size:
+                logger.warning("Cache snapshot %s is truncated, ignoring it", self.path)
+                return
+            magic, version, _ = FILE_HEADER.unpack(header)
+            if magic != MAGIC or version != VERSION:
+                logger.warning("Cache snapshot %s has an unknown format, ignoring it", self.path)
+                return
+            while True:
+                offset = f.tell()
+                record_header = f.read(RECORD_HEADER.size)
+                if not record_header:
+                    return
+                if len(record_header) < RECORD_HEADER.size:
+                    break
+                crc, expires_at, key_len, value_len = RECORD_HEADER.unpack(record_header)
+                if key_len + value_len > self.max_bytes:
+                    break
+                payload = f.read(key_len + value_len)
+                if len(payload) < key_len + value_len:
+                    break
+                if zlib.crc32(record_header[4:] + payload) != crc:
+                    # The lengths themselves may be wrong, so nothing after this can be trusted
+                    break
+                try:
+                    key = payload[:key_len].decode("utf-8")
+                    value = zlib.decompress(payload[key_len:]).decode("utf-8")
+                except (UnicodeDecodeError, zlib.error):
+                    yield None
+                    continue
+                yield key, value, expires_at
+            yield None
+            logger.warning("Cache snapshot %s is corrupted at offset %s, keeping the records before it", self.path, offset)
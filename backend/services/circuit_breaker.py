@@ -0,0 +1,180 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, Optional
+from config import settings
+from logger import logger
+import metrics
+from services.admission import AdmissionRejected
+from services.deadline import DeadlineExceeded
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Gauge values for ai_agent_circuit_state
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Shed locally, out of budget or cancelled by the caller: says nothing about the upstream
+IGNORED_ERRORS = (AdmissionRejected, DeadlineExceeded, asyncio.CancelledError)
+
+
+class CircuitOpen(Exception):
+    """The breaker for this upstream is open, the call was refused without being sent; maps to a 503"""
+
+    status_code = 503
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is temporarily unavailable (circuit open), retry after {math.ceil(retry_after)}s")
+        self.name = name
+        self.retry_after = retry_after
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker for one upstream model.
+
+    Closed: calls go through and their outcomes fill a rolling window; a failed
+    call or one slower than `slow_call_s` counts as bad. Once the window holds
+    at least `min_calls` outcomes and the bad share reaches `failure_rate`, the
+    breaker opens. Open: calls are refused straight away for `cooldown_s`.
+    Half-open: up to `half_open_probes` calls are let through as probes; a good
+    probe closes the breaker, a bad one opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        slow_call_s: float,
+        failure_rate: float = None,
+        window: int = None,
+        min_calls: int = None,
+        cooldown_s: float = None,
+        half_open_probes: int = None
+    ):
+        self.name = name
+        self.slow_call_s = slow_call_s
+        self.failure_rate = settings.CIRCUIT_FAILURE_RATE if failure_rate is None else failure_rate
+        self.min_calls = settings.CIRCUIT_MIN_CALLS if min_calls is None else min_calls
+        self.cooldown_s = settings.CIRCUIT_COOLDOWN_S if cooldown_s is None else cooldown_s
+        self.half_open_probes = settings.CIRCUIT_HALF_OPEN_PROBES if half_open_probes is None else half_open_probes
+        self.enabled = settings.CIRCUIT_BREAKER_ENABLED
+        self.outcomes = deque(maxlen=settings.CIRCUIT_WINDOW if window is None else window)  # True = bad call
+        self._state = CLOSED
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self.refused = 0
+        self.transitions = deque(maxlen=20)
+        metrics.circuit_state.set(STATE_VALUES[CLOSED], model=name)
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self.opened_at >= self.cooldown_s:
+            self._transition(HALF_OPEN, "cooldown elapsed")
+        return self._state
+
+    def _transition(self, state: str, reason: str) -> None:
+        previous, self._state = self._state, state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+        if state != HALF_OPEN:
+            self.probes_in_flight = 0
+        if state == CLOSED:
+            self.outcomes.clear()
+        self.transitions.append({
+            "from": previous,
+            "to": state,
+            "reason": reason,
+            "at": datetime.now(timezone.utc).isoformat()
+        })
+        metrics.circuit_state.set(STATE_VALUES[state], model=self.name)
+        metrics.circuit_transitions.inc(model=self.name, state=state)
+        log = logger.warning if state == OPEN else logger.info
+        log("Circuit %s: %s -> %s (%s)", self.name, previous, state, reason)
+
+    def available(self) -> bool:
+        """Would a call be let through right now (without reserving a probe)"""
+        if not self.enabled:
+            return True
+        state = self.state
+        return state == CLOSED or (state == HALF_OPEN and self.probes_in_flight < self.half_open_probes)
+
+    def _release_probe(self) -> None:
+        # Another probe may already have settled the state and reset the count
+        self.probes_in_flight = max(0, self.probes_in_flight - 1)
+
+    def _record(self, bad: bool, probe: bool, reason: str) -> None:
+        if probe:
+            self._release_probe()
+            if self._state == HALF_OPEN:
+                self._transition(OPEN if bad else CLOSED, f"probe {reason}")
+            return
+        if self._state != CLOSED:
+            return
+        self.outcomes.append(bad)
+        if len(self.outcomes) >= self.min_calls:
+            rate = sum(self.outcomes) / len(self.outcomes)
+            if rate >= self.failure_rate:
+                self._transition(OPEN, f"{rate:.0%} of the last {len(self.outcomes)} calls failed or were slow")
+
+    @asynccontextmanager
+    async def guard(self, timed: bool = True) -> AsyncIterator[None]:
+        """Run one upstream call under the breaker, or raise CircuitOpen.
+
+        Exceptions raised by the body count as failures, and so does a call
+        slower than `slow_call_s` when `timed` (off for streams, whose length
+        depends on the answer). `IGNORED_ERRORS` are not recorded, and neither
+        is a stream closed by its consumer (GeneratorExit) part way through.
+        """
+        if not self.enabled:
+            yield
+            return
+        if not self.available():
+            self.refused += 1
+            raise CircuitOpen(self.name, max(0.0, self.cooldown_s - (time.monotonic() - self.opened_at)))
+        probe = self._state == HALF_OPEN
+        if probe:
+            self.probes_in_flight += 1
+        start_time = time.monotonic()
+        try:
+            yield
+        except IGNORED_ERRORS:
+            if probe:
+                self._release_probe()
+            raise
+        except Exception as e:
+            self._record(True, probe, type(e).__name__)
+            raise
+        except BaseException:
+            # GeneratorExit from an abandoned stream: give the probe slot back so the next call can probe
+            if probe:
+                self._release_probe()
+            raise
+        duration = time.monotonic() - start_time
+        slow = timed and duration > self.slow_call_s
+        self._record(slow, probe, f"slow ({duration:.2f}s)" if slow else "succeeded")
+
+    def get_stats(self) -> dict:
+        state = self.state
+        bad = sum(self.outcomes)
+        retry_in: Optional[float] = None
+        if state == OPEN:
+            retry_in = round(max(0.0, self.cooldown_s - (time.monotonic() - self.opened_at)), 1)
+        return {
+            "enabled": self.enabled,
+            "state": state,
+            "window_calls": len(self.outcomes),
+            "window_failure_rate": round(bad / len(self.outcomes), 3) if self.outcomes else 0.0,
+            "failure_rate_threshold": self.failure_rate,
+            "slow_call_s": self.slow_call_s,
+            "refused": self.refused,
+            "retry_in_s": retry_in,
+            "transitions": list(self.transitions)
+        }
@@ -0,0 +1,36 @@
+import time
+from config import settings
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out before a stage could (re)try its call"""
+
+
+class Deadline:
+    """End-to-end time budget of one request, measured on the monotonic clock.
+
+    Stages take a share of what is left with `child()`, so a slow orchestrator
+    eats into its own budget and not the executor's.
+    """
+
+    def __init__(self, seconds: float = None, expires_at: float = None):
+        if expires_at is None:
+            expires_at = time.monotonic() + (settings.REQUEST_DEADLINE_S if seconds is None else seconds)
+        self.expires_at = expires_at
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def child(self, share: float) -> "Deadline":
+        """Sub-budget of `share` of the time remaining now"""
+        return Deadline(expires_at=time.monotonic() + self.remaining() * share)
+
+    def attempt_timeout(self) -> float:
+        """Timeout for one upstream attempt: the per-call timeout capped by the budget left"""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded("request deadline exceeded")
+        return min(settings.HTTP_REQUEST_TIMEOUT_S, remaining)
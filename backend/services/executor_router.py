@@ -0,0 +1,179 @@
+import json
+import os
+import random
+import time
+from typing import Collection, Dict, List, Optional
+from urllib.parse import urlparse
+from openai import AsyncOpenAI
+from config import settings
+from logger import logger
+import metrics
+import openai_api
+from services.circuit_breaker import CircuitBreaker, CircuitOpen
+
+
+class ExecutorBackend:
+    """One OpenAI-compatible executor endpoint with its own client, breaker and routing statistics.
+
+    `name` labels its metrics and breaker (it defaults to the model name), so
+    two endpoints serving the same model can still be told apart.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        model: str,
+        base_url: Optional[str] = None,
+        api_key: str = "",
+        cost_weight: float = 1.0,
+        slow_call_s: float = None
+    ):
+        self.name = name
+        self.model = model
+        self.base_url = base_url
+        self.cost_weight = cost_weight
+        self.client: AsyncOpenAI = openai_api.create_client(api_key=api_key, base_url=base_url)
+        self.breaker = CircuitBreaker(name, settings.OPENAI_SLOW_CALL_S if slow_call_s is None else slow_call_s)
+        # Moving averages of successful call latency and of the error share; None until the first answer
+        self.latency_ewma: Optional[float] = None
+        self.error_ewma = 0.0
+        self.calls = 0
+        self.errors = 0
+        self.routed = 0
+
+    def score(self) -> float:
+        """Expected cost of sending the next call here, lower is better.
+
+        A backend without a latency sample yet scores 0 so that it gets tried.
+        """
+        latency = self.latency_ewma or 0.0
+        return (latency + self.error_ewma * settings.EXECUTOR_ERROR_PENALTY_S) * self.cost_weight
+
+    def record(self, duration: Optional[float], ok: bool) -> None:
+        """Fold one upstream call into the moving averages (`duration` None leaves the latency alone)"""
+        alpha = settings.EXECUTOR_EWMA_ALPHA
+        self.calls += 1
+        self.error_ewma = (1 - alpha) * self.error_ewma + alpha * (0.0 if ok else 1.0)
+        if ok and duration is not None:
+            self.latency_ewma = duration if self.latency_ewma is None else (1 - alpha) * self.latency_ewma + alpha * duration
+            metrics.executor_latency_ewma.set(self.latency_ewma, backend=self.name)
+        elif not ok:
+            self.errors += 1
+        metrics.executor_error_rate.set(self.error_ewma, backend=self.name)
+
+    def get_stats(self) -> dict:
+        return {
+            "model": self.model,
+            "base_url": self.base_url or "default",
+            "cost_weight": self.cost_weight,
+            "latency_ewma_s": round(self.latency_ewma, 4) if self.latency_ewma is not None else None,
+            "error_rate_ewma": round(self.error_ewma, 4),
+            "score": round(self.score(), 4),
+            "routed": self.routed,
+            "calls": self.calls,
+            "errors": self.errors,
+            "circuit_state": self.breaker.state
+        }
+
+
+def _may_use_openai_key(base_url: Optional[str]) -> bool:
+    """Whether OPENAI_API_KEY may be sent to `base_url`: only OpenAI itself or the configured OPENAI_BASE_URL"""
+    if not base_url or base_url.rstrip("/") == settings.OPENAI_BASE_URL.rstrip("/"):
+        return True
+    return urlparse(base_url).hostname == "api.openai.com"
+
+
+def backends_from_settings() -> List[ExecutorBackend]:
+    """Backends listed in EXECUTOR_BACKENDS, or the single OPENAI_* executor when it is empty.
+
+    EXECUTOR_BACKENDS is a JSON list of objects with `model` and optionally
+    `name`, `base_url`, `api_key` or `api_key_env` (name of the variable
+    holding the key), `cost_weight` and `slow_call_s`; unset fields fall back
+    to the OPENAI_* settings, except that OPENAI_API_KEY is never sent to
+    another `base_url`: such a backend without its own key gets none.
+    """
+    if not settings.EXECUTOR_BACKENDS.strip():
+        return [ExecutorBackend(
+            settings.OPENAI_EXECUTOR_MODEL, settings.OPENAI_EXECUTOR_MODEL,
+            settings.OPENAI_BASE_URL or None, settings.OPENAI_API_KEY
+        )]
+    try:
+        configs = json.loads(settings.EXECUTOR_BACKENDS)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"EXECUTOR_BACKENDS is not valid JSON: {e}")
+    if not isinstance(configs, list) or not configs:
+        raise ValueError("EXECUTOR_BACKENDS must be a non-empty JSON list")
+    backends = []
+    for config in configs:
+        model = config.get("model", settings.OPENAI_EXECUTOR_MODEL)
+        base_url = config.get("base_url", settings.OPENAI_BASE_URL) or None
+        api_key = config.get("api_key") or os.getenv(config.get("api_key_env", ""), "")
+        if not api_key and _may_use_openai_key(base_url):
+            api_key = settings.OPENAI_API_KEY
+        backends.append(ExecutorBackend(
+            name=config.get("name", model),
+            model=model,
+            base_url=base_url,
+            api_key=api_key,
+            cost_weight=float(config.get("cost_weight", 1.0)),
+            slow_call_s=config.get("slow_call_s")
+        ))
+    names = [backend.name for backend in backends]
+    if len(set(names)) != len(names):
+        raise ValueError(f"EXECUTOR_BACKENDS names must be unique, got {names}")
+    return backends
+
+
+class ExecutorRouter:
+    """Picks the executor backend for each call by EWMA latency, error rate and cost weight.
+
+    Backends whose breaker is open are skipped, which is what fails traffic
+    over when one degrades. With EXECUTOR_EXPLORE_RATE a small share of calls
+    goes to a random available backend so that the averages of the others
+    keep up to date.
+    """
+
+    def __init__(self, backends: List[ExecutorBackend] = None):
+        self.backends = backends if backends is not None else backends_from_settings()
+        self.by_name: Dict[str, ExecutorBackend] = {backend.name: backend for backend in self.backends}
+        self._random = random.Random()
+        logger.info("Executor backends: %s", ', '.join(f'{b.name} ({b.model})' for b in self.backends))
+
+    @property
+    def primary(self) -> ExecutorBackend:
+        return self.backends[0]
+
+    def pick(self, exclude: Collection[str] = ()) -> ExecutorBackend:
+        """Best available backend not in `exclude`, or raise CircuitOpen if there is none"""
+        candidates = [b for b in self.backends if b.name not in exclude and b.breaker.available()]
+        if not candidates:
+            remaining = [b for b in self.backends if b.name not in exclude] or self.backends
+            retry_after = min(
+                max(0.0, b.breaker.cooldown_s - (time.monotonic() - b.breaker.opened_at)) for b in remaining
+            )
+            raise CircuitOpen(remaining[0].name if len(remaining) == 1 else "executor", retry_after)
+        if len(candidates) > 1 and self._random.random() < settings.EXECUTOR_EXPLORE_RATE:
+            backend = self._random.choice(candidates)
+        else:
+            backend = min(candidates, key=lambda b: b.score())
+        backend.routed += 1
+        metrics.executor_routed.inc(backend=backend.name)
+        return backend
+
+    def has_alternative(self, exclude: Collection[str]) -> bool:
+        """Whether some backend outside `exclude` could take a failed-over call"""
+        return any(b.name not in exclude and b.breaker.available() for b in self.backends)
+
+    def breakers(self) -> List[CircuitBreaker]:
+        return [backend.breaker for backend in self.backends]
+
+    async def close(self) -> None:
+        for backend in self.backends:
+            await backend.client.close()
+
+    def get_stats(self) -> dict:
+        return {
+            "explore_rate": settings.EXECUTOR_EXPLORE_RATE,
+            "error_penalty_s": settings.EXECUTOR_ERROR_PENALTY_S,
+            "backends": {backend.name: backend.get_stats() for backend in self.backends}
+        }
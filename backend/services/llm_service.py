@@ -1,22 +1,131 @@
+import asyncio
 import time
-from typing import Dict, Any
-from tenacity import retry, stop_after_attempt, wait_random_exponential, retry_if_exception_type
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, Set
+import httpx
+import openai
+from google.genai import errors as genai_errors
+from tenacity import AsyncRetrying, RetryCallState, retry_if_exception, stop_after_attempt, wait_random_exponential
 from config import settings
 from logger import logger, log_llm_call
-from google import genai
-import time
-from openai_api import call_gpt4o
+import metrics
+import google_api
+from openai_api import call_gpt4o, stream_gpt4o, MAX_OUTPUT_TOKENS
+from services.admission import AdmissionController, AdmissionRejected
+from services.circuit_breaker import CircuitBreaker, CircuitOpen, IGNORED_ERRORS
+from services.deadline import Deadline, DeadlineExceeded
+from services.executor_router import ExecutorBackend, ExecutorRouter
+from services.single_flight import CHARS_PER_TOKEN
+
+
+# Gemma only rewrites the question, its output is short
+ORCHESTRATOR_OUTPUT_TOKENS = 128
+
+# Don't start another attempt with less budget left than this
+RETRY_MIN_ATTEMPT_S = 0.5
+
+PROMPT_LIKE_FALLBACK = "I apologize, but I couldn't generate a proper answer. Please try asking your question differently."
+ERROR_FALLBACK = "Sorry, there was an error generating your answer."
+# Answers returned instead of raising; they are not worth caching
+FALLBACK_ANSWERS = (PROMPT_LIKE_FALLBACK, ERROR_FALLBACK)
+
+
+def build_executor_prompt(prompt: str) -> str:
+    """Enhance the orchestrator prompt to force a direct answer"""
+    return f"""Answer this question directly and informatively: {prompt}
+
+Instructions for AI:
+1. Provide a direct, factual answer, be relatively short
+2. Use clear, concise language
+3. Include specific details where relevant
+4. DO NOT suggest refinements or ask for clarification
+5. DO NOT start with phrases like "Your prompt is" or "To answer this"
+6. Just provide the informative answer. Use symbols like " or * or any other special symbols only when necessary, use correct grammar.
+
+Answer:"""
+
+
+def is_prompt_like(response: str) -> bool:
+    """Check for orchestrator-like output instead of an actual answer"""
+    return any(phrase in response.strip().lower() for phrase in [
+        "your prompt is",
+        "suggestions for refinement",
+        "to answer this question",
+        "i need more context",
+        "could you please clarify"
+    ])
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Transient upstream failures worth another attempt: timeouts, dropped connections, 429 and 5xx"""
+    if isinstance(error, (AdmissionRejected, CircuitOpen, DeadlineExceeded)):
+        return False
+    if isinstance(error, (
+        asyncio.TimeoutError, httpx.TransportError, openai.APIConnectionError,
+        openai.RateLimitError, openai.InternalServerError, genai_errors.ServerError
+    )):
+        return True
+    return isinstance(error, genai_errors.ClientError) and error.code == 429
 
 
 class LLMService:
-    """Service for handling LLM API calls - Google AI Studio with two Gemma models"""
+    """Service for handling LLM API calls - Gemma orchestrator on Google AI Studio and OpenAI executor.
+
+    Created once in the app lifespan: both clients are async and keep pooled
+    HTTP connections alive across requests until `close()` is called on shutdown.
+    Every upstream call first goes through the admission controller, which may
+    make it wait for a slot or shed it with AdmissionRejected, then through the
+    model's circuit breaker, which refuses it with CircuitOpen while the model
+    is failing. Executor calls go to one of the EXECUTOR_BACKENDS picked by the
+    router, and move on to the next backend if that one fails.
+    Without GOOGLE_API_KEY the orchestrator is unavailable (`google_client` is
+    None) and queries go to the executor unchanged.
+    """
     
-    def __init__(self):
-        if not settings.GOOGLE_API_KEY:
-            raise ValueError("GOOGLE_API_KEY is not set")
+    def __init__(self, admission: AdmissionController = None, router: ExecutorRouter = None):
+        self.admission = admission or AdmissionController()
         
         # Initialize Google AI client
-        self.google_client = genai.Client(api_key=settings.GOOGLE_API_KEY)
+        self._google_transport = google_api.create_transport()
+        self.google_client = None
+        if settings.GOOGLE_API_KEY:
+            self.google_client = google_api.create_client(self._google_transport)
+        else:
+            logger.warning("GOOGLE_API_KEY is not set, the Gemma orchestrator is disabled and queries go to the executor unchanged")
+        
+        # OpenAI-compatible executor backends, each with its own client and breaker
+        self.router = router or ExecutorRouter()
+        
+        self.orchestrator_breaker = CircuitBreaker(settings.GEMMA_ORCHESTRATOR_MODEL, settings.GEMMA_SLOW_CALL_S)
+        
+        self.executor_calls = 0
+        self.hedges = 0
+    
+    def _retrying(self, model: str, deadline: Deadline) -> AsyncRetrying:
+        """Jittered exponential backoff, retrying only while the deadline leaves room for another attempt"""
+        def out_of_budget(retry_state: RetryCallState) -> bool:
+            return deadline.remaining() < retry_state.upcoming_sleep + RETRY_MIN_ATTEMPT_S
+        
+        def before_sleep(retry_state: RetryCallState) -> None:
+            metrics.llm_retries.inc(model=model)
+            logger.warning(
+                "%s attempt %s failed (%s), retrying in %.2fs",
+                model, retry_state.attempt_number, type(retry_state.outcome.exception()).__name__,
+                retry_state.upcoming_sleep
+            )
+        
+        return AsyncRetrying(
+            stop=stop_after_attempt(settings.MAX_RETRIES + 1) | out_of_budget,
+            wait=wait_random_exponential(multiplier=settings.RETRY_BASE_DELAY_S, max=settings.RETRY_MAX_DELAY_S),
+            retry=retry_if_exception(is_retryable),
+            before_sleep=before_sleep,
+            reraise=True
+        )
+    
+    async def _call_with_retries(self, model: str, deadline: Deadline, call: Callable[[], Awaitable[Any]]) -> Any:
+        async for attempt in self._retrying(model, deadline):
+            with attempt:
+                result = await call()
+        return result
     
     
     # ISSUE  ---- >  FIXED
@@ -24,11 +133,17 @@ class LLMService:
     # The executor is always called with the orchestrator’s output (or the user’s query if the orchestrator fails).
     # Only the executor’s answer is returned to the user.
 
-    async def call_gemma_orchestrator(self, request_id: str, user_query: str) -> str:
-        """Call Gemma 3 1B as orchestrator to generate a prompt for the executor"""
+    @property
+    def orchestrator_available(self) -> bool:
+        return self.google_client is not None
+    
+    async def generate_orchestrator_prompt(self, request_id: str, user_query: str, deadline: Deadline = None) -> str:
+        """Call Gemma 3 1B as orchestrator to generate a prompt for the executor, raising on failure"""
+        if self.google_client is None:
+            raise RuntimeError("GOOGLE_API_KEY is not set")
         start_time = time.time()
-        try:
-            orchestrator_prompt = f"""You are an AI query optimizer. Your task is to take the user's question and optimize it for the AI executor to provide a direct, informative and accurate answer.
+        deadline = deadline or Deadline()
+        orchestrator_prompt = f"""You are an AI query optimizer. Your task is to take the user's question and optimize it for the AI executor to provide a direct, informative and accurate answer.
 
 User Query: {user_query}
 
@@ -38,62 +153,233 @@ If it is not a question but conversational words like "hey" or direct messages t
 
 Response format:
 [Just the optimized question, nothing else]"""
-            logger.info(f"Request {request_id}: Calling Gemma orchestrator")
-            response = self.google_client.models.generate_content(
-                model=settings.GEMMA_ORCHESTRATOR_MODEL,
-                contents=orchestrator_prompt
-            )
-            orchestrator_response = response.text
-            duration = time.time() - start_time
-            log_llm_call(request_id, "Gemma Orchestrator", orchestrator_prompt, orchestrator_response, duration)
-            # Always return the orchestrator's output as a prompt for the executor, never as a final answer
-            return orchestrator_response.strip()
-        except Exception as e:
-            duration = time.time() - start_time
-            logger.error(f"Request {request_id}: Gemma orchestrator failed after {duration:.2f}s: {str(e)}")
-            # Fallback: use the original user query as prompt for the executor
-            return user_query
+        logger.info("Request %s: Calling Gemma orchestrator", request_id)
+        tokens = len(orchestrator_prompt) // CHARS_PER_TOKEN + ORCHESTRATOR_OUTPUT_TOKENS
+        
+        async def attempt():
+            async with self.admission.admit("gemma", tokens), self.orchestrator_breaker.guard():
+                timeout = deadline.attempt_timeout()
+                return await asyncio.wait_for(
+                    self.google_client.aio.models.generate_content(
+                        model=settings.GEMMA_ORCHESTRATOR_MODEL,
+                        contents=orchestrator_prompt
+                    ),
+                    timeout=timeout
+                )
+        
+        try:
+            response = await self._call_with_retries(settings.GEMMA_ORCHESTRATOR_MODEL, deadline, attempt)
+        except (AdmissionRejected, CircuitOpen):
+            raise
+        except Exception:
+            metrics.llm_call_duration.observe(time.time() - start_time, model=settings.GEMMA_ORCHESTRATOR_MODEL, outcome="error")
+            raise
+        orchestrator_response = response.text
+        duration = time.time() - start_time
+        metrics.llm_call_duration.observe(duration, model=settings.GEMMA_ORCHESTRATOR_MODEL, outcome="ok")
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            metrics.llm_tokens.inc(usage.prompt_token_count or 0, model=settings.GEMMA_ORCHESTRATOR_MODEL, kind="prompt")
+            metrics.llm_tokens.inc(usage.candidates_token_count or 0, model=settings.GEMMA_ORCHESTRATOR_MODEL, kind="completion")
+        log_llm_call(request_id, "Gemma Orchestrator", orchestrator_prompt, orchestrator_response, duration)
+        # Always return the orchestrator's output as a prompt for the executor, never as a final answer
+        return orchestrator_response.strip()
 
-    async def call_openai_executor(self, request_id: str, prompt: str) -> str:
-        """Call OpenAI gpt-4o-mini as executor to generate the final answer"""
+    async def _executor_attempt(self, backend: ExecutorBackend, request_id: str, enhanced_prompt: str, deadline: Deadline) -> str:
+        tokens = len(enhanced_prompt) // CHARS_PER_TOKEN + MAX_OUTPUT_TOKENS
+        async with self.admission.admit("openai", tokens), backend.breaker.guard():
+            timeout = deadline.attempt_timeout()
+            start_time = time.monotonic()
+            try:
+                answer = await asyncio.wait_for(
+                    call_gpt4o(backend.client, request_id, enhanced_prompt, backend.model), timeout=timeout
+                )
+            except IGNORED_ERRORS:
+                raise
+            except Exception:
+                backend.record(time.monotonic() - start_time, ok=False)
+                raise
+            duration = time.monotonic() - start_time
+            backend.record(duration, ok=True)
+            metrics.executor_attempt_duration.observe(duration, backend=backend.name)
+            return answer
+    
+    def _hedge_delay(self, backend: ExecutorBackend) -> Optional[float]:
+        """Seconds to wait before hedging, from the backend's single-attempt latency, or None to not hedge"""
+        if not settings.HEDGE_ENABLED:
+            return None
+        if metrics.executor_attempt_duration.count(backend=backend.name) < settings.HEDGE_MIN_SAMPLES:
+            return None
+        if self.hedges >= settings.HEDGE_MAX_RATIO * self.executor_calls:
+            return None
+        return max(
+            settings.HEDGE_MIN_DELAY_S,
+            metrics.executor_attempt_duration.quantile(settings.HEDGE_QUANTILE, backend=backend.name)
+        )
+    
+    async def _hedged_executor_call(self, backend: ExecutorBackend, request_id: str, enhanced_prompt: str, deadline: Deadline) -> str:
+        """One executor attempt, plus a duplicate if the first outlasts the usual tail latency.
+
+        The first successful answer wins and the other call is cancelled.
+        """
+        self.executor_calls += 1
+        delay = self._hedge_delay(backend)
+        if delay is None:
+            return await self._executor_attempt(backend, request_id, enhanced_prompt, deadline)
+        
+        tasks = [asyncio.ensure_future(self._executor_attempt(backend, request_id, enhanced_prompt, deadline))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and deadline.remaining() > RETRY_MIN_ATTEMPT_S:
+                self.hedges += 1
+                metrics.llm_hedges.inc(outcome="launched")
+                logger.info("Request %s: Executor slower than %.2fs, sending a hedged call", request_id, delay)
+                tasks.append(asyncio.ensure_future(self._executor_attempt(backend, request_id, enhanced_prompt, deadline)))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if len(tasks) > 1:
+                            metrics.llm_hedges.inc(outcome="won" if task is tasks[1] else "lost")
+                        return task.result()
+            # Every call failed: surface the primary's error
+            return tasks[0].result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception()  # mark a losing failure as retrieved
+    
+    def _next_backend(self, request_id: str, failed: Optional[ExecutorBackend], tried: Set[str], error: Exception, route: dict) -> None:
+        """Record a failover from `failed`, or re-raise `error` when no other backend can take the call"""
+        tried.add(failed.name)
+        if not self.router.has_alternative(tried):
+            raise error
+        route.setdefault("failovers", []).append(failed.name)
+        metrics.executor_failovers.inc(backend=failed.name)
+        logger.warning("Request %s: Executor backend %s failed (%s), failing over", request_id, failed.name, type(error).__name__)
+    
+    async def _routed_executor_call(self, request_id: str, enhanced_prompt: str, deadline: Deadline, route: dict) -> str:
+        """One executor attempt on the best backend, failing over to the next best while it errors"""
+        tried: Set[str] = set()
+        while True:
+            backend = self.router.pick(exclude=tried)
+            route.update(backend=backend.name, model=backend.model)
+            try:
+                return await self._hedged_executor_call(backend, request_id, enhanced_prompt, deadline)
+            except (AdmissionRejected, DeadlineExceeded):
+                raise
+            except Exception as e:
+                if deadline.remaining() < RETRY_MIN_ATTEMPT_S:
+                    raise
+                self._next_backend(request_id, backend, tried, e, route)
+    
+    async def call_openai_executor(self, request_id: str, prompt: str, deadline: Deadline = None, route: dict = None) -> str:
+        """Call the executor to generate the final answer.
+
+        `route`, if given, is filled with the backend and model that answered,
+        their latency average and any backends failed over from.
+        """
         start_time = time.time()
+        deadline = deadline or Deadline()
+        route = {} if route is None else route
         try:
-            logger.info(f"Request {request_id}: Calling OpenAI executor")
+            logger.info("Request %s: Calling OpenAI executor", request_id)
             
             # Enhance the prompt to force a direct answer
-            enhanced_prompt = f"""Answer this question directly and informatively: {prompt}
-
-Instructions for AI:
-1. Provide a direct, factual answer, be relatively short
-2. Use clear, concise language
-3. Include specific details where relevant
-4. DO NOT suggest refinements or ask for clarification
-5. DO NOT start with phrases like "Your prompt is" or "To answer this"
-6. Just provide the informative answer. Use symbols like " or * or any other special symbols only when necessary, use correct grammar.
-
-Answer:"""
+            enhanced_prompt = build_executor_prompt(prompt)
             
-            response = await call_gpt4o(request_id, enhanced_prompt)
+            response = await self._call_with_retries(
+                settings.OPENAI_EXECUTOR_MODEL, deadline,
+                lambda: self._routed_executor_call(request_id, enhanced_prompt, deadline, route)
+            )
             duration = time.time() - start_time
+            metrics.observe_stage("executor", duration)
+            backend = self.router.by_name[route["backend"]]
+            route["latency_ewma_s"] = round(backend.latency_ewma, 3) if backend.latency_ewma is not None else None
             
             # Check for orchestrator-like output or empty responses
-            if any(phrase in response.strip().lower() for phrase in [
-                "your prompt is",
-                "suggestions for refinement",
-                "to answer this question",
-                "i need more context",
-                "could you please clarify"
-            ]):
-                logger.error(f"Request {request_id}: Executor returned a prompt-like response")
-                return "I apologize, but I couldn't generate a proper answer. Please try asking your question differently."
+            if is_prompt_like(response):
+                metrics.llm_call_duration.observe(duration, model=backend.name, outcome="prompt_like")
+                logger.error("Request %s: Executor returned a prompt-like response", request_id)
+                return PROMPT_LIKE_FALLBACK
             
-            log_llm_call(request_id, "OpenAI gpt-4o-mini", enhanced_prompt, response, duration)
+            metrics.llm_call_duration.observe(duration, model=backend.name, outcome="ok")
+            log_llm_call(request_id, f"OpenAI {backend.model} ({backend.name})", enhanced_prompt, response, duration)
             return response
+        except (AdmissionRejected, CircuitOpen):
+            # Refused, not failed: let the route answer 429/503 instead of a fallback text
+            raise
         except Exception as e:
             duration = time.time() - start_time
-            logger.error(f"Request {request_id}: OpenAI executor failed after {duration:.2f}s: {str(e)}")
-            return "Sorry, there was an error generating your answer."
+            metrics.observe_stage("executor", duration)
+            model = route.get("backend", self.router.primary.name)
+            metrics.llm_call_duration.observe(duration, model=model, outcome="error")
+            metrics.errors.inc(stage="executor", error_type=type(e).__name__)
+            logger.error("Request %s: OpenAI executor failed after %.2fs: %s", request_id, duration, e)
+            return ERROR_FALLBACK
+
+    async def stream_openai_executor(self, request_id: str, prompt: str, deadline: Deadline = None, route: dict = None) -> AsyncIterator[str]:
+        """Stream the executor answer token by token.
+
+        Unlike `call_openai_executor` errors are raised, not replaced by a fallback
+        answer, so the caller can tell a partial stream from a complete one. A
+        backend that fails before its first token is failed over like in
+        `call_openai_executor`; `route` is filled the same way. Each backend
+        must send its first token within `deadline.attempt_timeout()`, so the
+        stream does not outlive the request budget waiting for an answer.
+        """
+        start_time = time.time()
+        deadline = deadline or Deadline()
+        logger.info("Request %s: Streaming OpenAI executor", request_id)
+        enhanced_prompt = build_executor_prompt(prompt)
+        route = {} if route is None else route
+        parts = []
+        tokens = len(enhanced_prompt) // CHARS_PER_TOKEN + MAX_OUTPUT_TOKENS
+        tried: Set[str] = set()
+        while True:
+            backend = self.router.pick(exclude=tried)
+            route.update(backend=backend.name, model=backend.model)
+            try:
+                async with self.admission.admit("openai", tokens), backend.breaker.guard(timed=False):
+                    deltas = stream_gpt4o(backend.client, request_id, enhanced_prompt, backend.model)
+                    try:
+                        first = await asyncio.wait_for(deltas.__anext__(), timeout=deadline.attempt_timeout())
+                        parts.append(first)
+                        yield first
+                        async for delta in deltas:
+                            parts.append(delta)
+                            yield delta
+                    except StopAsyncIteration:
+                        pass  # empty answer, caught by the caller's check
+                    finally:
+                        await deltas.aclose()
+            except (AdmissionRejected, DeadlineExceeded):
+                raise
+            except CircuitOpen as e:
+                self._next_backend(request_id, backend, tried, e, route)
+                continue
+            except Exception as e:
+                # Stream length depends on the answer, so streams only feed the error average
+                backend.record(None, ok=False)
+                if not parts and deadline.remaining() >= RETRY_MIN_ATTEMPT_S and self.router.has_alternative(tried | {backend.name}):
+                    self._next_backend(request_id, backend, tried, e, route)
+                    continue
+                duration = time.time() - start_time
+                metrics.llm_call_duration.observe(duration, model=backend.name, outcome="error")
+                metrics.errors.inc(stage="executor", error_type=type(e).__name__)
+                raise e
+            backend.record(None, ok=True)
+            break
+        duration = time.time() - start_time
+        metrics.observe_stage("executor", duration)
+        metrics.llm_call_duration.observe(duration, model=backend.name, outcome="ok")
+        log_llm_call(request_id, f"OpenAI {backend.model} ({backend.name}, stream)", enhanced_prompt, "".join(parts), duration)
 
     async def close(self):
-        """Close client"""
-        pass
\ No newline at end of file
+        """Close clients and release their pooled connections"""
+        await self.router.close()
+        await self._google_transport.aclose()
+        logger.info("LLM clients closed")
\ No newline at end of file
@@ -0,0 +1,203 @@
+import asyncio
+import threading
+import time
+from typing import Dict, Tuple
+from config import settings
+from logger import logger
+import metrics
+from services.admission import AdmissionRejected
+from services.circuit_breaker import CircuitOpen
+from services.cache_service import InstrumentedTTLCache
+from services.deadline import Deadline
+from services.llm_service import LLMService, build_executor_prompt
+from services.query_classifier import QueryClassifier
+from services.similarity_index import normalize_query, text_similarity
+from services.single_flight import CHARS_PER_TOKEN
+
+
+class OrchestratorService:
+    """Orchestrator stage of the pipeline: bypass, cached rewrite, or a Gemma call.
+
+    Rewrites are cached separately from final answers (and usually for longer),
+    so the user query -> executor prompt mapping survives an answer cache expiry.
+    """
+
+    def __init__(self, llm_service: LLMService, classifier: QueryClassifier = None):
+        self.llm_service = llm_service
+        self.classifier = classifier or QueryClassifier()
+        self.cache = InstrumentedTTLCache(
+            maxsize=settings.ORCHESTRATOR_CACHE_MAX_SIZE,
+            ttl=settings.ORCHESTRATOR_CACHE_TTL_SECONDS
+        )
+        self._lock = threading.RLock()
+        self.bypassed: Dict[str, int] = {}
+        self.cache_hits = 0
+        self.gemma_calls = 0
+        self.fallbacks = 0
+        self.circuit_skips = 0
+        self.disabled_skips = 0
+        self.gemma_seconds = 0.0
+        self.speculation = {"won": 0, "lost": 0, "extra_tokens_estimate": 0, "seconds_saved_estimate": 0.0}
+
+    async def prepare_prompt(self, request_id: str, user_query: str, deadline: Deadline = None) -> Tuple[str, str]:
+        """Return (executor prompt, source) where source is bypass, cache, gemma, fallback, circuit_open or disabled.
+
+        A Gemma call gets ORCHESTRATOR_BUDGET_SHARE of the time left on `deadline`,
+        the rest is kept for the executor.
+        """
+        start_time = time.perf_counter()
+        prompt, source = await self._prepare_prompt(request_id, user_query, deadline or Deadline())
+        metrics.orchestrator_path.inc(source=source)
+        metrics.observe_stage("orchestrator", time.perf_counter() - start_time)
+        return prompt, source
+
+    async def _prepare_prompt(self, request_id: str, user_query: str, deadline: Deadline) -> Tuple[str, str]:
+        if settings.ORCHESTRATOR_BYPASS_ENABLED:
+            reason = self.classifier.bypass_reason(user_query)
+            if reason:
+                self.bypassed[reason] = self.bypassed.get(reason, 0) + 1
+                logger.info("Request %s: Skipping orchestrator (%s)", request_id, reason)
+                return user_query, "bypass"
+
+        key = normalize_query(user_query)
+        with self._lock:
+            cached_prompt = self.cache.get(key)
+        if cached_prompt is not None:
+            self.cache_hits += 1
+            logger.info("Request %s: Using cached orchestrator prompt", request_id)
+            return cached_prompt, "cache"
+
+        # No GOOGLE_API_KEY: pass every query through
+        if not self.llm_service.orchestrator_available:
+            self.disabled_skips += 1
+            return user_query, "disabled"
+        
+        # Gemma is known to be failing: don't make this request wait for it to fail again
+        if not self.llm_service.orchestrator_breaker.available():
+            self.circuit_skips += 1
+            return user_query, "circuit_open"
+
+        start_time = time.time()
+        try:
+            prompt = await self.llm_service.generate_orchestrator_prompt(
+                request_id, user_query, deadline.child(settings.ORCHESTRATOR_BUDGET_SHARE)
+            )
+        except CircuitOpen:
+            self.circuit_skips += 1
+            return user_query, "circuit_open"
+        except AdmissionRejected as e:
+            # Gemma is saturated: skip the rewrite rather than queue the request behind it
+            self.fallbacks += 1
+            logger.warning("Request %s: Orchestrator shed (%s), passing the query through", request_id, e.reason)
+            return user_query, "fallback"
+        except Exception as e:
+            duration = time.time() - start_time
+            self.fallbacks += 1
+            metrics.errors.inc(stage="orchestrator", error_type=type(e).__name__)
+            logger.error("Request %s: Gemma orchestrator failed after %.2fs: %s", request_id, duration, e)
+            # Fallback: use the original user query as prompt for the executor (not cached)
+            return user_query, "fallback"
+
+        self.gemma_calls += 1
+        self.gemma_seconds += time.time() - start_time
+        with self._lock:
+            self.cache[key] = prompt
+        return prompt, "gemma"
+
+    def will_call_gemma(self, user_query: str) -> bool:
+        """Whether `prepare_prompt` would wait for Gemma: no bypass, no cached rewrite, breaker not open"""
+        if settings.ORCHESTRATOR_BYPASS_ENABLED and self.classifier.bypass_reason(user_query):
+            return False
+        with self._lock:
+            if self.cache.get(normalize_query(user_query)) is not None:
+                return False
+        return self.llm_service.orchestrator_available and self.llm_service.orchestrator_breaker.available()
+
+    @staticmethod
+    def is_equivalent_rewrite(user_query: str, prompt: str) -> bool:
+        """Whether the executor would answer `prompt` the same as the raw query"""
+        query_key, prompt_key = normalize_query(user_query), normalize_query(prompt)
+        return query_key == prompt_key or text_similarity(query_key, prompt_key) >= settings.SPECULATIVE_SIMILARITY_THRESHOLD
+
+    async def execute_speculatively(
+        self, request_id: str, user_query: str, deadline: Deadline, route: dict = None
+    ) -> Tuple[str, str, str]:
+        """Run the executor on the raw query while the orchestrator rewrites it.
+
+        Returns (executor prompt, source, answer). If the rewrite is
+        equivalent to the query (or the orchestrator fell back to the query
+        itself) the speculative answer is used; otherwise it is cancelled and
+        the executor runs again on the rewrite, so a lost speculation costs
+        tokens but no latency over the serial path. `route` gets the executor
+        routing info of the answer used, as in `call_openai_executor`.
+        """
+        start_time = time.perf_counter()
+        route = {} if route is None else route
+        speculative_route = {}
+        executor_done = []
+        speculative = asyncio.ensure_future(
+            self.llm_service.call_openai_executor(request_id, user_query, deadline, speculative_route)
+        )
+        speculative.add_done_callback(lambda _: executor_done.append(time.perf_counter()))
+        try:
+            prompt, source = await self.prepare_prompt(request_id, user_query, deadline)
+            orchestrator_s = time.perf_counter() - start_time
+            if self.is_equivalent_rewrite(user_query, prompt):
+                answer = await speculative
+                route.update(speculative_route)
+                # Serial would have taken orchestrator + executor; both ran side by side instead
+                saved = orchestrator_s + (executor_done[0] - start_time) - (time.perf_counter() - start_time)
+                self.speculation["won"] += 1
+                self.speculation["seconds_saved_estimate"] += saved
+                metrics.speculative_executions.inc(outcome="won")
+                logger.info("Request %s: Speculative answer used (%s rewrite equivalent), saved %.2fs", request_id, source, saved)
+                return prompt, source, answer
+
+            # The raw-query prompt is billed even when cancelled, the answer only if it already arrived
+            extra_tokens = len(build_executor_prompt(user_query)) // CHARS_PER_TOKEN
+            if speculative.done() and not speculative.cancelled() and speculative.exception() is None:
+                extra_tokens += len(speculative.result()) // CHARS_PER_TOKEN
+            speculative.cancel()
+            self.speculation["lost"] += 1
+            self.speculation["extra_tokens_estimate"] += extra_tokens
+            metrics.speculative_executions.inc(outcome="lost")
+            metrics.speculative_extra_tokens.inc(extra_tokens)
+            logger.info("Request %s: Speculative answer discarded, executing the rewritten prompt", request_id)
+            return prompt, source, await self.llm_service.call_openai_executor(request_id, prompt, deadline, route)
+        finally:
+            if not speculative.done():
+                speculative.cancel()
+            elif not speculative.cancelled():
+                # Mark a failed speculation as retrieved, its error does not concern this request
+                speculative.exception()
+
+    def get_stats(self) -> dict:
+        """Get orchestrator stage statistics"""
+        avg_latency = self.gemma_seconds / self.gemma_calls if self.gemma_calls else 0.0
+        skipped = sum(self.bypassed.values()) + self.cache_hits
+        with self._lock:
+            cache_size = len(self.cache)
+        speculations = self.speculation["won"] + self.speculation["lost"]
+        return {
+            "bypassed": sum(self.bypassed.values()),
+            "bypass_reasons": dict(self.bypassed),
+            "cache_hits": self.cache_hits,
+            "cache_size": cache_size,
+            "cache_ttl": settings.ORCHESTRATOR_CACHE_TTL_SECONDS,
+            "gemma_calls": self.gemma_calls,
+            "fallbacks": self.fallbacks,
+            "circuit_skips": self.circuit_skips,
+            "disabled_skips": self.disabled_skips,
+            "circuit_state": self.llm_service.orchestrator_breaker.state,
+            "avg_gemma_latency_s": round(avg_latency, 4),
+            # Each skipped call would have cost about one average Gemma round trip
+            "estimated_seconds_saved": round(skipped * avg_latency, 2),
+            "speculation": {
+                "enabled": settings.SPECULATIVE_EXECUTION_ENABLED,
+                "won": self.speculation["won"],
+                "lost": self.speculation["lost"],
+                "win_rate": round(self.speculation["won"] / speculations, 4) if speculations else 0.0,
+                "extra_tokens_estimate": self.speculation["extra_tokens_estimate"],
+                "seconds_saved_estimate": round(self.speculation["seconds_saved_estimate"], 2)
+            }
+        }
@@ -0,0 +1,83 @@
+import re
+from typing import Callable, List, Optional, Tuple
+from config import settings
+from services.similarity_index import normalize_query
+
+
+# A rule looks at the normalized query and returns a bypass reason, or None to pass
+BypassRule = Callable[[str], Optional[str]]
+
+# Normalized queries keep inner punctuation ("hi,there"), rules look at the words only
+_WORD_RE = re.compile(r"\w+")
+
+GREETINGS = {
+    "hi", "hey", "hello", "yo", "hiya", "howdy", "sup", "thanks", "thank you", "thx",
+    "good morning", "good afternoon", "good evening", "good night", "bye", "goodbye",
+    "ok", "okay", "cool", "nice", "great"
+}
+QUESTION_WORDS = {
+    "what", "who", "whom", "whose", "when", "where", "why", "how", "which",
+    "is", "are", "do", "does", "did", "can", "could", "should", "would", "will"
+}
+# Questions mentioning these usually need fresh facts, which is the case the orchestrator rewrites
+WEB_SEARCH_HINTS = {
+    "latest", "today", "tonight", "yesterday", "tomorrow", "current", "currently", "now",
+    "news", "recent", "recently", "price", "prices", "weather", "score", "stock", "stocks",
+    "compare", "comparison", "versus", "vs"
+}
+
+
+def greeting_rule(query: str) -> Optional[str]:
+    """Greetings and thanks are passed through untouched by the orchestrator prompt"""
+    words = _WORD_RE.findall(query)
+    if " ".join(words) in GREETINGS or (len(words) <= 3 and words and words[0] in GREETINGS):
+        return "greeting"
+    return None
+
+
+def short_message_rule(query: str) -> Optional[str]:
+    """Short direct messages that are not questions"""
+    words = _WORD_RE.findall(query)
+    if len(words) <= 4 and words and words[0] not in QUESTION_WORDS:
+        return "short_message"
+    return None
+
+
+def simple_question_rule(query: str) -> Optional[str]:
+    """Short questions (web-search ones never reach the rules, see `QueryClassifier.bypass_reason`)"""
+    words = _WORD_RE.findall(query)
+    if len(words) <= settings.ORCHESTRATOR_BYPASS_MAX_WORDS:
+        return "simple_question"
+    return None
+
+
+class QueryClassifier:
+    """Cheap local check for queries the Gemma orchestrator would pass through unchanged.
+
+    Queries with a WEB_SEARCH_HINTS word ("bitcoin price today") are what the
+    orchestrator rewrites, so they are never bypassed. Other queries go
+    through the rules in order on the normalized query and the first reason
+    returned wins. Extra rules can be plugged in with `add_rule`.
+    """
+
+    def __init__(self, rules: Optional[List[Tuple[str, BypassRule]]] = None):
+        self.rules: List[Tuple[str, BypassRule]] = list(rules) if rules is not None else [
+            ("greeting", greeting_rule),
+            ("short_message", short_message_rule),
+            ("simple_question", simple_question_rule)
+        ]
+
+    def add_rule(self, name: str, rule: BypassRule) -> None:
+        """Append a rule, later rules only run if earlier ones did not match"""
+        self.rules.append((name, rule))
+
+    def bypass_reason(self, user_query: str) -> Optional[str]:
+        """Return why the orchestrator can be skipped for this query, or None"""
+        query = normalize_query(user_query)
+        if WEB_SEARCH_HINTS.intersection(_WORD_RE.findall(query)):
+            return None
+        for _, rule in self.rules:
+            reason = rule(query)
+            if reason:
+                return reason
+        return None
@@ -0,0 +1,129 @@
+import hashlib
+import time
+from typing import Optional, Dict, List, Tuple
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+from config import settings
+from logger import logger
+
+
+class RedisCacheTier:
+    """Shared L2 cache tier stored in Redis.
+
+    Every failure marks the tier as unavailable for REDIS_RETRY_INTERVAL_S, during
+    which lookups return a miss straight away, so callers fall back to L1 only.
+    """
+
+    def __init__(self, client: Optional[redis.Redis] = None):
+        if client is None:
+            pool = redis.ConnectionPool.from_url(
+                settings.REDIS_URL,
+                max_connections=settings.REDIS_MAX_CONNECTIONS,
+                socket_timeout=settings.REDIS_SOCKET_TIMEOUT_S,
+                socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT_S,
+                decode_responses=True
+            )
+            client = redis.Redis(connection_pool=pool)
+        self.client = client
+        self.ttl = settings.CACHE_TTL_SECONDS
+        self._down_until = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _key(self, key: str) -> str:
+        # Hash the query so long questions do not become long Redis keys
+        return settings.REDIS_KEY_PREFIX + hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    def _mark_down(self, error: Exception, operation: str) -> None:
+        self.errors += 1
+        if self.available:
+            logger.warning(
+                "Redis %s failed, serving from L1 only for %ss: %s", operation, settings.REDIS_RETRY_INTERVAL_S, error
+            )
+        self._down_until = time.monotonic() + settings.REDIS_RETRY_INTERVAL_S
+
+    async def ping(self) -> bool:
+        """Check the connection, marking the tier down if Redis is unreachable"""
+        try:
+            await self.client.ping()
+            self._down_until = 0.0
+            return True
+        except (RedisError, OSError) as e:
+            self._mark_down(e, "ping")
+            return False
+
+    async def get(self, key: str) -> Optional[str]:
+        """Get value from Redis, None on miss or when Redis is unavailable"""
+        values = await self.get_many([key])
+        return values.get(key)
+
+    async def get_many(self, keys: List[str]) -> Dict[str, str]:
+        """Get several values in one pipelined round trip"""
+        found = await self.get_many_with_ttl(keys)
+        return {key: value for key, (value, _) in found.items()}
+
+    async def get_many_with_ttl(self, keys: List[str]) -> Dict[str, Tuple[str, Optional[float]]]:
+        """Like `get_many`, plus each value's remaining TTL in seconds (None if it has none), read in the same round trip"""
+        if not keys or not self.available:
+            return {}
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.get(self._key(key))
+                    pipe.pttl(self._key(key))
+                replies = await pipe.execute()
+        except (RedisError, OSError) as e:
+            self._mark_down(e, "get")
+            return {}
+        found = {
+            key: (value, pttl / 1000 if pttl >= 0 else None)
+            for key, value, pttl in zip(keys, replies[::2], replies[1::2]) if value is not None
+        }
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    async def set(self, key: str, value: str) -> None:
+        """Set value in Redis with the cache TTL"""
+        await self.set_many({key: value})
+
+    async def set_many(self, items: Dict[str, str]) -> None:
+        """Set several values in one pipelined round trip"""
+        if not items or not self.available:
+            return
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for key, value in items.items():
+                    pipe.set(self._key(key), value, ex=self.ttl)
+                await pipe.execute()
+        except (RedisError, OSError) as e:
+            self._mark_down(e, "set")
+
+    async def delete(self, key: str) -> None:
+        """Delete value from Redis"""
+        if not self.available:
+            return
+        try:
+            await self.client.delete(self._key(key))
+        except (RedisError, OSError) as e:
+            self._mark_down(e, "delete")
+
+    async def close(self) -> None:
+        """Release pooled connections"""
+        await self.client.aclose()
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "available": self.available,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "errors": self.errors,
+            "ttl": self.ttl
+        }
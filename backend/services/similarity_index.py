@@ -0,0 +1,169 @@
+import heapq
+import random
+import re
+import unicodedata
+import zlib
+from typing import Dict, List, Optional, Set, Tuple
+
+
+_CONTRACTIONS = {
+    "what's": "what is",
+    "who's": "who is",
+    "where's": "where is",
+    "when's": "when is",
+    "how's": "how is",
+    "it's": "it is",
+    "that's": "that is",
+    "there's": "there is",
+    "what're": "what are",
+    "who're": "who are",
+    "can't": "cannot",
+    "won't": "will not",
+    "don't": "do not",
+    "doesn't": "does not",
+    "isn't": "is not",
+    "aren't": "are not",
+    "i'm": "i am"
+}
+_CONTRACTION_RE = re.compile(r"\b(" + "|".join(re.escape(c) for c in _CONTRACTIONS) + r")\b")
+# Sentence-final punctuation is dropped; other symbols stay ("c++", "2*2") but lose the spaces around them
+_TRAILING_PUNCTUATION_RE = re.compile(r"[\s?!.]+$")
+_SYMBOL_SPACING_RE = re.compile(r"\s*([^\w\s])\s*")
+# Numbers, symbol-suffixed terms and "-n't" words, which must match exactly for a near-duplicate to count
+_EXACT_TOKEN_RE = re.compile(r"\d+(?:[.,]\d+)*|\w+[+#]+|\w+n't")
+_WORD_RE = re.compile(r"\w+")
+# Words that flip or rank the meaning of an otherwise identical question, they must match exactly too
+_POLARITY_WORDS = {
+    "not", "no", "never", "without", "nor", "neither", "none", "nobody", "nothing", "nowhere", "cannot",
+    "more", "less", "fewer", "most", "least", "better", "worse", "best", "worst",
+    "higher", "lower", "highest", "lowest", "bigger", "smaller", "biggest", "smallest",
+    "larger", "largest", "faster", "slower", "fastest", "slowest", "cheaper", "cheapest",
+    "older", "newer", "oldest", "newest", "before", "after", "above", "below", "over", "under",
+    "first", "last", "min", "max", "minimum", "maximum", "increase", "decrease"
+}
+
+# Mersenne prime used for the MinHash permutations
+_PRIME = (1 << 61) - 1
+
+
+def normalize_query(query: str) -> str:
+    """Normalize case, whitespace, trailing punctuation and common contractions.
+
+    "What is Python?", "what is python" and "What's Python ?" all map to
+    "what is python", while "What is C++?" stays "what is c++" and
+    "2 + 2" becomes "2+2".
+    """
+    text = unicodedata.normalize("NFKC", query).casefold().replace("’", "'")
+    text = _CONTRACTION_RE.sub(lambda m: _CONTRACTIONS[m.group(1)], text)
+    text = _TRAILING_PUNCTUATION_RE.sub("", " ".join(text.split()))
+    return _SYMBOL_SPACING_RE.sub(r"\1", text)
+
+
+def _exact_tokens(text: str) -> List[str]:
+    words = [word for word in _WORD_RE.findall(text) if word in _POLARITY_WORDS]
+    return sorted(_EXACT_TOKEN_RE.findall(text) + words)
+
+
+def _shingles(text: str, ngram: int) -> Set[int]:
+    padded = f" {text} "
+    if len(padded) <= ngram:
+        return {zlib.crc32(padded.encode("utf-8"))}
+    return {
+        zlib.crc32(padded[i:i + ngram].encode("utf-8"))
+        for i in range(len(padded) - ngram + 1)
+    }
+
+
+def text_similarity(a: str, b: str, ngram: int = 3) -> float:
+    """Exact Jaccard similarity of the character n-grams of two normalized strings"""
+    shingles_a, shingles_b = _shingles(a, ngram), _shingles(b, ngram)
+    return len(shingles_a & shingles_b) / len(shingles_a | shingles_b)
+
+
+class SimilarityIndex:
+    """Local MinHash/LSH index over character n-grams of normalized queries.
+
+    Pure Python and fully offline. Each key keeps one signature plus one LSH
+    bucket entry per band; entries are removed together with the cache entry
+    they point to, so the index never outgrows the cache. Signatures are
+    computed on at most `max_shingles` n-grams (the ones with the smallest
+    hashes), so their cost on the event loop stays flat for long queries.
+    """
+
+    def __init__(self, threshold: float, num_perm: int = 64, bands: int = 16, ngram: int = 3, max_shingles: int = 64):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.ngram = ngram
+        self.max_shingles = max_shingles
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = random.Random(0)  # fixed seed so signatures are stable across restarts
+        self._perms = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+        self._signatures: Dict[str, Tuple[int, ...]] = {}
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def _signature(self, text: str) -> Tuple[int, ...]:
+        shingles = _shingles(text, self.ngram)
+        if len(shingles) > self.max_shingles:
+            # Bottom-k sample by hash: similar texts keep mostly the same n-grams, so their signatures still collide
+            shingles = heapq.nsmallest(self.max_shingles, shingles)
+        return tuple(min([(a * h + b) % _PRIME for h in shingles]) for a, b in self._perms)
+
+    def _band_keys(self, signature: Tuple[int, ...]) -> List[Tuple[int, Tuple[int, ...]]]:
+        rows = self.rows
+        return [(band, signature[band * rows:(band + 1) * rows]) for band in range(self.bands)]
+
+    def add(self, key: str) -> None:
+        """Index a normalized query"""
+        if key in self._signatures:
+            return
+        signature = self._signature(key)
+        self._signatures[key] = signature
+        for band_key in self._band_keys(signature):
+            self._buckets.setdefault(band_key, set()).add(key)
+
+    def remove(self, key: str) -> None:
+        """Drop a normalized query from the index"""
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for band_key in self._band_keys(signature):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def clear(self) -> None:
+        self._signatures.clear()
+        self._buckets.clear()
+
+    def most_similar(self, key: str) -> Optional[Tuple[str, float]]:
+        """Return the closest indexed query and its similarity, if above the threshold.
+
+        The MinHash buckets only preselect candidates: each is scored with the
+        exact `text_similarity`, and one whose numbers, terms like "c++" or
+        negation and comparison words differ from the query's ("... in 2014"
+        vs "... in 2018", "is x a problem" vs "is x not a problem") never matches.
+        """
+        signature = self._signature(key)
+        candidates = set()
+        for band_key in self._band_keys(signature):
+            candidates.update(self._buckets.get(band_key, ()))
+        candidates.discard(key)
+
+        tokens = _exact_tokens(key)
+        best, best_score = None, 0.0
+        for candidate in candidates:
+            if _exact_tokens(candidate) != tokens:
+                continue
+            score = text_similarity(key, candidate, self.ngram)
+            if score > best_score:
+                best, best_score = candidate, score
+        if best is not None and best_score >= self.threshold:
+            return best, best_score
+        return None
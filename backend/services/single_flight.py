@@ -0,0 +1,133 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Tuple
+from config import settings
+from logger import logger
+import metrics
+from services.similarity_index import normalize_query
+
+
+# Rough conversion used to estimate tokens saved by coalescing
+CHARS_PER_TOKEN = 4
+
+
+def flight_key(user_query: str) -> str:
+    """Key identical queries the same way the cache does"""
+    return normalize_query(user_query)
+
+
+class Flight:
+    """One running piece of work and the number of callers still waiting for it"""
+
+    __slots__ = ("task", "started", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.started = time.monotonic()
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Registry of in-flight work so identical concurrent queries share one upstream call.
+
+    The first caller for a key starts the work as a task; every concurrent
+    duplicate awaits that same task. Callers await it through `asyncio.shield`,
+    so a cancelled waiter never cancels the work the others are waiting for.
+    When the last waiter is cancelled (its client disconnected) the work is
+    cancelled too, unless CANCEL_ORPHANED_WORK is off and it should still
+    finish to fill the cache.
+    """
+
+    def __init__(self, upstream_calls_per_flight: int = 2, cancel_orphans: bool = None):
+        self._inflight: Dict[str, Flight] = {}
+        self.upstream_calls_per_flight = upstream_calls_per_flight
+        self.cancel_orphans = settings.CANCEL_ORPHANED_WORK if cancel_orphans is None else cancel_orphans
+        self.leaders = 0
+        self.coalesced = 0
+        self.failures = 0
+        self.saved_chars = 0
+        self.abandoned = 0
+        self.cancelled_flights = 0
+        self.saved_seconds = 0.0
+        self.completed_flights = 0
+        self.completed_seconds = 0.0
+
+    async def run(self, key: str, work: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Run `work` once per key, returns (result, shared) where shared is True for coalesced callers"""
+        flight = self._inflight.get(key)
+        shared = flight is not None
+        if shared:
+            self.coalesced += 1
+            logger.debug("Coalescing request onto in-flight query: %.50s...", key)
+        else:
+            self.leaders += 1
+            flight = Flight(asyncio.ensure_future(work()))
+            self._inflight[key] = flight
+            flight.task.add_done_callback(lambda t: self._finish(key, flight))
+
+        flight.waiters += 1
+        try:
+            result = await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.task.done():
+                # This caller was cancelled while the work is still running
+                self._abandon(key, flight)
+        if shared:
+            self.saved_chars += _result_chars(result)
+        return result, shared
+
+    def _abandon(self, key: str, flight: Flight) -> None:
+        self.abandoned += 1
+        if flight.waiters or not self.cancel_orphans:
+            return
+        # Nobody is waiting any more: stop paying for the upstream calls
+        elapsed = time.monotonic() - flight.started
+        avg_flight_s = self.completed_seconds / self.completed_flights if self.completed_flights else 0.0
+        saved = max(0.0, avg_flight_s - elapsed)
+        self.cancelled_flights += 1
+        self.saved_seconds += saved
+        metrics.cancelled_work.inc()
+        metrics.cancelled_upstream_seconds.inc(saved)
+        logger.info("Cancelled orphaned upstream work after %.2fs (about %.2fs saved)", elapsed, saved)
+        # Unregister first: a new caller for this key must start fresh work, not join the cancelled task
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+        flight.task.cancel()
+
+    def _finish(self, key: str, flight: Flight) -> None:
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+        task = flight.task
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            # Marks the exception as retrieved even if every waiter went away
+            self.failures += 1
+        else:
+            self.completed_flights += 1
+            self.completed_seconds += time.monotonic() - flight.started
+
+    def get_stats(self) -> dict:
+        """Get coalescing statistics"""
+        return {
+            "in_flight": len(self._inflight),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "failures": self.failures,
+            "saved_upstream_calls": self.coalesced * self.upstream_calls_per_flight,
+            "saved_tokens_estimate": self.saved_chars // CHARS_PER_TOKEN,
+            "abandoned_waiters": self.abandoned,
+            "cancelled_flights": self.cancelled_flights,
+            # Average flight duration minus how long each cancelled flight had already run
+            "upstream_seconds_saved_estimate": round(self.saved_seconds, 2)
+        }
+
+
+def _result_chars(result: Any) -> int:
+    # Executor prompt plus answer approximates the tokens a duplicate run would bill
+    if isinstance(result, dict):
+        return len(result.get("orchestrator_prompt", "")) + len(result.get("answer", ""))
+    if isinstance(result, str):
+        return len(result)
+    return 0
@@ -0,0 +1,66 @@
+import asyncio
+import os
+import sys
+import tempfile
+import fakeredis
+import pytest
+
+# Settings are read from the environment at import time, so set it up before any backend module loads
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("LOG_DIR", tempfile.mkdtemp(prefix="ai_agent_tests_"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ["CACHE_SNAPSHOT_PATH"] = ""
+os.environ["REDIS_URL"] = ""
+# Routing is deterministic in tests: always the best-scored backend
+os.environ["EXECUTOR_EXPLORE_RATE"] = "0"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fake_redis():
+    """In-memory Redis for the L2 tier, injected with `CacheService(redis_client=...)`"""
+    return fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
+class FakeExecutor:
+    """Stands in for the OpenAI calls made by LLMService.
+
+    `handlers[model]` is an async function of the call number (1 for the first
+    call on that model) returning the answer; cancelled calls are recorded.
+    """
+
+    def __init__(self):
+        self.handlers = {}
+        self.calls = []
+        self.cancelled = []
+
+    async def call(self, client, request_id, prompt, model=None):
+        self.calls.append(model)
+        try:
+            return await self.handlers[model](self.calls.count(model))
+        except asyncio.CancelledError:
+            self.cancelled.append(model)
+            raise
+
+    async def stream(self, client, request_id, prompt, model=None):
+        answer = await self.call(client, request_id, prompt, model)
+        for word in answer.split(" "):
+            yield word + " "
+
+    def service(self, *models: str):
+        """LLMService routing to one backend per model, in order of preference"""
+        from services.admission import AdmissionController
+        from services.executor_router import ExecutorBackend, ExecutorRouter
+        from services.llm_service import LLMService
+        backends = [ExecutorBackend(model, model) for model in models]
+        return LLMService(AdmissionController(), ExecutorRouter(backends))
+
+
+@pytest.fixture
+def fake_executor(monkeypatch):
+    executor = FakeExecutor()
+    monkeypatch.setattr("services.llm_service.call_gpt4o", executor.call)
+    monkeypatch.setattr("services.llm_service.stream_gpt4o", executor.stream)
+    return executor
@@ -0,0 +1,96 @@
+import asyncio
+import pytest
+from services.admission import AdmissionRejected, ProviderLimiter, TokenBucket
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def make_limiter(max_concurrency: int = 1, rpm: int = 0, tpm: int = 0, max_queue: int = 10, max_wait_s: float = 5.0):
+    return ProviderLimiter("test", max_concurrency, rpm, tpm, max_queue, max_wait_s)
+
+
+def test_bucket_refills_over_time():
+    bucket = TokenBucket(60)  # one token per second
+    assert bucket.reserve(60) == 0.0
+    assert bucket.reserve(1) == pytest.approx(1.0, abs=0.01)
+    # Two seconds later the debt of one token is paid and one more has refilled
+    bucket.updated -= 2
+    assert bucket.reserve(1) == 0.0
+    assert bucket.tokens == pytest.approx(0.0, abs=0.01)
+
+
+def test_unlimited_bucket_never_waits():
+    bucket = TokenBucket(0)
+    assert bucket.reserve(10 ** 9) == 0.0
+
+
+def test_exhausted_rate_budget_is_shed_with_429():
+    async def scenario():
+        limiter = make_limiter(rpm=1, max_wait_s=1)
+        async with limiter.admit(10):
+            pass
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with limiter.admit(10):
+                pass
+        return limiter, rejected.value
+
+    limiter, error = run(scenario())
+    assert (error.status_code, error.reason) == (429, "rate_limited")
+    assert int(error.headers["Retry-After"]) >= 59
+    # The rejected call gave its reservation back
+    assert limiter.requests.tokens == pytest.approx(0.0, abs=0.01)
+
+
+def test_full_queue_and_slot_timeout_are_shed_with_503():
+    async def scenario():
+        limiter = make_limiter(max_concurrency=1, max_queue=1, max_wait_s=0.05)
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.admit(1):
+                await release.wait()
+
+        holder = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as queue_full:
+            async with limiter.admit(1):
+                pass
+        with pytest.raises(AdmissionRejected) as timed_out:
+            await waiter
+        release.set()
+        await holder
+        return queue_full.value, timed_out.value, limiter
+
+    queue_full, timed_out, limiter = run(scenario())
+    assert (queue_full.status_code, queue_full.reason) == (503, "queue_full")
+    assert (timed_out.status_code, timed_out.reason) == (503, "timeout")
+    assert limiter.get_stats()["rejected"] == {"queue_full": 1, "timeout": 1}
+    assert (limiter.waiting, limiter.active) == (0, 0)
+
+
+def test_cancelled_waiter_refunds_its_reservation():
+    async def scenario():
+        limiter = make_limiter(rpm=60, tpm=6000)
+        limiter.requests.tokens = 0.0
+        limiter.tokens.tokens = 0.0
+
+        async def call():
+            async with limiter.admit(100):
+                pass
+
+        # Waits about a second for the buckets to refill, then the client goes away
+        task = asyncio.ensure_future(call())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return limiter
+
+    limiter = run(scenario())
+    assert limiter.requests.tokens == pytest.approx(0.0, abs=0.05)
+    assert limiter.tokens.tokens == pytest.approx(0.0, abs=5)
+    assert (limiter.waiting, limiter.admitted) == (0, 0)
@@ -0,0 +1,139 @@
+import asyncio
+import json
+import httpx
+from fastapi import FastAPI
+from main import RequestIDMiddleware
+from routes import ai_agent
+from services.cache_service import CacheService
+from services.single_flight import SingleFlight
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+class FakeOrchestrator:
+    """Passes every query through, and fails the ones asking it to"""
+
+    def will_call_gemma(self, user_query: str) -> bool:
+        return False
+
+    async def prepare_prompt(self, request_id, user_query, deadline=None):
+        if "fail" in user_query:
+            raise RuntimeError("orchestrator exploded")
+        return user_query, "bypass"
+
+
+class FakeLLMService:
+    def __init__(self):
+        self.prompts = []
+
+    async def call_openai_executor(self, request_id, prompt, deadline=None, route=None):
+        self.prompts.append(prompt)
+        await asyncio.sleep(0.01)
+        if route is not None:
+            route.update(backend="fake", model="fake-model")
+        return f"answer to {prompt}"
+
+
+def make_app(cache_service: CacheService = None) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(RequestIDMiddleware)
+    app.include_router(ai_agent.router)
+    app.state.cache_service = cache_service or CacheService()
+    app.state.single_flight = SingleFlight()
+    app.state.llm_service = FakeLLMService()
+    app.state.orchestrator = FakeOrchestrator()
+    return app
+
+
+async def post_batch(app: FastAPI, queries, stream: bool = False) -> httpx.Response:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.post(
+            "/api/ask/batch", json={"queries": [{"query": q} for q in queries], "stream": stream}
+        )
+
+
+def test_duplicate_queries_are_answered_once():
+    app = make_app()
+    response = run(post_batch(app, ["What is Python?", "what is python", "What is Rust?"]))
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [item["answer"] for item in body["results"]] == [
+        "answer to What is Python?", "answer to What is Python?", "answer to What is Rust?"
+    ]
+    assert body["meta"]["unique"] == 2
+    assert app.state.llm_service.prompts == ["What is Python?", "What is Rust?"]
+
+
+def test_failing_item_only_sets_its_own_error():
+    app = make_app()
+    response = run(post_batch(app, ["What is Python?", "please fail this one"]))
+
+    assert response.status_code == 200
+    ok, failed = response.json()["results"]
+    assert ok["answer"] == "answer to What is Python?" and ok["error"] is None
+    assert failed["answer"] is None and "orchestrator exploded" in failed["error"]
+    assert response.json()["meta"]["errors"] == 1
+
+
+def test_cached_items_skip_the_pipeline():
+    cache = CacheService()
+    run(cache.set("What is Python?", "A programming language"))
+    app = make_app(cache)
+    response = run(post_batch(app, ["What is Python?", "What is Rust?"]))
+
+    cached, fresh = response.json()["results"]
+    assert cached["answer"] == "A programming language" and cached["meta"]["cached"] is True
+    assert fresh["meta"]["cached"] is False
+    assert app.state.llm_service.prompts == ["What is Rust?"]
+
+
+def test_streamed_batch_sends_one_line_per_item():
+    response = run(post_batch(make_app(), ["What is Python?", "what is python", "please fail"], stream=True))
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(item["index"] for item in lines) == [0, 1, 2]
+    assert sum(1 for item in lines if item["error"]) == 1
+
+
+def test_batch_prefetch_uses_one_l2_round_trip(fake_redis):
+    pipelines = []
+    pipeline = fake_redis.pipeline
+
+    def counting_pipeline(*args, **kwargs):
+        pipelines.append(1)
+        return pipeline(*args, **kwargs)
+
+    async def scenario():
+        writer, reader = CacheService(redis_client=fake_redis), CacheService(redis_client=fake_redis)
+        for i in range(3):
+            await writer.set(f"question {i}", f"answer {i}")
+        fake_redis.pipeline = counting_pipeline
+        return await post_batch(make_app(reader), ["question 0", "question 1", "question 2", "question 1"])
+
+    response = run(scenario())
+    assert [item["answer"] for item in response.json()["results"]] == ["answer 0", "answer 1", "answer 2", "answer 1"]
+    assert len(pipelines) == 1
+
+
+def test_lookup_many_uses_one_l2_round_trip(fake_redis):
+    pipelines = []
+    pipeline = fake_redis.pipeline
+
+    def counting_pipeline(*args, **kwargs):
+        pipelines.append(1)
+        return pipeline(*args, **kwargs)
+
+    async def scenario():
+        writer, reader = CacheService(redis_client=fake_redis), CacheService(redis_client=fake_redis)
+        for i in range(3):
+            await writer.set(f"question {i}", f"answer {i}")
+        fake_redis.pipeline = counting_pipeline
+        return await reader.lookup_many(["question 0", "question 1", "question 2", "unknown"])
+
+    results = run(scenario())
+    assert [value for value, _ in results] == ["answer 0", "answer 1", "answer 2", None]
+    assert len(pipelines) == 1
@@ -0,0 +1,48 @@
+import asyncio
+from config import settings
+from services.cache_service import CacheEntry, CacheService, InstrumentedTTLCache
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_long_answers_are_stored_compressed(monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_COMPRESSION_MIN_BYTES", 256)
+    answer = "Python is a programming language. " * 50
+    entry, short = CacheEntry(answer, compress=True), CacheEntry("short answer", compress=True)
+    assert entry.compressed and entry.size < entry.raw_size
+    assert entry.value() == answer
+    assert not short.compressed
+
+
+def test_byte_budget_evicts_least_recently_used():
+    evictions = []
+    cache = InstrumentedTTLCache(
+        maxsize=100, ttl=60, max_bytes=300, on_evict=lambda reason, count: evictions.append((reason, count))
+    )
+    for i in range(4):
+        cache[f"k{i}"] = "x" * 98   # 100 bytes with the key
+    assert list(cache) == ["k1", "k2", "k3"]
+    assert cache.bytes == 300
+    assert evictions == [("max_bytes", 1)]
+
+
+def test_too_large_value_drops_the_old_one_and_is_not_indexed(monkeypatch):
+    monkeypatch.setattr(settings, "SIMILARITY_ENABLED", True)
+    monkeypatch.setattr(settings, "CACHE_MAX_BYTES", 1000)
+    monkeypatch.setattr(settings, "CACHE_COMPRESSION", "none")
+
+    async def scenario():
+        cache = CacheService()
+        await cache.set("small question", "small answer")
+        for i in range(20):
+            await cache.set(f"huge question {i}", "x" * 5000)
+        await cache.set("small question", "y" * 5000)
+        return cache
+
+    cache = run(scenario())
+    assert len(cache.cache) == 0
+    assert len(cache.index) == 0
+    assert cache.cache.bytes == 0
+    assert cache.get_stats()["eviction_reasons"]["too_large"] == 21
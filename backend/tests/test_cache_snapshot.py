@@ -0,0 +1,79 @@
+import asyncio
+import os
+import threading
+import time
+from config import settings
+from services.cache_service import CacheService
+from services.cache_snapshot import CacheSnapshot
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_answers_survive_a_restart(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_SNAPSHOT_PATH", str(tmp_path / "answers.snapshot"))
+    monkeypatch.setattr(settings, "CACHE_SNAPSHOT_INTERVAL_S", 0)
+
+    async def scenario():
+        before = CacheService()
+        await before.connect()
+        await before.set("What is Python?", "A programming language")
+        expires_at = before.cache.live_items()[0][2]
+        await before.close()
+
+        after = CacheService()
+        await after.connect()
+        await after._restore_task
+        result = await after.lookup("what is python")
+        return result, expires_at, after.restored["what is python"][1], after.get_stats()["snapshot"]
+
+    result, expires_at, restored_expires_at, stats = run(scenario())
+    assert result == ("A programming language", "restored_hit")
+    # The remaining TTL is kept, not restarted
+    assert restored_expires_at == expires_at
+    assert stats["loaded"] == 1
+
+
+def test_corrupted_record_keeps_the_ones_before_it(tmp_path):
+    snapshot = CacheSnapshot(str(tmp_path / "answers.snapshot"), max_bytes=1 << 20)
+    expires_at = time.time() + 60
+    # Written longest-lived first, so "first" comes first in the file
+    snapshot.write([("first", "one", expires_at + 2), ("second", "two", expires_at + 1), ("third", "three", expires_at)])
+    with open(snapshot.path, "r+b") as f:
+        f.seek(-2, os.SEEK_END)
+        f.write(b"\xff\xff")
+
+    entries, skipped = snapshot.read()
+    assert [key for key, _, _ in entries] == ["first", "second"]
+    assert skipped == 1
+
+
+def test_expired_entries_are_not_written_and_budget_is_respected(tmp_path):
+    snapshot = CacheSnapshot(str(tmp_path / "answers.snapshot"), max_bytes=200)
+    now = time.time()
+    entries = [("expired", "old", now - 1)] + [(f"key {i}", "x" * 50, now + 60 + i) for i in range(10)]
+    written, size = snapshot.write(entries)
+
+    assert size <= 200 and written < 10
+    loaded, _ = snapshot.read()
+    assert "expired" not in [key for key, _, _ in loaded]
+    # Longest-lived entries are kept first
+    assert loaded[0][0] == "key 9"
+
+
+def test_concurrent_writes_leave_one_complete_snapshot(tmp_path):
+    snapshot = CacheSnapshot(str(tmp_path / "answers.snapshot"), max_bytes=1 << 20)
+    expires_at = time.time() + 60
+    batches = [[(f"writer {w} key {i}", "answer " * 20, expires_at) for i in range(200)] for w in range(4)]
+    threads = [threading.Thread(target=snapshot.write, args=(batch,)) for batch in batches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    entries, skipped = snapshot.read()
+    assert skipped == 0
+    assert len(entries) == 200
+    assert len({key.split(" key ")[0] for key, _, _ in entries}) == 1
+    assert os.listdir(tmp_path) == ["answers.snapshot"]
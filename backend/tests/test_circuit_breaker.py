@@ -0,0 +1,130 @@
+import asyncio
+import pytest
+from services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def make_breaker(**overrides) -> CircuitBreaker:
+    options = dict(slow_call_s=1.0, failure_rate=0.5, window=4, min_calls=2, cooldown_s=60, half_open_probes=1)
+    options.update(overrides)
+    return CircuitBreaker("test-model", **options)
+
+
+async def fail(breaker: CircuitBreaker) -> None:
+    with pytest.raises(RuntimeError):
+        async with breaker.guard():
+            raise RuntimeError("upstream error")
+
+
+async def succeed(breaker: CircuitBreaker) -> None:
+    async with breaker.guard():
+        pass
+
+
+def end_cooldown(breaker: CircuitBreaker) -> None:
+    breaker.opened_at -= breaker.cooldown_s
+
+
+def test_breaker_opens_probes_and_closes():
+    async def scenario():
+        breaker = make_breaker()
+        await fail(breaker)
+        assert breaker.state == CLOSED
+        await fail(breaker)
+        assert breaker.state == OPEN
+        with pytest.raises(CircuitOpen):
+            await succeed(breaker)
+
+        end_cooldown(breaker)
+        assert breaker.state == HALF_OPEN
+        await succeed(breaker)
+        return breaker
+
+    breaker = run(scenario())
+    assert breaker.state == CLOSED
+    assert breaker.refused == 1
+    assert [t["to"] for t in breaker.transitions] == [OPEN, HALF_OPEN, CLOSED]
+
+
+def test_failed_probe_opens_again():
+    async def scenario():
+        breaker = make_breaker(min_calls=1)
+        await fail(breaker)
+        end_cooldown(breaker)
+        await fail(breaker)
+        return breaker
+
+    breaker = run(scenario())
+    assert breaker.state == OPEN
+    assert breaker.probes_in_flight == 0
+
+
+def test_half_open_refuses_calls_past_the_probe_limit():
+    async def scenario():
+        breaker = make_breaker(min_calls=1)
+        await fail(breaker)
+        end_cooldown(breaker)
+        probe_started, release = asyncio.Event(), asyncio.Event()
+
+        async def probe():
+            async with breaker.guard():
+                probe_started.set()
+                await release.wait()
+
+        task = asyncio.ensure_future(probe())
+        await probe_started.wait()
+        available = breaker.available()
+        with pytest.raises(CircuitOpen):
+            await succeed(breaker)
+        release.set()
+        await task
+        return breaker, available
+
+    breaker, available_during_probe = run(scenario())
+    assert available_during_probe is False
+    assert breaker.state == CLOSED
+
+
+def test_abandoned_probe_stream_gives_its_slot_back():
+    async def stream(breaker: CircuitBreaker):
+        async with breaker.guard(timed=False):
+            for token in ("a", "b", "c"):
+                yield token
+
+    async def scenario():
+        breaker = make_breaker(min_calls=1)
+        await fail(breaker)
+        end_cooldown(breaker)
+        tokens = stream(breaker)
+        assert await tokens.__anext__() == "a"
+        # The client went away: the stream is closed with GeneratorExit mid-answer
+        await tokens.aclose()
+        return breaker
+
+    breaker = run(scenario())
+    assert breaker.state == HALF_OPEN
+    assert breaker.probes_in_flight == 0
+    assert breaker.available()
+
+
+def test_cancelled_calls_are_not_failures():
+    async def scenario():
+        breaker = make_breaker(min_calls=1)
+
+        async def call():
+            async with breaker.guard():
+                await asyncio.sleep(10)
+
+        task = asyncio.ensure_future(call())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return breaker
+
+    breaker = run(scenario())
+    assert breaker.state == CLOSED
+    assert len(breaker.outcomes) == 0
@@ -0,0 +1,41 @@
+import asyncio
+from services.single_flight import SingleFlight
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_concurrent_callers_share_one_run():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def scenario():
+        flights = SingleFlight()
+        return await asyncio.gather(*(flights.run("key", work) for _ in range(3)))
+
+    results = run(scenario())
+    assert results == [("answer", False), ("answer", True), ("answer", True)]
+    assert len(calls) == 1
+
+
+def test_cancelled_waiter_does_not_cancel_shared_work():
+    async def work():
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def scenario():
+        flights = SingleFlight(cancel_orphans=True)
+        leader = asyncio.ensure_future(flights.run("key", work))
+        follower = asyncio.ensure_future(flights.run("key", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower, flights.get_stats()
+
+    result, stats = run(scenario())
+    assert result == ("answer", True)
+    assert stats["cancelled_flights"] == 0
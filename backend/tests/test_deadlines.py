@@ -0,0 +1,105 @@
+import asyncio
+import time
+import pytest
+import metrics
+from config import settings
+from services.deadline import Deadline
+from services.llm_service import ERROR_FALLBACK
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture
+def hedging(monkeypatch):
+    monkeypatch.setattr(settings, "HEDGE_ENABLED", True)
+    monkeypatch.setattr(settings, "HEDGE_MIN_SAMPLES", 5)
+    monkeypatch.setattr(settings, "HEDGE_MAX_RATIO", 1.0)
+    monkeypatch.setattr(settings, "HEDGE_MIN_DELAY_S", 0.05)
+
+
+def test_hedge_fires_after_the_quantile_delay_and_cancels_the_loser(fake_executor, hedging):
+    for _ in range(5):
+        metrics.executor_attempt_duration.observe(0.1, backend="hedge-model")
+
+    async def answer(call_number):
+        if call_number == 1:
+            await asyncio.sleep(5)
+            return "primary answer"
+        return "hedged answer"
+
+    fake_executor.handlers["hedge-model"] = answer
+    won_before = metrics.llm_hedges.get(outcome="won")
+
+    async def scenario():
+        service = fake_executor.service("hedge-model")
+        start_time = time.monotonic()
+        answer = await service.call_openai_executor("req", "What is Python?")
+        return answer, time.monotonic() - start_time, service
+
+    answer, elapsed, service = run(scenario())
+    assert answer == "hedged answer"
+    # Not before the p95 of the recorded attempts (between 0.05 and 0.1s), and well before the slow call
+    assert 0.05 <= elapsed < 1
+    assert fake_executor.cancelled == ["hedge-model"]
+    assert service.hedges == 1
+    assert metrics.llm_hedges.get(outcome="won") == won_before + 1
+
+
+def test_no_hedge_without_enough_samples(fake_executor, hedging):
+    async def answer(call_number):
+        await asyncio.sleep(0.1)
+        return "only answer"
+
+    fake_executor.handlers["unsampled-model"] = answer
+    assert run(fake_executor.service("unsampled-model").call_openai_executor("req", "q")) == "only answer"
+    assert fake_executor.calls == ["unsampled-model"]
+
+
+def test_retries_stop_when_the_deadline_cannot_cover_another_attempt(fake_executor, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_RETRIES", 50)
+    monkeypatch.setattr(settings, "RETRY_BASE_DELAY_S", 0.05)
+    monkeypatch.setattr(settings, "RETRY_MAX_DELAY_S", 0.1)
+    # Otherwise the breaker opens after CIRCUIT_MIN_CALLS failures and ends the retries first
+    monkeypatch.setattr(settings, "CIRCUIT_BREAKER_ENABLED", False)
+
+    async def answer(call_number):
+        raise asyncio.TimeoutError()
+
+    fake_executor.handlers["flaky-model"] = answer
+
+    async def scenario():
+        start_time = time.monotonic()
+        answer = await fake_executor.service("flaky-model").call_openai_executor("req", "q", Deadline(seconds=1.0))
+        return answer, time.monotonic() - start_time
+
+    answer, elapsed = run(scenario())
+    assert answer == ERROR_FALLBACK
+    assert 1 < len(fake_executor.calls) < 51
+    assert elapsed < 1.0
+
+
+def test_stream_first_token_is_bounded_by_the_deadline(fake_executor):
+    async def stuck(call_number):
+        await asyncio.sleep(5)
+        return "too late"
+
+    async def fast(call_number):
+        return "fallback answer"
+
+    fake_executor.handlers["stuck-model"] = stuck
+    fake_executor.handlers["spare-model"] = fast
+
+    async def scenario():
+        service = fake_executor.service("stuck-model", "spare-model")
+        start_time = time.monotonic()
+        with pytest.raises(asyncio.TimeoutError):
+            async for _ in service.stream_openai_executor("req", "q", Deadline(seconds=0.2)):
+                pass
+        return time.monotonic() - start_time
+
+    elapsed = run(scenario())
+    assert elapsed < 1
+    # The budget is spent, so the stream is not failed over to the other backend
+    assert fake_executor.calls == ["stuck-model"]
@@ -0,0 +1,92 @@
+import asyncio
+import pytest
+from disconnect import ClientDisconnected, cancel_on_disconnect
+from services.single_flight import SingleFlight
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+class FakeRequest:
+    """Request whose client disconnects once `disconnected` is set"""
+
+    def __init__(self):
+        self.disconnected = asyncio.Event()
+
+    async def receive(self):
+        await self.disconnected.wait()
+        return {"type": "http.disconnect"}
+
+
+def test_disconnect_cancels_the_work():
+    cancelled = []
+
+    async def work():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def scenario():
+        request = FakeRequest()
+        asyncio.get_running_loop().call_later(0.01, request.disconnected.set)
+        with pytest.raises(ClientDisconnected):
+            await cancel_on_disconnect(request, work())
+        await asyncio.sleep(0)
+
+    run(scenario())
+    assert cancelled == [1]
+
+
+def test_connected_client_gets_the_result():
+    async def work():
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    assert run(cancel_on_disconnect(FakeRequest(), work())) == "answer"
+
+
+def test_orphaned_work_is_cancelled_and_not_joined():
+    started = []
+
+    async def work():
+        started.append(1)
+        await asyncio.sleep(0.05)
+        return f"answer {len(started)}"
+
+    async def scenario():
+        flights = SingleFlight(cancel_orphans=True)
+        waiter = asyncio.ensure_future(flights.run("key", work))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            pass
+        # Same tick as the cancellation: the old task's done callback has not run yet
+        return await flights.run("key", work), flights.get_stats()
+
+    result, stats = run(scenario())
+    assert result == ("answer 2", False)
+    assert stats["cancelled_flights"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_orphaned_work_keeps_running_when_configured():
+    async def work():
+        await asyncio.sleep(0.02)
+        return "answer"
+
+    async def scenario():
+        flights = SingleFlight(cancel_orphans=False)
+        waiter = asyncio.ensure_future(flights.run("key", work))
+        await asyncio.sleep(0.005)
+        waiter.cancel()
+        joined = await flights.run("key", work)
+        return joined, flights.get_stats()
+
+    joined, stats = run(scenario())
+    assert joined == ("answer", True)
+    assert stats["cancelled_flights"] == 0
@@ -0,0 +1,68 @@
+import asyncio
+from config import settings
+from services.circuit_breaker import OPEN
+from services.executor_router import ExecutorBackend, ExecutorRouter, backends_from_settings
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def answer_from(model):
+    async def answer(call_number):
+        return f"answer from {model}"
+    return answer
+
+
+def test_open_breaker_fails_over_to_the_next_backend(fake_executor):
+    async def scenario():
+        fake_executor.handlers["route-primary"] = answer_from("route-primary")
+        fake_executor.handlers["route-spare"] = answer_from("route-spare")
+        service = fake_executor.service("route-primary", "route-spare")
+        service.router.by_name["route-primary"].breaker._transition(OPEN, "test")
+        route = {}
+        return await service.call_openai_executor("req", "q", route=route), route
+
+    answer, route = run(scenario())
+    assert answer == "answer from route-spare"
+    assert route["backend"] == "route-spare"
+    # Refused by its breaker without a call being sent
+    assert fake_executor.calls == ["route-spare"]
+
+
+def test_failing_backend_is_failed_over_and_penalized(fake_executor):
+    async def failing(call_number):
+        raise RuntimeError("backend down")
+
+    async def scenario():
+        fake_executor.handlers["fail-primary"] = failing
+        fake_executor.handlers["fail-spare"] = answer_from("fail-spare")
+        service = fake_executor.service("fail-primary", "fail-spare")
+        route = {}
+        answer = await service.call_openai_executor("req", "q", route=route)
+        return answer, route, service.router
+
+    answer, route, router = run(scenario())
+    assert answer == "answer from fail-spare"
+    assert route["failovers"] == ["fail-primary"]
+    # The error average now sends the next call to the healthy backend first
+    assert router.pick().name == "fail-spare"
+
+
+def test_router_prefers_the_faster_backend():
+    slow, fast = ExecutorBackend("pick-slow", "model"), ExecutorBackend("pick-fast", "model")
+    slow.record(2.0, ok=True)
+    fast.record(0.5, ok=True)
+    assert ExecutorRouter([slow, fast]).pick().name == "pick-fast"
+
+
+def test_openai_key_is_not_sent_to_other_endpoints(monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "sk-secret")
+    monkeypatch.setattr(settings, "OPENAI_BASE_URL", "")
+    monkeypatch.setattr(settings, "EXECUTOR_BACKENDS", (
+        '[{"name": "openai", "model": "gpt-4o-mini"},'
+        ' {"name": "local", "model": "llama", "base_url": "http://127.0.0.1:8000/v1"}]'
+    ))
+    openai_backend, local_backend = backends_from_settings()
+    assert openai_backend.client.api_key == "sk-secret"
+    assert local_backend.client.api_key == ""
@@ -0,0 +1,64 @@
+import asyncio
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+import metrics
+from main import RequestIDMiddleware
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(RequestIDMiddleware)
+
+    @app.get("/work")
+    async def work():
+        metrics.observe_stage("cache_lookup", 0.002)
+        metrics.observe_stage("executor", 0.25)
+        return {"ok": True}
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for i in range(3):
+                await asyncio.sleep(0)
+                yield f"chunk {i}\n"
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    return app
+
+
+async def get(path: str, headers: dict = None) -> httpx.Response:
+    transport = httpx.ASGITransport(app=make_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get(path, headers=headers)
+
+
+def test_server_timing_lists_the_stages_and_total():
+    response = run(get("/work"))
+    timing = response.headers["Server-Timing"]
+    assert timing.startswith("cache;dur=2.0, executor;dur=250.0, total;dur=")
+
+
+def test_valid_request_id_is_reused_and_invalid_one_replaced():
+    reused = run(get("/work", {"X-Request-ID": "client-id.42"}))
+    replaced = run(get("/work", {"X-Request-ID": "bad id\twith spaces"}))
+    assert reused.headers["X-Request-ID"] == "client-id.42"
+    assert replaced.headers["X-Request-ID"] not in ("", "bad id\twith spaces")
+    assert len(replaced.headers["X-Request-ID"]) == 36  # a fresh UUID
+
+
+def test_streamed_responses_pass_through_with_headers():
+    response = run(get("/stream"))
+    assert response.text == "chunk 0\nchunk 1\nchunk 2\n"
+    assert response.headers["X-Request-ID"]
+    assert response.headers["Server-Timing"].startswith("total;dur=")
+
+
+def test_request_duration_is_recorded_by_route_template():
+    before = metrics.http_request_duration.count(path="/work", method="GET", status=200)
+    run(get("/work"))
+    assert metrics.http_request_duration.count(path="/work", method="GET", status=200) == before + 1
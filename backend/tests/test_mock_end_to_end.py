@@ -0,0 +1,111 @@
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import httpx
+import pytest
+import main
+from config import settings
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BACKEND_DIR, "benchmarks"))
+from mock_llm_server import ANSWER  # noqa: E402
+
+# Long enough, and asking for fresh facts, so the orchestrator is not bypassed
+QUERY = "What is the latest recommended way to expire entries in a time-to-live answer cache?"
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope="module")
+def mock_url():
+    """The mock Gemma and OpenAI providers from benchmarks/, running on a free port"""
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND_DIR, "benchmarks", "mock_llm_server.py"),
+         "--port", str(port), "--latency-ms", "5", "--jitter-ms", "0", "--chunk-delay-ms", "1"],
+        cwd=BACKEND_DIR
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                httpx.get(f"{url}/health", timeout=1).raise_for_status()
+                break
+            except httpx.HTTPError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    pytest.fail("mock LLM server did not start")
+                time.sleep(0.1)
+        yield url
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+@pytest.fixture
+def backend_on_mock(mock_url, monkeypatch):
+    monkeypatch.setattr(settings, "GOOGLE_API_BASE_URL", f"{mock_url}/")
+    monkeypatch.setattr(settings, "OPENAI_BASE_URL", f"{mock_url}/v1")
+    monkeypatch.setattr(settings, "EXECUTOR_BACKENDS", "")
+    monkeypatch.setattr(settings, "EVENT_LOOP_MONITOR_INTERVAL_S", 0)
+    return main.app
+
+
+async def with_backend(app, scenario):
+    """Run `scenario(client)` against the app with its lifespan (real services, mock providers)"""
+    async with main.lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+            return await scenario(client)
+
+
+def test_ask_runs_the_pipeline_against_the_mock(backend_on_mock):
+    async def scenario(client):
+        first = await client.post("/api/ask", json={"query": QUERY})
+        again = await client.post("/api/ask", json={"query": QUERY})
+        return first, again
+
+    first, again = run(with_backend(backend_on_mock, scenario))
+    assert first.status_code == 200
+    body = first.json()
+    assert body["answer"] == ANSWER
+    assert body["meta"]["cached"] is False
+    assert body["meta"]["orchestrator"] == "gemma"
+    assert "executor" in first.headers["Server-Timing"]
+    assert again.json()["meta"]["cached"] is True
+
+
+def test_stream_sends_tokens_then_done(backend_on_mock):
+    async def scenario(client):
+        events = []
+        async with client.stream("POST", "/api/ask/stream", json={"query": QUERY}) as response:
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("text/event-stream")
+            event = None
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                elif line.startswith("data: "):
+                    events.append((event, json.loads(line[len("data: "):])))
+        return events
+
+    events = run(with_backend(backend_on_mock, scenario))
+    names = [name for name, _ in events]
+    assert names[:2] == ["start", "orchestrator"]
+    assert names[-1] == "done"
+    tokens = [data["text"] for name, data in events if name == "token"]
+    assert len(tokens) > 1
+    assert "".join(tokens).strip() == ANSWER
+    assert events[-1][1]["meta"]["cached"] is False
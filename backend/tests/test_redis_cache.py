@@ -0,0 +1,84 @@
+import asyncio
+from redis.exceptions import ConnectionError as RedisConnectionError
+from services.cache_service import CacheService
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+class BrokenPipeline:
+    """Stands in for a Redis pipeline whose server is unreachable"""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def get(self, key):
+        pass
+
+    def pttl(self, key):
+        pass
+
+    def set(self, key, value, ex=None):
+        pass
+
+    async def execute(self):
+        raise RedisConnectionError("connection refused")
+
+
+class BrokenRedis:
+    def pipeline(self, transaction=True):
+        return BrokenPipeline()
+
+    async def ping(self):
+        raise RedisConnectionError("connection refused")
+
+    async def aclose(self):
+        pass
+
+
+def test_l2_shares_answers_between_processes(fake_redis):
+    async def scenario():
+        first, second = CacheService(redis_client=fake_redis), CacheService(redis_client=fake_redis)
+        await first.set("What is Python?", "A programming language")
+        value, result = await second.lookup("what is python")
+        # Promoted to L1, so the next lookup stays local
+        again, again_result = await second.lookup("what is python")
+        return value, result, again, again_result
+
+    assert run(scenario()) == ("A programming language", "l2_hit", "A programming language", "l1_hit")
+
+
+def test_promoted_l2_hit_keeps_its_remaining_ttl(fake_redis):
+    async def scenario():
+        writer, reader = CacheService(redis_client=fake_redis), CacheService(redis_client=fake_redis)
+        await writer.set("What is Python?", "A programming language")
+        # Nearly expired in Redis
+        await fake_redis.pexpire(writer.l2._key("what is python"), 50)
+        first = await reader.lookup("what is python")
+        await asyncio.sleep(0.1)
+        return first, await reader.lookup("what is python")
+
+    first, later = run(scenario())
+    assert first == ("A programming language", "l2_hit")
+    # Gone from Redis, so it must not live on in L1 for a fresh CACHE_TTL_SECONDS
+    assert later == (None, "miss")
+
+
+def test_unreachable_l2_falls_back_to_l1():
+    async def scenario():
+        cache = CacheService(redis_client=BrokenRedis())
+        await cache.connect()
+        await cache.set("What is Python?", "A programming language")
+        value, result = await cache.lookup("What is Python?")
+        missing, _ = await cache.lookup("What is Rust?")
+        return cache, value, result, missing
+
+    cache, value, result, missing = run(scenario())
+    assert (value, result, missing) == ("A programming language", "l1_hit", None)
+    stats = cache.get_stats()["tiers"]["l2"]
+    assert stats["available"] is False
+    assert stats["errors"] >= 1
@@ -0,0 +1,84 @@
+import asyncio
+from config import settings
+from services.cache_service import CacheService
+from services.similarity_index import SimilarityIndex, normalize_query, text_similarity
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_normalization_keeps_symbols():
+    assert normalize_query("What's Python ?") == "what is python"
+    assert normalize_query("What is C++?") == "what is c++"
+    assert normalize_query("2 + 2") == "2+2"
+
+
+def test_symbols_keep_queries_apart():
+    async def scenario():
+        cache = CacheService()
+        await cache.set("What is C++?", "C++ answer")
+        return await cache.get("What is C?"), await cache.get("what is c++")
+
+    assert run(scenario()) == (None, "C++ answer")
+
+
+def test_near_duplicates_with_different_numbers_do_not_match(monkeypatch):
+    monkeypatch.setattr(settings, "SIMILARITY_ENABLED", True)
+
+    async def scenario():
+        cache = CacheService()
+        await cache.set("Who won the FIFA World Cup final in the year 2018?", "France")
+        return (
+            await cache.lookup("Who won the FIFA World Cup final in the year 2014?"),
+            await cache.lookup("Who won the FIFA World Cup final in year 2018?")
+        )
+
+    different_year, same_year = run(scenario())
+    assert different_year == (None, "miss")
+    assert same_year == ("France", "near_hit")
+
+
+def test_negated_query_is_not_a_near_duplicate(monkeypatch):
+    monkeypatch.setattr(settings, "SIMILARITY_ENABLED", True)
+    query = "Is storing sessions in a global dictionary inside a FastAPI application a problem?"
+    negated = "Is storing sessions in a global dictionary inside a FastAPI application not a problem?"
+    # Close enough in characters to pass the threshold on its own
+    assert text_similarity(normalize_query(query), normalize_query(negated)) >= settings.SIMILARITY_THRESHOLD
+
+    async def scenario():
+        cache = CacheService()
+        await cache.set(query, "Yes")
+        return await cache.lookup(negated)
+
+    assert run(scenario()) == (None, "miss")
+
+
+def test_comparatives_must_match():
+    index = SimilarityIndex(threshold=0.5)
+    index.add(normalize_query("Is Redis faster than Memcached for small values?"))
+    assert index.most_similar(normalize_query("Is Redis slower than Memcached for small values?")) is None
+    assert index.most_similar(normalize_query("Is Redis faster than Memcached for small value?")) is not None
+
+
+def test_long_near_duplicates_still_match_with_capped_signatures():
+    index = SimilarityIndex(threshold=0.9, max_shingles=16)
+    query = normalize_query(" ".join(f"word{i}" for i in range(150)))
+    index.add(query)
+    match = index.most_similar(query.replace("word75", "word75s"))
+    assert match is not None and match[0] == query
+
+
+def test_index_follows_evictions(monkeypatch):
+    monkeypatch.setattr(settings, "SIMILARITY_ENABLED", True)
+    monkeypatch.setattr(settings, "CACHE_MAX_SIZE", 2)
+
+    async def scenario():
+        cache = CacheService()
+        for i in range(5):
+            await cache.set(f"question number {i}", f"answer {i}")
+        return cache
+
+    cache = run(scenario())
+    assert len(cache.cache) == 2
+    assert len(cache.index) == 2
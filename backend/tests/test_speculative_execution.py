@@ -0,0 +1,54 @@
+import asyncio
+from services.deadline import Deadline
+from services.orchestrator_service import OrchestratorService
+
+# Long enough not to be bypassed, so the orchestrator would be waited for
+QUERY = "How does a time-to-live cache decide when an entry has expired?"
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def make_orchestrator(fake_executor, model: str, rewrite: str, gemma_s: float) -> OrchestratorService:
+    llm_service = fake_executor.service(model)
+
+    async def generate_orchestrator_prompt(request_id, user_query, deadline=None):
+        await asyncio.sleep(gemma_s)
+        return rewrite
+
+    llm_service.generate_orchestrator_prompt = generate_orchestrator_prompt
+    return OrchestratorService(llm_service)
+
+
+def test_equivalent_rewrite_uses_the_speculative_answer(fake_executor):
+    async def answer(call_number):
+        await asyncio.sleep(0.05)
+        return "raw query answer"
+
+    fake_executor.handlers["spec-won"] = answer
+    orchestrator = make_orchestrator(fake_executor, "spec-won", QUERY.lower(), gemma_s=0.05)
+    assert orchestrator.will_call_gemma(QUERY)
+
+    prompt, source, answer = run(orchestrator.execute_speculatively("req", QUERY, Deadline()))
+    assert (source, answer) == ("gemma", "raw query answer")
+    assert fake_executor.calls == ["spec-won"]
+    assert orchestrator.speculation["won"] == 1
+
+
+def test_different_rewrite_cancels_the_speculative_call(fake_executor):
+    async def answer(call_number):
+        if call_number == 1:
+            await asyncio.sleep(5)
+            return "raw query answer"
+        return "rewritten answer"
+
+    fake_executor.handlers["spec-lost"] = answer
+    rewrite = "Explain TTL cache expiry: lazy checks on read versus a periodic sweep of expired keys"
+    orchestrator = make_orchestrator(fake_executor, "spec-lost", rewrite, gemma_s=0.01)
+
+    prompt, source, answer = run(orchestrator.execute_speculatively("req", QUERY, Deadline()))
+    assert (prompt, answer) == (rewrite, "rewritten answer")
+    assert fake_executor.cancelled == ["spec-lost"]
+    assert orchestrator.speculation["lost"] == 1
+    assert orchestrator.speculation["extra_tokens_estimate"] > 0
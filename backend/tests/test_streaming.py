@@ -0,0 +1,93 @@
+import asyncio
+import json
+import httpx
+from fastapi import FastAPI
+from main import RequestIDMiddleware
+from routes import ai_agent
+from services.admission import AdmissionRejected
+from services.cache_service import CacheService
+from services.orchestrator_service import OrchestratorService
+from services.single_flight import SingleFlight
+
+# Short enough to bypass the orchestrator, so only the executor is faked
+QUERY = "What is Python?"
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def make_app(llm_service, cache_service: CacheService = None) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(RequestIDMiddleware)
+    app.include_router(ai_agent.router)
+    app.state.cache_service = cache_service or CacheService()
+    app.state.single_flight = SingleFlight()
+    app.state.llm_service = llm_service
+    app.state.orchestrator = OrchestratorService(llm_service)
+    return app
+
+
+async def stream_events(app: FastAPI, query: str = QUERY):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post("/api/ask/stream", json={"query": query})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        event, data = block.split("\n", 1)
+        events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+def test_tokens_are_streamed_then_cached(fake_executor):
+    async def answer(call_number):
+        return "A programming language"
+
+    fake_executor.handlers["stream-model"] = answer
+    cache = CacheService()
+    events = run(stream_events(make_app(fake_executor.service("stream-model"), cache)))
+
+    assert [name for name, _ in events] == ["start", "orchestrator", "token", "token", "token", "done"]
+    assert "".join(data["text"] for name, data in events if name == "token").strip() == "A programming language"
+    assert events[1][1]["source"] == "bypass"
+    assert run(cache.get(QUERY)) == "A programming language"
+
+
+def test_cache_hit_is_a_single_done_event(fake_executor):
+    cache = CacheService()
+    run(cache.set(QUERY, "A programming language"))
+    events = run(stream_events(make_app(fake_executor.service("stream-model"), cache)))
+
+    assert [name for name, _ in events] == ["done"]
+    assert events[0][1]["answer"] == "A programming language"
+    assert events[0][1]["meta"]["cached"] is True
+    assert fake_executor.calls == []
+
+
+def test_failure_mid_stream_ends_with_an_error_event_and_is_not_cached(fake_executor, monkeypatch):
+    async def broken_stream(client, request_id, prompt, model=None):
+        yield "A programming "
+        raise RuntimeError("connection reset")
+
+    monkeypatch.setattr("services.llm_service.stream_gpt4o", broken_stream)
+    cache = CacheService()
+    events = run(stream_events(make_app(fake_executor.service("broken-model"), cache)))
+
+    assert [name for name, _ in events] == ["start", "orchestrator", "token", "error"]
+    assert "error" in events[-1][1]["detail"]
+    assert run(cache.get(QUERY)) is None
+
+
+def test_shed_executor_call_sends_status_and_retry_after(fake_executor, monkeypatch):
+    async def shed_stream(client, request_id, prompt, model=None):
+        raise AdmissionRejected("openai", "rate_limited", 429, 12)
+        yield
+
+    monkeypatch.setattr("services.llm_service.stream_gpt4o", shed_stream)
+    events = run(stream_events(make_app(fake_executor.service("shed-model"))))
+
+    name, data = events[-1]
+    assert name == "error"
+    assert (data["status"], data["retry_after"]) == (429, "12")
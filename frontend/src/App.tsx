@@ -16,7 +16,30 @@ export default function App() {
   const [isLoading, setIsLoading] = useState<boolean>(false);
 
 
-  //  Send question to BACKEND ( UPDATED )
+  //  Handle one Server-Sent Event from /api/ask/stream
+  const handleStreamEvent = (rawEvent: string): void => {
+    let event = 'message';
+    let data = '';
+    for (const line of rawEvent.split('\n')) {
+      if (line.startsWith('event: ')) event = line.slice(7);
+      else if (line.startsWith('data: ')) data += line.slice(6);
+    }
+    if (!data) return;
+
+    const payload = JSON.parse(data);
+    if (event === 'token') {
+      setAnswer(prev => prev + payload.text);
+    } else if (event === 'done' && payload.answer) {
+      //  cache hit: whole answer arrives in one event
+      const cached: ApiResponse = payload;
+      setAnswer(cached.answer);
+    } else if (event === 'error') {
+      setError(payload.detail);
+    }
+  };
+
+
+  //  Send question to BACKEND ( UPDATED: streamed answer )
   const sendQuestion = async (): Promise<void> => {
     if (!query.trim()) return;
 
@@ -32,7 +55,7 @@ export default function App() {
     setController(newController);
 
     try {
-      const response = await fetch('http://localhost:8000/api/ask', {
+      const response = await fetch('http://localhost:8000/api/ask/stream', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -41,8 +64,28 @@ export default function App() {
         signal: newController.signal
       });
 
-      const data: ApiResponse = await response.json();
-      setAnswer(data.answer);
+      if (!response.ok || !response.body) {
+        throw new Error(`Request failed with status ${response.status}`);
+      }
+
+      //  Читаем SSE поток: токены добавляем к ответу по мере поступления
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        //  события разделены пустой строкой
+        let boundary = buffer.indexOf('\n\n');
+        while (boundary !== -1) {
+          handleStreamEvent(buffer.slice(0, boundary));
+          buffer = buffer.slice(boundary + 2);
+          boundary = buffer.indexOf('\n\n');
+        }
+      }
       
     } catch (err) {
       if (err instanceof Error) {